@@ -965,6 +965,7 @@ class SheetPostTest(SefariaTestCase):
     def tearDown(self):
         if self._sheet_id:
             db.sheets.remove({"id": self._sheet_id})
+            db.sheet_refs.remove({"sheet_id": self._sheet_id})
             db.history.remove({"sheet": self._sheet_id})
 
     def test_post_sheet(self):
@@ -972,8 +973,8 @@ class SheetPostTest(SefariaTestCase):
         Tests:
             Posting a new source sheet
             Add a source via add_source_to_sheet API
-            Publish Sheet, history recorded
-            Unpublish Sheet, history deleted
+            Publish Sheet, history recorded, sources added to the sheet ref index
+            Unpublish Sheet, history deleted, sources removed from the sheet ref index
             Deleting a source sheet
         """
         sheet = {
@@ -1017,6 +1018,9 @@ class SheetPostTest(SefariaTestCase):
         self.assertEqual(1, log["user"])
         self.assertEqual(sheet_id, log["sheet"])
         self.assertEqual("publish sheet", log["rev_type"])
+        entry = db.sheet_refs.find_one({"sheet_id": sheet_id})
+        self.assertEqual("Mishnah Peah 1:1", entry["anchorRef"])
+        self.assertEqual(["Mishnah Peah 1:1"], entry["expandedRefs"])
     
         # Unpublish Sheet
         sheet["status"] = "unlisted"
@@ -1027,6 +1031,7 @@ class SheetPostTest(SefariaTestCase):
         self.assertEqual("unlisted", data["status"])
         log = db.history.find_one({"rev_type": "publish sheet", "sheet": sheet_id})
         self.assertEqual(None, log)
+        self.assertEqual(0, db.sheet_refs.find({"sheet_id": sheet_id}).count())
     
         # Delete the Sheet
         response = c.post("/api/sheets/{}/delete".format(sheet_id), {})
@@ -37,11 +37,11 @@ from sefaria.model.group import GroupSet
 from sefaria.client.wrapper import format_object_for_client, format_note_object_for_client, get_notes, get_links
 from sefaria.system.exceptions import InputError, PartialRefInputError, BookNameError, NoVersionFoundError, DuplicateRecordError
 # noinspection PyUnresolvedReferences
-from sefaria.client.util import jsonResponse
+from sefaria.client.util import jsonResponse, serializedJsonResponse
 from sefaria.history import text_history, get_maximal_collapsed_activity, top_contributors, make_leaderboard, make_leaderboard_condition, text_at_revision, record_version_deletion, record_index_deletion
 from sefaria.system.decorators import catch_error_as_json
 from sefaria.summaries import flatten_toc, get_or_make_summary_node
-from sefaria.sheets import get_sheets_for_ref, get_public_sheets, get_sheets_by_tag, user_sheets, user_tags, recent_public_tags, sheet_to_dict, get_top_sheets, make_tag_list, group_sheets
+from sefaria.sheets import get_sheets_for_ref, get_public_sheets, get_sheets_by_tag, user_sheets, user_tags, recent_public_tags, sheet_list_to_dicts, get_top_sheets, make_tag_list, group_sheets
 from sefaria.utils.util import list_depth, text_preview
 from sefaria.utils.hebrew import hebrew_plural, hebrew_term, encode_hebrew_numeral, encode_hebrew_daf, is_hebrew, strip_cantillation, has_cantillation
 from sefaria.utils.talmud import section_to_daf, daf_to_section
@@ -49,7 +49,7 @@ from sefaria.datatype.jagged_array import JaggedArray
 import sefaria.utils.calendars
 from sefaria.utils.util import short_to_long_lang_code
 import sefaria.tracker as tracker
-from sefaria.system.cache import django_cache_decorator
+from sefaria.system.cache import memoize
 from sefaria.settings import USE_VARNISH, USE_NODE, NODE_HOST
 if USE_VARNISH:
     from sefaria.system.sf_varnish import invalidate_ref, invalidate_linked
@@ -497,7 +497,7 @@ def s2_sheets(request):
     props = s2_props(request)
     props.update({
         "initialMenu": "sheets",
-        "topSheets": [sheet_to_dict(s) for s in get_top_sheets()],
+        "topSheets": sheet_list_to_dicts(get_top_sheets()),
         "tagList": make_tag_list(sort_by="count"),
         "trendingTags": recent_public_tags(days=14, ntags=18)
     })
@@ -546,9 +546,9 @@ def s2_sheets_by_tag(request, tag):
         props["userSheets"]   = user_sheets(request.user.id)["sheets"]
         props["userTags"]     = user_tags(request.user.id)
     elif tag == "All Sheets":
-        props["publicSheets"] = [sheet_to_dict(s) for s in get_public_sheets(0)] #TODO Pagination
+        props["publicSheets"] = sheet_list_to_dicts(get_public_sheets(0)) #TODO Pagination
     else:
-        props["tagSheets"]    = [sheet_to_dict(s) for s in get_sheets_by_tag(tag)]
+        props["tagSheets"]    = sheet_list_to_dicts(get_sheets_by_tag(tag))
 
     html = render_react_component("ReaderApp", props)
     return render_to_response('s2.html', {
@@ -749,7 +749,7 @@ def edit_text_info(request, title=None, new_title=None):
                              RequestContext(request))
 
 
-@django_cache_decorator(6000)
+@memoize(6000, namespace=lambda oref, zoom=1: oref.index.title)
 def make_toc_html(oref, zoom=1):
     """
     Returns the HTML of a text's Table of Contents, including any alternate structures.
@@ -1237,10 +1237,14 @@ def interface_language_redirect(request, language):
 
 
 #todo: is this used elsewhere? move it?
-def count_and_index(c_oref, c_lang, vtitle, to_count=1):
+def count_and_index(c_oref, c_lang, vtitle, to_count=1, recount=True):
     # count available segments of text
+    # with recount False, the counts have already been updated (e.g. by tracker.modify_text), and only the toc is updated
     if to_count:
-        library.recount_index_in_toc(c_oref.index)
+        if recount:
+            library.recount_index_in_toc(c_oref.index)
+        else:
+            library.update_index_in_toc(c_oref.index)
 
     from sefaria.settings import SEARCH_INDEX_ON_SAVE
     if SEARCH_INDEX_ON_SAVE:
@@ -1327,17 +1331,17 @@ def texts_api(request, tref, lang=None, version=None):
             if not apikey:
                 return jsonResponse({"error": "Unrecognized API key."})
             t = json.loads(j)
-            chunk = tracker.modify_text(apikey["uid"], oref, t["versionTitle"], t["language"], t["text"], t["versionSource"], method="API", skip_links=skip_links)
             count_after = int(request.GET.get("count_after", 0))
-            count_and_index(oref, chunk.lang, chunk.vtitle, count_after)
+            chunk = tracker.modify_text(apikey["uid"], oref, t["versionTitle"], t["language"], t["text"], t["versionSource"], count_after=count_after, method="API", skip_links=skip_links)
+            count_and_index(oref, chunk.lang, chunk.vtitle, count_after, recount=False)
             return jsonResponse({"status": "ok"})
         else:
             @csrf_protect
             def protected_post(request):
                 t = json.loads(j)
-                chunk = tracker.modify_text(request.user.id, oref, t["versionTitle"], t["language"], t["text"], t["versionSource"], skip_links=skip_links)
                 count_after = int(request.GET.get("count_after", 1))
-                count_and_index(oref, chunk.lang, chunk.vtitle, count_after)
+                chunk = tracker.modify_text(request.user.id, oref, t["versionTitle"], t["language"], t["text"], t["versionSource"], count_after=count_after, skip_links=skip_links)
+                count_and_index(oref, chunk.lang, chunk.vtitle, count_after, recount=False)
                 return jsonResponse({"status": "ok"})
             return protected_post(request)
 
@@ -1379,12 +1383,12 @@ def parashat_hashavua_api(request):
 
 @catch_error_as_json
 def table_of_contents_api(request):
-    return jsonResponse(library.get_toc(), callback=request.GET.get("callback", None))
+    return serializedJsonResponse(request, library.get_toc_serialized(), callback=request.GET.get("callback", None))
 
 
 @catch_error_as_json
 def search_filter_table_of_contents_api(request):
-    return jsonResponse(library.get_search_filter_toc(), callback=request.GET.get("callback", None))
+    return serializedJsonResponse(request, library.get_search_filter_toc_serialized(), callback=request.GET.get("callback", None))
 
 
 @catch_error_as_json
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Writes history_snapshots for segments whose text history predates snapshots, at the changes where
+sefaria.model.history.snapshot_text_if_due() would have written them.
+The text at each snapshot is reconstructed from the current text, by applying revert patches backwards.
+
+Usage: python scripts/backfill_history_snapshots.py [--rebuild]
+    --rebuild   Remove existing snapshots first
+"""
+import sys
+from datetime import datetime
+
+from diff_match_patch import diff_match_patch
+
+from sefaria.model import *
+from sefaria.settings import HISTORY_SNAPSHOT_REVISIONS, HISTORY_SNAPSHOT_PATCH_BYTES
+from sefaria.system.database import db
+from sefaria.system.exceptions import InputError
+
+dmp = diff_match_patch()
+
+if "--rebuild" in sys.argv:
+    db.history_snapshots.remove({})
+
+segments = db.history.aggregate([
+    {"$match": {"revert_patch": {"$exists": True}}},
+    {"$group": {"_id": {"ref": "$ref", "version": "$version", "language": "$language"}, "changes": {"$sum": 1}}},
+    {"$match": {"changes": {"$gte": HISTORY_SNAPSHOT_REVISIONS}}},
+], allowDiskUse=True, cursor={})
+
+written = 0
+failed = []
+for segment in segments:
+    key = segment["_id"]
+    if db.history_snapshots.find_one(key):
+        continue
+    changes = list(db.history.find(dict(key, revert_patch={"$exists": True}), {"revert_patch": 1}).sort([["_id", 1]]))
+
+    # Choose snapshot positions going forward, as snapshot_text_if_due() does
+    positions = set()
+    revisions = patch_bytes = 0
+    for change in changes:
+        revisions += 1
+        patch_bytes += len(change["revert_patch"])
+        if revisions >= HISTORY_SNAPSHOT_REVISIONS or patch_bytes >= HISTORY_SNAPSHOT_PATCH_BYTES:
+            positions.add(change["_id"])
+            revisions = patch_bytes = 0
+
+    # Reconstruct the text at those positions going backward
+    try:
+        text = unicode(TextChunk(Ref(key["ref"]), key["language"], key["version"]).text)
+    except InputError as e:
+        failed.append((key, e))
+        continue
+    snapshots = []
+    for change in reversed(changes):
+        if change["_id"] in positions:
+            snapshots.append(dict(key, history_id=change["_id"], text=text, date=datetime.now()))
+        text = dmp.patch_apply(dmp.patch_fromText(change["revert_patch"]), text)[0]
+    if snapshots:
+        db.history_snapshots.insert(snapshots)
+        written += len(snapshots)
+
+for key, e in failed:
+    print u"Failed {}: {}".format(key, e)
+print "{} snapshots written, {} segments failed".format(written, len(failed))
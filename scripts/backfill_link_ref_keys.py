@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Sets `ref_keys` on every Link in the database, as Link._normalize() does on save.
+Once this has run, LINK_REF_KEY_QUERIES can be turned on.  See sefaria.model.link.ref_key_query
+
+Usage: python scripts/backfill_link_ref_keys.py
+"""
+from sefaria.model import *
+from sefaria.model.link import ref_key
+from sefaria.system.database import db
+from sefaria.system.exceptions import InputError
+
+BATCH_SIZE = 1000
+
+updated = 0
+failed = []
+batch = db.links.initialize_unordered_bulk_op()
+batched = 0
+
+for link in db.links.find({}, {"refs": 1}):
+    try:
+        keys = [ref_key(Ref(r)) for r in link["refs"]]
+    except (InputError, IndexError, KeyError, TypeError) as e:
+        failed.append((link["_id"], link.get("refs"), e))
+        continue
+    batch.find({"_id": link["_id"]}).update_one({"$set": {"ref_keys": keys}})
+    batched += 1
+    if batched >= BATCH_SIZE:
+        batch.execute()
+        updated += batched
+        batch = db.links.initialize_unordered_bulk_op()
+        batched = 0
+        print "{} links updated".format(updated)
+
+if batched:
+    batch.execute()
+    updated += batched
+
+for _id, refs, e in failed:
+    print u"Failed {} {}: {}".format(_id, refs, e)
+print "{} links updated, {} failed".format(updated, len(failed))
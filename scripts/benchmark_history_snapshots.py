@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Times reconstructing old revisions of a segment with a long synthetic history,
+applying every revert patch from the current text, and starting from the nearest snapshot.
+The synthetic history is written under a ref that matches no text, and removed afterwards.
+
+Usage: python scripts/benchmark_history_snapshots.py [number of changes]
+"""
+import random
+import sys
+import timeit
+from datetime import datetime
+
+from diff_match_patch import diff_match_patch
+
+from sefaria.model.history import snapshot_text_if_due, reconstruct_text
+from sefaria.system.database import db
+
+dmp = diff_match_patch()
+random.seed(1)
+
+CHANGES = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+KEY = {"ref": "History Benchmark 1:1", "version": "History Benchmark", "language": "en"}
+words = u"In the beginning God created the heaven and the earth and the earth was without form and void".split()
+
+try:
+    texts = [u""]
+    ids = []
+    for i in range(CHANGES):
+        tokens = texts[-1].split()
+        pos = random.randint(0, len(tokens))
+        if tokens and random.random() < 0.3:
+            del tokens[pos - 1]
+        else:
+            tokens.insert(pos, random.choice(words))
+        new_text = u" ".join(tokens)
+        patch = dmp.patch_toText(dmp.patch_make(dmp.diff_main(new_text, texts[-1])))
+        _id = db.history.insert(dict(KEY, revert_patch=patch, rev_type="edit text", user=0, date=datetime.now()))
+        snapshot_text_if_due(KEY["ref"], KEY["version"], KEY["language"], _id, new_text)
+        texts.append(new_text)
+        ids.append(_id)
+    print "{} changes, {} snapshots".format(CHANGES, db.history_snapshots.find(KEY).count())
+
+    current = lambda: texts[-1]
+    print u"{:>10}{:>14}{:>14}".format("revision", "replay ms", "snapshot ms")
+    for n in [1, CHANGES / 10, CHANGES / 2, CHANGES - 1]:
+        timings = []
+        for use_snapshots in (False, True):
+            start = timeit.default_timer()
+            text = reconstruct_text(KEY["ref"], KEY["version"], KEY["language"], ids[n - 1], current, use_snapshots=use_snapshots)
+            timings.append((timeit.default_timer() - start) * 1000)
+            assert text == texts[n], "Revision {} reconstructed wrong{}".format(n, " from snapshot" if use_snapshots else "")
+        print u"{:>10}{:>14.1f}{:>14.1f}".format(n, *timings)
+finally:
+    db.history.remove(KEY)
+    db.history_snapshots.remove(KEY)
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Compares JaggedTextArray with FlatJaggedTextArray on synthetic texts the size of the Bavli and of the Mishneh Torah.
+
+Usage: python scripts/benchmark_jagged_array.py
+"""
+import random
+import timeit
+
+from sefaria.datatype.jagged_array import JaggedTextArray, FlatJaggedTextArray
+
+random.seed(613)
+WORDS = [u"אמר", u"רבי", u"יוחנן", u"משום", u"שמעון", u"בן", u"יוחאי", u"mitzvah", u"the", u"law"]
+
+
+def segment(n_words):
+    return u" ".join(random.choice(WORDS) for _ in xrange(n_words))
+
+
+def synthetic(shape):
+    """
+    :param shape: list of (min, max) lengths at each depth.  The last pair is the number of words in a segment.
+    """
+    if len(shape) == 1:
+        return segment(random.randint(*shape[0]))
+    return [synthetic(shape[1:]) for _ in xrange(random.randint(*shape[0]))]
+
+
+TEXTS = {
+    "Bavli (amud, segment)": [(5400, 5400), (5, 25), (10, 60)],
+    "Mishneh Torah (book, chapter, halakhah)": [(83, 83), (10, 25), (5, 20), (20, 80)],
+}
+
+OPERATIONS = [
+    ("element_count", lambda j: j.element_count()),
+    ("word_count", lambda j: j.word_count()),
+    ("char_count", lambda j: j.char_count()),
+    ("flatten_to_array", lambda j: j.flatten_to_array()),
+    ("mask", lambda j: j.mask()),
+    ("100 sections", lambda j: [j.subarray([i]).word_count() for i in xrange(0, len(j), max(1, len(j) / 100))]),
+]
+
+
+def timed(fn, repeat=3):
+    return min(timeit.repeat(fn, number=1, repeat=repeat))
+
+
+for name, shape in TEXTS.items():
+    text = synthetic(shape)
+    print u"\n{}: {} segments".format(name, JaggedTextArray(text).element_count())
+    print u"{:<20}{:>12}{:>12}{:>12}".format("", "nested", "flat cold", "flat warm")
+    for op_name, op in OPERATIONS:
+        # Fresh objects for every run, so that neither representation benefits from cached counts.
+        # "flat cold" includes building the flat arrays, "flat warm" reuses them.
+        nested_time = timed(lambda: op(JaggedTextArray(text)))
+        cold_time = timed(lambda: op(FlatJaggedTextArray(text)))
+        flat = FlatJaggedTextArray(text)
+        op(flat)
+        warm_time = timed(lambda: op(flat))
+        print u"{:<20}{:>12.4f}{:>12.4f}{:>12.4f}".format(op_name, nested_time, cold_time, warm_time)
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the time to build the Library's core maps from the database with the time to load them from a snapshot.
+
+Usage: python scripts/benchmark_library_snapshot.py [snapshot path]
+"""
+import sys
+import timeit
+import tempfile
+
+from sefaria.model import *
+from sefaria.model.text import get_library_version_stamp
+
+path = sys.argv[1] if len(sys.argv) > 1 else tempfile.mktemp(suffix=".pkl")
+stamp = get_library_version_stamp()
+
+built = Library(build_maps=False)
+start = timeit.default_timer()
+built._build_core_maps()
+for lang in built.langs:
+    built.get_term_dict(lang)
+build_time = timeit.default_timer() - start
+
+start = timeit.default_timer()
+assert built.save_snapshot(path, stamp)
+save_time = timeit.default_timer() - start
+
+loaded = Library(build_maps=False)
+start = timeit.default_timer()
+assert loaded.load_snapshot(path, stamp)
+load_time = timeit.default_timer() - start
+
+assert set(loaded._index_map.keys()) == set(built._index_map.keys())
+assert set(loaded._title_node_maps["en"].keys()) == set(built._title_node_maps["en"].keys())
+
+print "Indexes: {}".format(len(built._index_map))
+print "Build from database: {:.2f}s".format(build_time)
+print "Write snapshot:      {:.2f}s".format(save_time)
+print "Load from snapshot:  {:.2f}s".format(load_time)
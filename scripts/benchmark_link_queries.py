@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Compares finding the links of a Ref with the regular expressions of Ref.regex(), as LinkSet does by default,
+and with range predicates on `ref_keys`, as LinkSet does with LINK_REF_KEY_QUERIES on.
+Requires scripts/backfill_link_ref_keys.py to have been run.
+
+Usage: python scripts/benchmark_link_queries.py [ref ...]
+"""
+import sys
+import timeit
+
+from sefaria.model import *
+from sefaria.model.link import ref_key_query, ref_key_applies
+from sefaria.system.database import db
+
+REPEAT = 5
+
+trefs = sys.argv[1:] or [
+    "Genesis 1",
+    "Genesis 1:1",
+    "Genesis 1:30-2:3",
+    "Exodus 20",
+    "Berakhot 2a",
+    "Shabbat 31a",
+    "Rashi on Genesis 1",
+    "Mishneh Torah, Sabbath 1",
+]
+
+
+def timed(query, hint=None):
+    def fetch():
+        cursor = db.links.find(query, {"_id": 1})
+        if hint:
+            cursor = cursor.hint(hint)
+        return set(l["_id"] for l in cursor)
+    ids = fetch()
+    start = timeit.default_timer()
+    for _ in range(REPEAT):
+        fetch()
+    return ids, (timeit.default_timer() - start) / REPEAT
+
+
+print u"{:<32}{:>8}{:>12}{:>12}".format("Ref", "links", "regex ms", "keys ms")
+for tref in trefs:
+    oref = Ref(tref)
+    if not ref_key_applies(oref):
+        print u"{:<32} not applicable".format(tref)
+        continue
+    regex_ids, regex_time = timed({"$or": [{"refs": {"$regex": r}} for r in oref.regex(as_list=True)]}, [("refs", 1)])
+    key_ids, key_time = timed(ref_key_query(oref))
+    assert regex_ids == key_ids, u"{}: {} links by regex, {} by keys".format(tref, len(regex_ids), len(key_ids))
+    print u"{:<32}{:>8}{:>12.1f}{:>12.1f}".format(tref, len(key_ids), regex_time * 1000, key_time * 1000)
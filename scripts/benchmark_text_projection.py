@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Measures the bytes of Version content fetched from the database for a TextChunk, when sliced at the top level only
+with Ref.part_projection(), and when sliced down to the Ref with Ref.part_pipeline().
+
+Usage: python scripts/benchmark_text_projection.py [ref ...]
+"""
+import sys
+import timeit
+
+from bson import BSON
+
+from sefaria.model import *
+from sefaria.system.database import db
+
+trefs = sys.argv[1:] or [
+    "Genesis 1:1",
+    "Genesis 1:1-5",
+    "Genesis 1:30-2:3",
+    "Rashi on Genesis 1:1",
+    "Rashi on Genesis 1:1:1",
+    "Shabbat 31a:6",
+    "Mishneh Torah, Sabbath 1:1",
+    "Shulchan Arukh, Orach Chayim 1:1",
+]
+
+
+def fetched(fetch):
+    start = timeit.default_timer()
+    docs = list(fetch())
+    return sum(len(BSON.encode(d)) for d in docs), len(docs), timeit.default_timer() - start
+
+
+print u"{:<36}{:>10}{:>14}{:>14}{:>10}{:>10}".format("Ref", "versions", "projected B", "sliced B", "proj ms", "slice ms")
+total_projected = total_sliced = 0
+for tref in trefs:
+    oref = Ref(tref)
+    query = oref.condition_query()
+    pipeline = oref.part_pipeline(query)
+    if pipeline is None:
+        print u"{:<36} no sliced pipeline available".format(tref)
+        continue
+    projected, count, projected_time = fetched(lambda: db.texts.find(query, oref.part_projection()))
+    sliced, _, sliced_time = fetched(lambda: db.texts.aggregate(pipeline)["result"])
+    total_projected += projected
+    total_sliced += sliced
+    print u"{:<36}{:>10}{:>14}{:>14}{:>10.1f}{:>10.1f}".format(tref, count, projected, sliced, projected_time * 1000, sliced_time * 1000)
+
+print u"{:<36}{:>10}{:>14}{:>14}".format("Total", "", total_projected, total_sliced)
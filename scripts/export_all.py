@@ -4,8 +4,13 @@
 import sys
 import os
 import csv
+import argparse
 
 import sefaria.export as export
 
-export.export_all()
+parser = argparse.ArgumentParser()
+parser.add_argument("-p", "--processes", type=int, default=4, help="number of export worker processes")
+parser.add_argument("-f", "--full", action="store_true", help="clear and export everything, rather than only what changed")
+args = parser.parse_args()
 
+export.export_all(processes=args.processes, incremental=not args.full)
@@ -1,5 +1,6 @@
 import sefaria.model as model
 from sefaria.system.database import db
+from sefaria.model.abstract import invalidate_record_cache
 from sefaria.clean import remove_old_counts
 
 # Remove duplicate 'Sefer Abudraham'
@@ -9,6 +10,7 @@ db.index.remove({"title": "Tiferet Yisrael "})
 db.index.remove({"title": "Igrot Moshe "})
 db.index.remove({"title": "The Sabbath, Heschel  "})
 db.index.remove({"title": "Sifre Devarim "})
+invalidate_record_cache(model.Index)
 
 remove_old_counts()
 
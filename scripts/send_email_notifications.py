@@ -2,6 +2,9 @@
 """
 Send unread notifcations for users with a particular notificationg setting
 (daily, weekly, or all)
+
+Usage: send_email_notifications.py <timeframe> [processes]
+A run that is interrupted can be started again; notifications already emailed are marked read.
 """
 import sys
 
@@ -11,4 +14,5 @@ if len(sys.argv) < 2 or sys.argv[1] not in ("all", "daily", "weekly"):
 	print "Please specify a timeframe for which notifications should be emailed."
 	print "Options are: 'all', 'daily', 'weekly'"
 else:
-	email_unread_notifications(sys.argv[1])
+	processes = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+	print email_unread_notifications(sys.argv[1], processes=processes)
@@ -35,6 +35,25 @@ def jsonpResponse(data, callback, status=200):
     return HttpResponse("%s(%s)" % (callback, json.dumps(data)), mimetype="application/javascript", status=status)
 
 
+def serializedJsonResponse(request, serialized, callback=None):
+    """
+    Responds with pre-serialized JSON, such as a :class:`sefaria.summaries.SerializedToc`, without encoding it again.
+    Serves the compressed variant the client accepts, and answers a matching If-None-Match with 304.
+    """
+    if callback:
+        return HttpResponse("%s(%s)" % (callback, serialized.json), mimetype="application/javascript")
+    if request.META.get("HTTP_IF_NONE_MATCH") == serialized.etag:
+        response = HttpResponse(status=304)
+    else:
+        content, encoding = serialized.encoded(request.META.get("HTTP_ACCEPT_ENCODING"))
+        response = HttpResponse(content, mimetype="application/json")
+        if encoding:
+            response["Content-Encoding"] = encoding
+    response["ETag"] = serialized.etag
+    response["Vary"] = "Accept-Encoding"
+    return response
+
+
 def subscribe_to_list(lists, email, first_name=None, last_name=None, direct_sign_up=False, bypass_nationbuilder=False):
 
     if not sls.NATIONBUILDER:
@@ -143,8 +143,10 @@ def get_links(tref, with_text=True):
     lenRef = len(nRef)
     reRef = oref.regex() if oref.is_range() else None
 
-    # for storing all the section level texts that need to be looked up
-    texts = {}
+    # pairs of (client link object, section level Refs of the linked text), for attaching text once it is all loaded
+    coms = []
+    # top level section Refs of all linked texts, keyed by normal form
+    top_orefs = {}
 
     linkset = LinkSet(oref)
     # For all links that mention ref (in any position)
@@ -165,31 +167,98 @@ def get_links(tref, with_text=True):
             logger.error(u"AttributeError in presenting link: {} - {} : {}".format(link.refs[0], link.refs[1], e))
             continue
 
+        if not with_text:
+            links.append(com)
+            continue
+
         # Rather than getting text with each link, walk through all links here,
-        # caching text so that redundant DB calls can be minimized
+        # so that the text of all linked sections can be loaded together.
         # If link is spanning, split into section refs and rejoin
-        try:
-            if with_text:
-                original_com_oref = Ref(com["ref"])
-                com_orefs = original_com_oref.split_spanning_ref()
-                for com_oref in com_orefs:
-                    top_oref = com_oref.top_section_ref()
-                    # Lookup and save top level text, only if we haven't already
-                    top_nref = top_oref.normal()
-                    if top_nref not in texts:
-                        texts[top_nref] = {lang: TextChunk(top_oref, lang).ja() for lang in ["he", "en"]}
-                    sections = [i - 1 for i in com_oref.sections[1:]]
-                    toSections = [i - 1 for i in com_oref.toSections[1:]]
-                    for lang, attr in [("he", "he"), ("en", "text")]:
-                        res = texts[top_nref][lang].subarray(sections, toSections).array()
-                        if attr not in com:
-                            com[attr] = res
-                        else:
-                            if isinstance(com[attr], basestring):
-                                com[attr] = [com[attr]]
-                            com[attr] += res
-            links.append(com)
-        except NoVersionFoundError as e:
-            logger.warning("Trying to get non existent text for ref '{}'. Link refs were: {}".format(top_nref, link.refs))
+        com_orefs = Ref(com["ref"]).split_spanning_ref()
+        for com_oref in com_orefs:
+            top_oref = com_oref.top_section_ref()
+            top_orefs[top_oref.normal()] = top_oref
+        coms.append((com, com_orefs, link))
+
+    if not with_text:
+        return links
+
+    texts = load_section_texts(top_orefs.values())
+    for com, com_orefs, link in coms:
+        top_nrefs = [com_oref.top_section_ref().normal() for com_oref in com_orefs]
+        missing = [top_nref for top_nref in top_nrefs if texts[top_nref] is None]
+        if missing:
+            logger.warning("Trying to get non existent text for ref '{}'. Link refs were: {}".format(missing[0], link.refs))
             continue
+        for com_oref, top_nref in zip(com_orefs, top_nrefs):
+            sections = [i - 1 for i in com_oref.sections[1:]]
+            toSections = [i - 1 for i in com_oref.toSections[1:]]
+            for lang, attr in [("he", "he"), ("en", "text")]:
+                res = texts[top_nref][lang].subarray(sections, toSections).array()
+                if attr not in com:
+                    com[attr] = res
+                else:
+                    if isinstance(com[attr], basestring):
+                        com[attr] = [com[attr]]
+                    com[attr] += res
+        links.append(com)
     return links
+
+
+def load_section_texts(top_orefs):
+    """
+    Loads the Hebrew and English text of each of `top_orefs`, as :class:`TextChunk` would, merging versions where there are several.
+    All of the Versions of a book are fetched with one query, projected to the span of sections requested,
+    rather than with two queries per section.
+
+    :param top_orefs: list of top level section :class:`Ref` objects
+    :return: dict from the normal form of each Ref to {"he": JaggedTextArray, "en": JaggedTextArray},
+        or to None if there are no Versions of its book
+    """
+    texts = {}
+    groups = {}
+    for top_oref in top_orefs:
+        groups.setdefault((top_oref.index.title, top_oref.storage_address()), []).append(top_oref)
+
+    for (title, address), orefs in groups.iteritems():
+        sectioned = [o for o in orefs if o.sections]
+        projection = orefs[0].part_projection()
+        first = 1
+        if sectioned:
+            first = min(o.sections[0] for o in sectioned)
+            last = max(o.toSections[0] for o in sectioned)
+            projection[address] = {"$slice": [first - 1, last - first + 1]}
+        if len(sectioned) < len(orefs):  # whole book of a depth 1 text
+            projection[address] = 1
+            first = 1
+
+        versions = VersionSet({"title": title}, proj=projection).array()
+        for o in orefs:
+            if not versions:
+                texts[o.normal()] = None
+                continue
+            texts[o.normal()] = {}
+            for lang in ["he", "en"]:
+                contents, vtitles = [], []
+                for v in versions:
+                    if v.language != lang:
+                        continue
+                    try:
+                        content = v.content_node(o.index_node)
+                    except (KeyError, AttributeError):
+                        continue
+                    if o.sections:
+                        i = o.sections[0] - first
+                        if i >= len(content):
+                            continue
+                        content = content[i:o.toSections[0] - first + 1] if o.is_range() else content[i]
+                    contents.append(content)
+                    vtitles.append(getattr(v, "versionTitle", None))
+                if not contents:
+                    text = []
+                elif len(contents) == 1:
+                    text = contents[0]
+                else:
+                    text = merge_texts(contents, vtitles)[0]
+                texts[o.normal()][lang] = JaggedTextArray(text)
+    return texts
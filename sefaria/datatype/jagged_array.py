@@ -10,6 +10,8 @@ jagged_array.py: a sparse array of arrays
 # Potentially problematic methods marked with '#warning, writes!'
 
 import re
+from array import array
+from itertools import islice
 
 
 class JaggedArray(object):
@@ -696,4 +698,292 @@ class JaggedIntArray(JaggedArray):
             sum = 0
             for i in range(len(curr)):
                 sum += JaggedIntArray._depth_sum(curr[i], depth - 1)
-            return sum
\ No newline at end of file
+            return sum
+
+class _FlatStore(object):
+    """
+    Storage shared by a :class:`FlatJaggedArray` and the subarrays taken from it.
+
+    ``offsets[k]`` maps the nodes at level k to their children at level k + 1:
+    the children of node i are the nodes ``offsets[k][i]`` to ``offsets[k][i + 1]``.
+    Level 0 holds only the root.  The terminal elements are the nodes at level ``depth``, held in ``values``.
+    """
+    word_split = re.compile(ur"[\s\u05be]+")
+
+    def __init__(self, ja):
+        self.values = []
+        self.offsets = []
+        self._word_prefix = None
+        self._char_prefix = None
+
+        nodes = [ja]
+        while True:
+            children = []
+            offsets = array('l', [0])
+            for node in nodes:
+                children.extend(node)
+                offsets.append(len(children))
+            self.offsets.append(offsets)
+            lists = sum(1 for c in children if isinstance(c, list))
+            if lists and lists < len(children):
+                raise ValueError(u"FlatJaggedArray requires all elements at a given depth to be either lists or terminal values")
+            if not lists:
+                self.values = children
+                break
+            nodes = children
+        self.depth = len(self.offsets)
+
+    def prefix_sums(self, count):
+        p = array('l', [0])
+        total = 0
+        for v in self.values:
+            total += count(v)
+            p.append(total)
+        return p
+
+    def word_prefix(self):
+        if self._word_prefix is None:
+            split = self.word_split.split
+            self._word_prefix = self.prefix_sums(lambda v: len(split(v.strip())) if isinstance(v, basestring) else 0)
+        return self._word_prefix
+
+    def char_prefix(self):
+        if self._char_prefix is None:
+            self._char_prefix = self.prefix_sums(lambda v: len(v) if isinstance(v, basestring) else 0)
+        return self._char_prefix
+
+
+class FlatJaggedArray(JaggedArray):
+    """
+    A JaggedArray held as flat arrays of offsets and terminal values, rather than as nested lists.
+
+    Counts are O(depth) (word and character counts after a one-time prefix sum), subarrays are views
+    that share storage with the array they are taken from, and flattening is a single slice.
+    The nested list is built only when it is asked for, via :meth:`array`, or by a method that is not reimplemented here.
+
+    All elements at a given depth must be either lists or terminal values - see :meth:`JaggedArray.normalize`.
+    Unlike :class:`JaggedArray`, writes to a subarray do not reach the array it was taken from.
+    """
+
+    def __init__(self, ja=None):
+        JaggedArray.__init__(self, ja)
+
+    def _get_store(self):
+        if self._nested is None:
+            if self._scalar:
+                self._nested = self._flat.values[0]
+            else:
+                self._nested = self._build(self._base + 1, self._lo[self._base + 1], self._hi[self._base + 1])
+        return self._nested
+
+    def _set_store(self, ja):
+        self._nested = ja
+        self._scalar = not isinstance(ja, list)
+        self._flat = _FlatStore([ja] if self._scalar else ja)
+        self._base = 0  # Level of the root node
+        self._lo = [0] * (self._flat.depth + 1)
+        self._hi = [len(self._flat.offsets[k]) - 1 for k in range(self._flat.depth)] + [len(self._flat.values)]
+
+    _store = property(_get_store, _set_store)
+
+    def _view(self, base, lo, hi):
+        view = self.__class__.__new__(self.__class__)
+        view._reinit()
+        view._nested = None
+        view._scalar = False
+        view._flat = self._flat
+        view._base = base
+        view._lo = lo
+        view._hi = hi
+        return view
+
+    def _children(self, k, i, lo, hi):
+        """
+        :return: The range of the children of node `i` at level `k`, within the window `lo`, `hi`
+        """
+        off = self._flat.offsets[k]
+        return max(off[i], lo[k + 1]), min(off[i + 1], hi[k + 1])
+
+    def _narrow(self, k, lo, hi):
+        """
+        Shrinks the windows below level `k` to the descendants of the nodes in the window at level `k`.
+        """
+        for j in range(k, self._flat.depth):
+            if lo[j] >= hi[j]:
+                lo[j + 1] = hi[j + 1] = lo[j + 1]
+                continue
+            off = self._flat.offsets[j]
+            lo[j + 1] = max(off[lo[j]], lo[j + 1])
+            hi[j + 1] = max(min(off[hi[j]], hi[j + 1]), lo[j + 1])
+
+    def _build(self, k, lo, hi, values=None, values_start=0):
+        """
+        :return: Nested list of the nodes `lo` to `hi` at level `k`
+        """
+        if k == self._flat.depth:
+            values = self._flat.values if values is None else values
+            return values[lo - values_start:hi - values_start]
+        return [self._build(k + 1, c_lo, c_hi, values, values_start)
+                for c_lo, c_hi in (self._children(k, i, self._lo, self._hi) for i in xrange(lo, hi))]
+
+    def _leaf_range(self):
+        return self._lo[-1], self._hi[-1]
+
+    def element_count(self):
+        lo, hi = self._leaf_range()
+        return hi - lo
+
+    def is_empty(self, _cur=None):
+        if _cur is not None:
+            return super(FlatJaggedArray, self).is_empty(_cur)
+        lo, hi = self._leaf_range()
+        return not any(islice(self._flat.values, lo, hi))
+
+    def depth(self, _cur=None, deep=False):
+        if _cur is not None:
+            return super(FlatJaggedArray, self).depth(_cur, deep)
+        if self._scalar:
+            return 0
+        # Empty lists count as one level, so the depth is set by the deepest level that has any nodes
+        for k in range(self._flat.depth, self._base, -1):
+            if self._lo[k] < self._hi[k]:
+                return k - self._base + (0 if k == self._flat.depth else 1)
+        return 0
+
+    def sub_array_length(self, indexes=None, until_last_nonempty=False):
+        indexes = indexes or []
+        if self._scalar or len(indexes) >= self.depth() or any(i < 0 for i in indexes):
+            return super(FlatJaggedArray, self).sub_array_length(indexes, until_last_nonempty)
+        lo, hi = self._lo, self._hi
+        k = self._base + 1
+        c_lo, c_hi = lo[k], hi[k]
+        for i in indexes:
+            if i > c_hi - c_lo - 1:
+                return None
+            c_lo, c_hi = self._children(k, c_lo + i, lo, hi)
+            k += 1
+        result = c_hi - c_lo
+        if until_last_nonempty and k < self._flat.depth:
+            while result > 0:
+                l_lo, l_hi = self._children(k, c_lo + result - 1, lo, hi)
+                if l_hi > l_lo:
+                    break
+                result -= 1
+        return result
+
+    def get_element(self, indx_list):
+        if self._scalar:
+            return super(FlatJaggedArray, self).get_element(indx_list)
+        lo, hi = self._lo, self._hi
+        k = self._base + 1
+        c_lo, c_hi = lo[k], hi[k]
+        for n, i in enumerate(indx_list):
+            if k > self._flat.depth:
+                return super(FlatJaggedArray, self).get_element(indx_list)
+            if i < 0:
+                i += c_hi - c_lo
+            if not 0 <= i < c_hi - c_lo:
+                raise IndexError(u"Index {} out of range".format(indx_list))
+            if k == self._flat.depth:
+                if n == len(indx_list) - 1:
+                    return self._flat.values[c_lo + i]
+                return super(FlatJaggedArray, self).get_element(indx_list)
+            c_lo, c_hi = self._children(k, c_lo + i, lo, hi)
+            k += 1
+        return self._build(k, c_lo, c_hi)
+
+    def subarray(self, start_indexes, end_indexes=None):
+        if not end_indexes:
+            end_indexes = start_indexes
+        assert len(start_indexes) == len(end_indexes)
+        if self._scalar or any(i < 0 for i in start_indexes + end_indexes):
+            return super(FlatJaggedArray, self).subarray(start_indexes, end_indexes)
+
+        range_index = len(start_indexes)
+        for i in range(0, len(start_indexes)):
+            if start_indexes[i] != end_indexes[i]:
+                range_index = i
+                break
+
+        depth = self._flat.depth
+        base, lo, hi = self._base, list(self._lo), list(self._hi)
+        for i in range(0, range_index):  # Single element
+            k = base + 1
+            if k > depth or lo[k] + start_indexes[i] >= hi[k]:
+                return self.__class__([])
+            node = lo[k] + start_indexes[i]
+            if k == depth:
+                return self.__class__(self._flat.values[node])
+            base = k
+            lo[k], hi[k] = node, node + 1
+            self._narrow(k, lo, hi)
+
+        for i in range(range_index, len(start_indexes)):
+            k = base + 1 + i - range_index
+            if k > depth:
+                break
+            if i == range_index:  # Range begins here
+                lo[k], hi[k] = min(lo[k] + start_indexes[i], hi[k]), min(lo[k] + end_indexes[i] + 1, hi[k])
+            else:  # Range continues here: trim the first and last of the elements within the range
+                p = k - 1
+                if lo[p] < hi[p]:
+                    first_lo, first_hi = self._children(p, lo[p], lo, hi)
+                    lo[k] = min(first_lo + start_indexes[i], first_hi)
+                    last_lo, last_hi = self._children(p, hi[p] - 1, lo, hi)
+                    hi[k] = max(min(last_lo + end_indexes[i] + 1, last_hi), lo[k])
+            self._narrow(k, lo, hi)
+
+        return self._view(base, lo, hi)
+
+    def mask(self, __curr=None):
+        if __curr is not None or self._scalar:
+            return JaggedArray.mask(self, __curr)
+        lo, hi = self._leaf_range()
+        values = [1 if v else 0 for v in islice(self._flat.values, lo, hi)]
+        k = self._base + 1
+        return JaggedIntArray(self._build(k, self._lo[k], self._hi[k], values, lo))
+
+    def flatten_to_array(self, _cur=None):
+        if _cur is not None:
+            return super(FlatJaggedArray, self).flatten_to_array(_cur)
+        lo, hi = self._leaf_range()
+        return self._flat.values[lo:hi]
+
+    # warning, writes!
+    def set_element(self, indx_list, value, pad=None):
+        super(FlatJaggedArray, self).set_element(indx_list, value, pad)
+        self._store = self._store
+        self._reinit()
+        return self
+
+    # warning, writes!
+    def normalize(self, terminal_depth=None, _cur=None, depth=1):
+        normalized = super(FlatJaggedArray, self).normalize(terminal_depth, _cur, depth)
+        if _cur is None and normalized:
+            self._store = self._store
+            self._reinit()
+        return normalized
+
+
+class FlatJaggedTextArray(FlatJaggedArray, JaggedTextArray):
+    """
+    :class:`JaggedTextArray` over the flat storage of :class:`FlatJaggedArray`.
+    """
+
+    def __init__(self, ja=None):
+        JaggedTextArray.__init__(self, ja)
+
+    def word_count(self):
+        lo, hi = self._leaf_range()
+        p = self._flat.word_prefix()
+        return p[hi] - p[lo]
+
+    def char_count(self):
+        lo, hi = self._leaf_range()
+        p = self._flat.char_prefix()
+        return p[hi] - p[lo]
+
+    def flatten_to_array(self, _cur=None):
+        if _cur is not None:
+            return JaggedTextArray.flatten_to_array(self, _cur)
+        return [v if isinstance(v, unicode) else unicode(v) for v in FlatJaggedArray.flatten_to_array(self)]
@@ -282,3 +282,44 @@ class Test_Depth_0(object):
         assert j.mask() == ja.JaggedIntArray(1)
         assert j.flatten_to_array() == ["Fee Fi Fo Fum"]
 
+
+
+class Test_Flat_Jagged_Text_Array(object):
+    def test_round_trip(self):
+        assert ja.FlatJaggedTextArray(threeby).array() == threeby
+        assert ja.FlatJaggedTextArray([[], [["a"]]]).array() == [[], [["a"]]]
+        assert ja.FlatJaggedTextArray([]).array() == []
+
+    def test_counts_match_nested(self):
+        for a in [twoby, threeby, [["", "foo"], [], ["bar baz"]]]:
+            nested, flat = ja.JaggedTextArray(a), ja.FlatJaggedTextArray(a)
+            assert flat.element_count() == nested.element_count()
+            assert flat.word_count() == nested.word_count()
+            assert flat.char_count() == nested.char_count()
+            assert flat.flatten_to_array() == nested.flatten_to_array()
+            assert flat.mask() == nested.mask()
+            assert flat.depth() == nested.depth()
+
+    def test_subarray_matches_nested(self):
+        for start, end in [([0], [0]), ([1], [2]), ([1, 1, 1], [1, 2, 1]), ([1, 1, 1], [1, 1, 2]), ([0, 2], [2, 0]), ([5], [5])]:
+            nested = ja.JaggedTextArray(threeby).subarray(start, end)
+            flat = ja.FlatJaggedTextArray(threeby).subarray(start, end)
+            assert flat.array() == nested.array()
+            assert flat.word_count() == nested.word_count()
+            assert flat.element_count() == nested.element_count()
+
+    def test_sub_array_length(self):
+        sparse = [["", "", ""], ["", "foo", "", "bar", ""], ["", "", ""], []]
+        assert ja.FlatJaggedTextArray(sparse).sub_array_length([], until_last_nonempty=True) == 3
+        assert ja.FlatJaggedTextArray(sparse).sub_array_length([1]) == 5
+        assert ja.FlatJaggedTextArray(sparse).sub_array_length([7]) is None
+
+    def test_set_element(self):
+        j = ja.FlatJaggedTextArray([["a", "b"], ["c"]]).set_element([1, 1], "d")
+        assert j.array() == [["a", "b"], ["c", "d"]]
+        assert j.get_element([1, 1]) == "d"
+        assert j.element_count() == 4
+
+    def test_irregular(self):
+        with pytest.raises(ValueError):
+            ja.FlatJaggedTextArray(["a", [], ["b"]])
@@ -2,6 +2,9 @@
 export.py - functions for exporting texts to various text formats.
 
 Exports to the directory specified in SEFARIA_EXPORT_PATH.
+Texts are exported in units - a version, or the merged text of an index in one language.
+The content hash and files of each unit are recorded in a manifest next to SEFARIA_EXPORT_PATH (EXPORT_MANIFEST_PATH),
+so that an incremental export only rewrites units whose content changed.
 """
 import sys
 import os
@@ -9,6 +12,9 @@ import io
 import unicodecsv as csv
 import re
 import json
+import time
+import hashlib
+from multiprocessing import Pool
 from shutil import rmtree
 from random import random
 from pprint import pprint
@@ -31,6 +37,11 @@ lang_codes = {
     "en": "English"
 }
 
+EXPORT_MANIFEST_PATH = SEFARIA_EXPORT_PATH.rstrip("/") + "_manifest.json"
+
+# Change when the output of export formats changes, so that incremental exports rewrite every unit
+EXPORT_FORMAT_VERSION = 1
+
 
 def log_error(msg):
     msg = '{}\n'.format(msg)
@@ -271,24 +282,40 @@ def clear_exports():
     if os.path.exists(SEFARIA_EXPORT_PATH + "/links"):
         rmtree(SEFARIA_EXPORT_PATH + "/links")
 
+def write_atomic(path, content):
+    """
+    Writes 'content' to 'path' through a temporary file, so that readers never see a partly written file.
+    """
+    if not os.path.exists(os.path.dirname(path)):
+        try:
+            os.makedirs(os.path.dirname(path))
+        except OSError:  # created by another worker
+            pass
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.rename(tmp_path, path)
+
+
 def write_text_doc_to_disk(doc=None):
     """
     Writes document to disk according to all formats in export_formats
+    Returns the list of paths written.
     """
     assert doc is not None
+    paths = []
     for format in export_formats:
         out = format[1](doc)
         if not out:
             print "Skipping %s - no content" % doc["title"]
-            return
+            return paths
         path = make_path(doc, format[0], extension=format[2] if len(format) == 3 else None)
-        if not os.path.exists(os.path.dirname(path)):
-            os.makedirs(os.path.dirname(path))
         try:
-            with open(path, "w") as f:
-                f.write(out.encode('utf-8'))
-        except IOError as e:
+            write_atomic(path, out.encode('utf-8'))
+            paths.append(path)
+        except (IOError, OSError) as e:
             log_error('failed to write to disk: {}'.format(str(e)))
+    return paths
 
 def prepare_text_for_export(text):
     """
@@ -308,7 +335,7 @@ def prepare_text_for_export(text):
         return
 
     text["heTitle"] = index.nodes.primary_title("he")
-    text["categories"] = index.categories
+    text["categories"] = index.categories[:]  # make_path() may modify the categories of the doc
 
     text["text"] = text.get("text", None) or text.get("chapter", "")
 
@@ -352,29 +379,36 @@ def text_is_copyright(text):
            and text["license"].startswith("Copyright")
 
 
-def export_texts():
+def export_texts(processes=1, manifest=None):
     """
     Step through every text in the texts collection and export it with each format
     listed in export_formats.
+    With a 'manifest', only texts that changed since the manifest was written are exported again.
+    Otherwise, all exports are cleared first.
+    Returns an :class:`ExportStats`.
     """
-    clear_exports()
+    if manifest is None:
+        clear_exports()
 
-    texts = db.texts.find()
+    texts = db.texts.find({}, {"title": 1, "versionTitle": 1, "language": 1, "license": 1})
 
-    for text in texts:
-        if text_is_copyright(text):
-            # Don't export copyrighted texts.
-            continue
+    # Don't export copyrighted texts.
+    units = [("version", text["title"], text["language"], text["versionTitle"]) for text in texts if not text_is_copyright(text)]
+    return export_units(units, processes, manifest)
 
-        prepped_text = prepare_text_for_export(text)
-        if prepped_text:
-            write_text_doc_to_disk(prepped_text)
 
+def _merged_text_docs(title, lang):
+    text_docs = db.texts.find({"title": title, "language": lang}).sort([["priority", -1], ["_id", 1]])
+
+    # Exclude copyrighted docs from merging
+    return [text for text in text_docs if not text_is_copyright(text)]
 
-def prepare_merged_text_for_export(title, lang=None):
+
+def prepare_merged_text_for_export(title, lang=None, text_docs=None):
     """
     Exports a "merged" version of title, including the maximal text we have available
     in a single document.
+    :param text_docs: The non copyrighted versions of title in lang, by priority.  Loaded if not passed.
     """
 
     assert lang is not None
@@ -385,13 +419,10 @@ def prepare_merged_text_for_export(title, lang=None):
         "versionTitle": "merged",
         "versionSource": "https://www.sefaria.org/%s" % title.replace(" ", "_"),
     }
-    text_docs = db.texts.find({"title": title, "language": lang}).sort([["priority", -1], ["_id", 1]])
+    if text_docs is None:
+        text_docs = _merged_text_docs(title, lang)
 
-    print "%d versions in %s" % (text_docs.count(), lang)
-
-
-    # Exclude copyrighted docs from merging
-    text_docs = [text for text in text_docs if not text_is_copyright(text)]
+    print "%d versions in %s" % (len(text_docs), lang)
     
     if len(text_docs) == 0:
         return
@@ -423,26 +454,172 @@ def prepare_merged_text_for_export(title, lang=None):
     return prepare_text_for_export(doc)
 
 
-def export_all_merged():
+def export_all_merged(processes=1, manifest=None):
     """
     Iterate through all index records and exports a merged text for each.
+    With a 'manifest', only merged texts whose versions changed since the manifest was written are exported again.
+    Returns an :class:`ExportStats`.
     """
     texts = db.texts.find().distinct("title")
 
+    units = []
     for title in texts:
+        if not title:
+            log_error('None title in texts')
+            continue
         try:
             Ref(title)
         except:
             continue
+        units += [("merged", title, lang, "merged") for lang in ("he", "en")]
+    return export_units(units, processes, manifest)
+
+
+class ExportManifest(object):
+    """
+    Content hash and written paths of each exported unit, stored as JSON at EXPORT_MANIFEST_PATH.
+    """
+    def __init__(self, units=None):
+        self.units = units or {}
+        self.seen = set()
+
+    @classmethod
+    def load(cls, path=EXPORT_MANIFEST_PATH):
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def save(self, path=EXPORT_MANIFEST_PATH):
+        write_atomic(path, json.dumps(self.units))
+
+    @staticmethod
+    def key(unit):
+        return u"|".join(unit)
+
+    def get(self, unit):
+        return self.units.get(self.key(unit))
+
+    def set(self, unit, entry):
+        self.seen.add(self.key(unit))
+        if entry:
+            self.units[self.key(unit)] = entry
+        else:
+            self.units.pop(self.key(unit), None)
+
+    def keep(self, unit):
+        """
+        Keeps the entry and files of a unit from the last run, e.g. when its export failed in this run.
+        """
+        self.seen.add(self.key(unit))
+
+    def remove_unseen(self):
+        """
+        Deletes the files of units that were not exported in this run, e.g. of deleted versions.
+        :return int: The number of units removed
+        """
+        unseen = [key for key in self.units if key not in self.seen]
+        for key in unseen:
+            for path in self.units.pop(key)["paths"]:
+                if os.path.exists(path):
+                    os.remove(path)
+        return len(unseen)
+
+
+class ExportStats(object):
+    def __init__(self, skipped_label="unchanged"):
+        self.written = 0
+        self.skipped = 0
+        self.failed = 0
+        self.skipped_label = skipped_label
+
+    def add(self, result):
+        if result["error"]:
+            self.failed += 1
+        elif result["skipped"]:
+            self.skipped += 1
+        else:
+            self.written += 1
+
+    def report(self):
+        return "{} written, {} {}, {} failed".format(self.written, self.skipped, self.skipped_label, self.failed)
+
+
+def _content_hash(*parts):
+    return hashlib.md5(json.dumps(parts, sort_keys=True, default=unicode)).hexdigest()
+
+
+def _index_contents(title):
+    try:
+        return library.get_index(title).contents()
+    except Exception:
+        return None
+
+
+def export_unit(args):
+    """
+    Exports one unit - ("version", title, lang, versionTitle) or ("merged", title, lang, "merged") - in every export format.
+    Skips writing if the content hash of the unit equals the hash in 'previous' and its files still exist.
+    Runs in export worker processes, so it returns errors rather than logging them.
+    :param args: (unit, previous manifest entry or None)
+    :return dict:
+    """
+    unit, previous = args
+    kind, title, lang, vtitle = unit
+    result = {"unit": unit, "entry": None, "skipped": False, "error": None}
+    try:
+        if kind == "version":
+            text_docs = [db.texts.find_one({"title": title, "language": lang, "versionTitle": vtitle})]
+            if not text_docs[0]:
+                return result
+        else:
+            text_docs = _merged_text_docs(title, lang)
+            if not text_docs:
+                return result
+
+        content_hash = _content_hash(EXPORT_FORMAT_VERSION, _index_contents(title), text_docs)
+        if previous and previous["hash"] == content_hash and all(os.path.exists(p) for p in previous["paths"]):
+            result.update({"entry": previous, "skipped": True})
+            return result
+
+        if kind == "version":
+            prepped_text = prepare_text_for_export(text_docs[0])
+        else:
+            prepped_text = prepare_merged_text_for_export(title, lang=lang, text_docs=text_docs)
+        paths = write_text_doc_to_disk(prepped_text) if prepped_text else []
+        for path in (previous or {}).get("paths", []):
+            if path not in paths and os.path.exists(path):  # e.g. after a change of categories
+                os.remove(path)
+        result["entry"] = {"hash": content_hash, "paths": paths}
+    except Exception as e:
+        result["error"] = u"export of {} failed: {}".format(u" / ".join(unit), e)
+    return result
 
-        print title
-        if not title:
-            log_error('None title in texts')
-            continue
-        for lang in ("he", "en"):
-            prepped_text = prepare_merged_text_for_export(title, lang=lang)
-            if prepped_text:
-                write_text_doc_to_disk(prepped_text)
+
+def export_units(units, processes=1, manifest=None):
+    """
+    Exports 'units' (see :func:`export_unit`), from a pool of 'processes' workers if more than one.
+    Records their hashes and paths in 'manifest', if given.
+    :return: :class:`ExportStats`
+    """
+    stats = ExportStats()
+    work = [(unit, manifest.get(unit) if manifest else None) for unit in units]
+    pool = Pool(processes) if processes > 1 else None
+    try:
+        results = pool.imap_unordered(export_unit, work, chunksize=8) if pool else (export_unit(w) for w in work)
+        for result in results:
+            stats.add(result)
+            if result["error"]:
+                log_error(result["error"])
+                if manifest is not None:
+                    manifest.keep(result["unit"])  # So that a failure does not remove the last good export
+            elif manifest is not None:
+                manifest.set(result["unit"], result["entry"])
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    return stats
 
 def export_schemas():
     print('exporting schemas...')
@@ -452,16 +629,15 @@ def export_schemas():
     for i in library.all_index_records():
         title = i.title.replace(" ", "_")
 
-        with open(path + title + ".json", "w") as f:
-            try:
-                f.write(make_json(i.contents(v2=True)).encode('utf-8'))
+        try:
+            write_atomic(path + title + ".json", make_json(i.contents(v2=True)).encode('utf-8'))
 
-            except InputError as e:
-                print "InputError: %s" % e
-                with open(SEFARIA_EXPORT_PATH + "/errors.log", "a") as error_log:
-                    error_log.write("%s - InputError: %s\n" % (datetime.now(), e))
-            except Exception as e:
-                log_error('schemas error on {}: {}'.format(title, str(e)))
+        except InputError as e:
+            print "InputError: %s" % e
+            with open(SEFARIA_EXPORT_PATH + "/errors.log", "a") as error_log:
+                error_log.write("%s - InputError: %s\n" % (datetime.now(), e))
+        except Exception as e:
+            log_error('schemas error on {}: {}'.format(title, str(e)))
 
 
 def export_toc():
@@ -469,65 +645,114 @@ def export_toc():
     Exports the TOC to a JSON file.
     """
     toc = library.get_toc()
-    with open(SEFARIA_EXPORT_PATH + "/table_of_contents.json", "w") as f:
-        f.write(make_json(toc).encode('utf-8'))
+    write_atomic(SEFARIA_EXPORT_PATH + "/table_of_contents.json", make_json(toc).encode('utf-8'))
+
+LINKS_PER_FILE = 300000
+LINK_EXPORT_FIELDS = ["Citation 1", "Citation 2", "Conection Type", "Text 1", "Text 2", "Category 1", "Category 2"]
+
 
-def export_links():
+def _book_and_category(tref):
     """
-    Creates a single CSV file containing all links known to Sefaria.
+    Returns the Index title and top category of ref string 'tref', or None if its title is unknown.
+    Uses a title lookup rather than a Ref, so that millions of links don't parse and cache millions of Refs.
     """
-    print "Exporting links..."
-    links_by_book = Counter()
-    links_by_book_without_commentary = Counter()
+    node = library.get_schema_node_for_ref_string(tref)
+    if not node:
+        return None
+    return node.index.title, node.index.categories[0]
+
 
-    links = db.links.find().sort([["refs.0", 1]])
+def _link_shards(links_per_file=LINKS_PER_FILE):
+    """
+    Splits the links, in order of their first ref, into ranges of about 'links_per_file' links.
+    :return list: (shard number, first ref of shard, first ref of next shard or None)
+    """
+    starts = []
+    while True:
+        first = list(db.links.find({}, {"refs": 1}).sort([["refs.0", 1]]).skip(len(starts) * links_per_file).limit(1))
+        if not first:
+            break
+        if starts and first[0]["refs"][0] == starts[-1]:  # a single ref with more links than a file
+            break
+        starts.append(first[0]["refs"][0])
+    return [(i, start, starts[i + 1] if i + 1 < len(starts) else None) for i, start in enumerate(starts)]
+
+
+def export_link_shard(shard):
+    """
+    Writes the links of one shard (see :func:`_link_shards`) to links<n>.csv and links<n>.jsonl,
+    streaming them from the database.
+    Runs in export worker processes.
+    :return dict: The number of links written and skipped, and the link counts by pair of books, with and without commentary
+    """
+    number, start, end = shard
+    query = {"refs.0": {"$gte": start}}
+    if end is not None:
+        query["refs.0"]["$lt"] = end
+    result = {"written": 0, "skipped": 0, "links_by_book": Counter(), "links_by_book_without_commentary": Counter()}
+
+    path = SEFARIA_EXPORT_PATH + "/links/links{}".format(number)
+    tmp_suffix = ".{}.tmp".format(os.getpid())
+    with open(path + ".csv" + tmp_suffix, 'wb') as csvfile, io.open(path + ".jsonl" + tmp_suffix, "w", encoding="utf-8") as jsonfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(LINK_EXPORT_FIELDS)
+        for link in db.links.find(query, {"refs": 1, "type": 1}).sort([["refs.0", 1]]):
+            books = [_book_and_category(r) for r in link["refs"]]
+            if None in books:
+                result["skipped"] += 1
+                continue
+            row = [
+                link["refs"][0],
+                link["refs"][1],
+                link.get("type", ""),
+                books[0][0],
+                books[1][0],
+                books[0][1],
+                books[1][1],
+            ]
+            writer.writerow(row)
+            jsonfile.write(json.dumps(dict(zip(LINK_EXPORT_FIELDS, row)), ensure_ascii=False) + u"\n")
+            result["written"] += 1
+
+            book_link = tuple(sorted([books[0][0], books[1][0]]))
+            result["links_by_book"][book_link] += 1
+            if link.get("type") not in ("commentary", "Commentary", "targum", "Targum"):
+                result["links_by_book_without_commentary"][book_link] += 1
+
+    os.rename(path + ".csv" + tmp_suffix, path + ".csv")
+    os.rename(path + ".jsonl" + tmp_suffix, path + ".jsonl")
+    return result
+
+
+def export_links(processes=1):
+    """
+    Creates CSV and JSONL files containing all links known to Sefaria, in files of about LINKS_PER_FILE links each,
+    written in parallel from a pool of 'processes' workers.
+    Also writes link counts by pair of books.
+    Returns an :class:`ExportStats`.
+    """
+    print "Exporting links..."
     path = SEFARIA_EXPORT_PATH + "/links/"
     if not os.path.exists(os.path.dirname(path)):
         os.makedirs(os.path.dirname(path))
 
-    link_file_number = 0
-    links = db.links.find().sort([["refs.0", 1]])
-    new_links_file_size = 300000
-    for i, link in enumerate(links):
-        if i % new_links_file_size == 0:
-            filename = '{}links{}.csv'.format(path, link_file_number)
-            try:
-                csvfile.close()
-            except:
-                pass
-            csvfile = open(filename, 'wb')
-            writer = csv.writer(csvfile)
-            writer.writerow([
-                    "Citation 1",
-                    "Citation 2",
-                    "Conection Type",
-                    "Text 1",
-                    "Text 2",
-                    "Category 1",
-                    "Category 2",
-            ])
-            link_file_number += 1
-
-        try:
-            oref1 = Ref(link["refs"][0])
-            oref2 = Ref(link["refs"][1])
-        except InputError:
-            continue
-
-        writer.writerow([
-            link["refs"][0],
-            link["refs"][1],
-            link["type"],
-            oref1.book,
-            oref2.book,
-            oref1.index.categories[0],
-            oref2.index.categories[0],
-        ])
+    stats = ExportStats(skipped_label="with unknown titles")
+    links_by_book = Counter()
+    links_by_book_without_commentary = Counter()
 
-        book_link = tuple(sorted([oref1.index.title, oref2.index.title]))
-        links_by_book[book_link] += 1
-        if link["type"] not in ("commentary", "Commentary", "targum", "Targum"):
-            links_by_book_without_commentary[book_link] += 1
+    shards = _link_shards()
+    pool = Pool(processes) if processes > 1 else None
+    try:
+        results = pool.imap_unordered(export_link_shard, shards) if pool else (export_link_shard(s) for s in shards)
+        for result in results:
+            stats.written += result["written"]
+            stats.skipped += result["skipped"]
+            links_by_book.update(result["links_by_book"])
+            links_by_book_without_commentary.update(result["links_by_book_without_commentary"])
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
 
     def write_aggregate_file(counter, filename):
         with open(SEFARIA_EXPORT_PATH + "/links/%s" % filename, 'wb') as csvfile:
@@ -546,6 +771,7 @@ def export_links():
 
     write_aggregate_file(links_by_book, "links_by_book.csv")
     write_aggregate_file(links_by_book_without_commentary, "links_by_book_without_commentary.csv")
+    return stats
 
 
 def export_tag_graph():
@@ -586,18 +812,45 @@ def make_export_log():
         f.write(datetime.now().isoformat())
 
 
-def export_all():
+def export_all(processes=1, incremental=True):
     """
     Export all texts, merged texts, links, schemas, toc, links & export log.
+    Texts and merged texts are exported from a pool of 'processes' workers.
+    If 'incremental', texts that have not changed since the last export (according to the manifest at
+    EXPORT_MANIFEST_PATH) are not exported again, and the files of texts that no longer exist are removed.
+    Prints the time taken by each stage.
     """
-    clear_exports()
-    export_texts()
-    export_all_merged()
-    export_links()
-    export_schemas()
-    export_toc()
-    export_tag_graph()
-    make_export_log()
+    if incremental:
+        manifest = ExportManifest.load()
+        for directory in ("schemas", "links"):  # fully rewritten below
+            if os.path.exists(SEFARIA_EXPORT_PATH + "/" + directory):
+                rmtree(SEFARIA_EXPORT_PATH + "/" + directory)
+    else:
+        clear_exports()
+        manifest = ExportManifest()
+
+    stages = [
+        ("texts",       lambda: export_texts(processes, manifest)),
+        ("merged",      lambda: export_all_merged(processes, manifest)),
+        ("links",       lambda: export_links(processes)),
+        ("schemas",     export_schemas),
+        ("toc",         export_toc),
+        ("tag graph",   export_tag_graph),
+        ("export log",  make_export_log),
+    ]
+    timings = []
+    for name, stage in stages:
+        start = time.time()
+        stats = stage()
+        timings.append((name, time.time() - start, stats))
+
+    removed = manifest.remove_unseen()
+    manifest.save()
+
+    print "\nExport stages:"
+    for name, seconds, stats in timings:
+        print "{:<12}{:>10.1f}s  {}".format(name, seconds, stats.report() if stats else "")
+    print "{} removed texts deleted from export".format(removed)
     print_errors()
 
 
@@ -4,62 +4,190 @@ glossary.py - Handling custom dictionary / glossary / biography entries
 Writes to MongoDB Collection: terms
 """
 import string
-from random import sample
+import random
 
-import counts
-from sefaria.utils import hebrew
 from sefaria.model import *
 from sefaria.system.database import db
 
 
-db.terms.remove()
-db.terms.ensure_index([("term", 1), ("lang", 1)], unique=True)
-db.terms.ensure_index("term", unique=True)
-db.terms.ensure_index("occurrences")
+# Punctuation and Hebrew nikkud / cantillation (as removed by hebrew.strip_nikkud), removed from each line before it is split
+_STRIP_TABLE = {ord(c): None for c in string.punctuation}
+_STRIP_TABLE.update({c: None for c in range(0x0591, 0x05C8)})
 
+# Number of random refs kept for each term
+TERM_SAMPLE_SIZE = 20
 
-def count_terms(query={}, lang=None):
-    #todo: move to object model.  Maybe.  What's this doing?
+
+class TermCounter(object):
+    """
+    Counts the occurrences of each term in a stream of lines, and keeps a uniform random sample
+    of at most `sample_size` of the refs of the lines each term appears in (by reservoir sampling),
+    so that memory does not grow with the number of lines a term appears in.
+
+    `terms` maps each term to [occurrences, number of lines it appears in, sample of refs].
+    """
+    def __init__(self, sample_size=TERM_SAMPLE_SIZE):
+        self.sample_size = sample_size
+        self.terms = {}
+
+    def add_line(self, line, ref):
+        seen = set()
+        for term in line.translate(_STRIP_TABLE).split(" "):
+            if not term:
+                continue
+            entry = self.terms.get(term)
+            if entry is None:
+                entry = self.terms[term] = [0, 0, []]
+            entry[0] += 1
+            if term not in seen:
+                seen.add(term)
+                self._sample(entry, ref)
+
+    def _sample(self, entry, ref):
+        entry[1] += 1
+        refs = entry[2]
+        if len(refs) < self.sample_size:
+            refs.append(ref)
+        else:
+            j = random.randint(0, entry[1] - 1)
+            if j < self.sample_size:
+                refs[j] = ref
+
+    def update(self, terms):
+        """
+        Adds the counts of `terms`, the `terms` of another TermCounter over different lines.
+        The merged samples are uniform random samples of the refs of both.
+        """
+        for term, (occurrences, lines, refs) in terms.iteritems():
+            entry = self.terms.get(term)
+            if entry is None:
+                self.terms[term] = [occurrences, lines, list(refs)]
+                continue
+            entry[2] = self._merge_samples(entry[2], entry[1], refs, lines)
+            entry[0] += occurrences
+            entry[1] += lines
+
+    def _merge_samples(self, a, a_lines, b, b_lines):
+        a, b = a[:], b[:]
+        random.shuffle(a)
+        random.shuffle(b)
+        merged = []
+        while len(merged) < self.sample_size and (a or b):
+            # Take from each side in proportion to the number of lines it was sampled from
+            if b_lines == 0 or (a and random.random() * (a_lines + b_lines) < a_lines):
+                merged.append(a.pop())
+                a_lines -= 1
+            else:
+                merged.append(b.pop())
+                b_lines -= 1
+        return merged
+
+    def documents(self, lang):
+        for term, (occurrences, lines, refs) in self.terms.iteritems():
+            yield {
+                "term": term,
+                "occurrences": occurrences,
+                "language": lang,
+                "refs": refs,
+            }
+
+
+def count_index_terms(args):
+    """
+    Counts the terms of the text of one Index, reading each of its Versions in `lang` once.
+    Where an Index has more than one Version, their merged text is counted, as in a TextChunk.
+    :param args: tuple of Index title and language ("he" or "en")
+    :return: The `terms` of a :class:`TermCounter`
+    """
+    title, lang = args
+    counter = TermCounter()
+    index = library.get_index(title)
+    versions = VersionSet({"title": index.title, "language": lang})
+    if not versions.count():
+        return counter.terms
+    for node in index.nodes.get_leaf_nodes():
+        text = versions.merge(node)[0]
+        node_title = node.full_title("en")
+        for indexes, line in _segments(text):
+            if not isinstance(line, basestring) or not line:
+                continue
+            sections = indexes[:-1]
+            section_ref = node_title
+            if sections:
+                section_ref += u" " + u":".join([node.address_class(i).toStr("en", n + 1) for i, n in enumerate(sections)])
+            counter.add_line(line, u"%s%s%d" % (section_ref, u":" if sections else u" ", indexes[-1] + 1))
+    return counter.terms
+
+
+def _segments(text, _cur=None):
+    """
+    Yields the 0 based indexes and content of each segment of the jagged array `text`.
+    """
+    _cur = _cur or []
+    if isinstance(text, list):
+        for i, sub in enumerate(text):
+            for segment in _segments(sub, _cur + [i]):
+                yield segment
+    elif _cur:
+        yield _cur, text
+
+
+def _init_term_worker():
+    # Workers are forked with the same random state, which would correlate their samples
+    random.seed()
+
+
+def count_terms(query={}, lang=None, processes=4, bulk_size=1000):
     """
     Counts all terms in texts matching query, lang
     Saves reults to terms collection in db.
+
+    Indexes are counted by a pool of `processes` workers, and their counts merged and written with bulk upserts.
     """
-    terms = {}
-    bavli_names = db.index.find(query).distinct("title")
-    query = {"title": {"$in": bavli_names}}
-    refs = counts.generate_refs_list(query)  #library.ref_list() needs query argument
+    from multiprocessing import Pool
+
+    db.terms.remove({"language": lang})
+    db.terms.ensure_index([("term", 1), ("lang", 1)], unique=True)
+    db.terms.ensure_index("term", unique=True)
+    db.terms.ensure_index("occurrences")
+
+    titles = db.index.find(query).distinct("title")
     lookup_lang = "he" if lang == "ar" else lang
 
-    for ref in refs:
-        print ref
-        #text = texts.get_text(ref, commentary=False)
-        text = TextFamily(Ref(ref), commentary=False).contents()
-        for i, line in enumerate(text.get(lookup_lang, [])):
-            # strip punctuation
-            for c in string.punctuation:
-                line = line.replace(c,"")
-            these_terms = line.split(" ")
-            for term in these_terms:
-                line_ref = "%s:%d" % (ref, i+1)
-                term = hebrew.strip_nikkud(term)
-                if term in terms:
-                    terms[term]["occurrences"] += 1
-                    terms[term]["refs"].add(line_ref)
-                else:
-                    terms[term] = {
-                        "term": term,
-                        "occurrences": 1,
-                        "language": lang,
-                        "refs": set([line_ref])
-                    }
-
-    for term in terms:
-        print term
-        # only include up to 20 random ref samples
-        sample_size = len(terms[term]["refs"]) if len(terms[term]["refs"]) < 20 else 20
-        terms[term]["refs"] = list(sample(terms[term]["refs"], sample_size))
-        db.terms.save(terms[term])
+    counter = TermCounter()
+    pool = Pool(processes, initializer=_init_term_worker) if processes > 1 else None
+    try:
+        work = [(title, lookup_lang) for title in titles]
+        results = pool.imap_unordered(count_index_terms, work) if pool else (count_index_terms(w) for w in work)
+        for i, terms in enumerate(results):
+            counter.update(terms)
+            print "Counted {} of {} texts".format(i + 1, len(work))
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    return save_terms(counter, lang, bulk_size)
+
+
+def save_terms(counter, lang, bulk_size=1000):
+    """
+    Upserts a document to the terms collection for each term of :class:`TermCounter` `counter`
+    :return int: The number of terms saved
+    """
+    bulk, n = None, 0
+    for doc in counter.documents(lang):
+        if bulk is None:
+            bulk = db.terms.initialize_unordered_bulk_op()
+        bulk.find({"term": doc["term"]}).upsert().replace_one(doc)
+        n += 1
+        if n % bulk_size == 0:
+            bulk.execute()
+            bulk = None
+    if bulk is not None:
+        bulk.execute()
+    return n
 
 
 def count_bavli_terms():
-    count_terms(query={"categories.1": "Bavli"}, lang="ar")
\ No newline at end of file
+    count_terms(query={"categories.1": "Bavli"}, lang="ar")
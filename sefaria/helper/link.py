@@ -3,8 +3,13 @@
 import logging
 logger = logging.getLogger(__name__)
 
+import regex as re
+from collections import OrderedDict, defaultdict
+
 from sefaria.model import *
+from sefaria.system.database import db
 from sefaria.system.exceptions import DuplicateRecordError, InputError
+from sefaria.system import instrumentation
 import sefaria.tracker as tracker
 try:
     from sefaria.settings import USE_VARNISH
@@ -24,6 +29,9 @@ class AbstractAutoLinker(object):
     2. refresh_links will update a link set by intelligently (and performace oriented) adding and deleting relevant links
     3. delete_links will delete all the links in the set
     4. rebuild_links will delete and then build the links from scratch
+
+    refresh_links and rebuild_links also have a batched mode (`batch=True`, see `_refresh_links_batch`),
+    which writes the difference between the existing and the generated links in bulk, with one history record.
     """
     def __init__(self, oref, auto=True, generated_by_string=None, link_type=None, **kwargs):
         self._requested_oref = oref
@@ -36,6 +44,7 @@ class AbstractAutoLinker(object):
         self._user = kwargs.get('user', None)
         self._title = self._requested_oref.index.title
         self._links = None
+        self._pending_links = None  # In batched mode, the (base_tref, tref) pairs found by build_links
 
     def build_links(self, **kwargs):
         raise NotImplementedError
@@ -63,28 +72,36 @@ class AbstractAutoLinker(object):
                     pass
             self._delete_link(link)
 
-    def rebuild_links(self, **kwargs):
+    def rebuild_links(self, batch=False, **kwargs):
         """
         Intended to clean out all existing links and build them anew
+        :param batch: If True, only the links that changed are written, in bulk.  See `_refresh_links_batch`
         :return:
         """
+        if batch:
+            return self._refresh_links_batch(**kwargs)
         self.delete_links()
         return self.build_links()
 
+    def _links_query(self):
+        return {"refs": {"$regex": self._requested_oref.regex()},
+                "generated_by": self._generated_by_string,
+                "auto": self._auto,
+                "type": self._link_type
+                }
+
     def _load_links(self):
         if not self._links:
-            ref_regex = self._requested_oref.regex()
-            self._links = LinkSet({"refs": {"$regex": ref_regex},
-                                   "generated_by": self._generated_by_string,
-                                   "auto" : self._auto,
-                                   "type" : self._link_type
-                                   })
+            self._links = LinkSet(self._links_query())
         return self._links
 
     def linkset(self):
         return self._load_links()
 
     def _save_link(self, tref, base_tref, **kwargs):
+        if self._pending_links is not None:
+            self._pending_links.append((base_tref, tref))
+            return tref
         nlink = {
             "refs": [base_tref, tref],
             "type": self._link_type,
@@ -107,6 +124,106 @@ class AbstractAutoLinker(object):
         else:
             tracker.delete(self._user, Link, link._id)
 
+    def _refresh_links_batch(self, **kwargs):
+        """
+        Builds the set of links that the text should have in memory, and compares it with the existing links of this linker.
+        New links are inserted, and links that are no longer generated are deleted, each with one bulk write.
+        If there is a user, the change is recorded in one "bulk link" history record.
+
+        As when links are saved one by one, a new link is not written if the same link, or a more precise one, exists
+        from another source.  An existing manual link is marked as generated by this linker instead.
+        :return dict: counts of the links "added", "removed", and existing manual links "updated"
+        """
+        self._pending_links = []
+        try:
+            self.build_links(**kwargs)
+            found = self._pending_links
+        finally:
+            self._pending_links = None
+
+        desired = OrderedDict()  # frozenset of the two refs -> Link
+        for base_tref, tref in found:
+            link = Link({
+                "refs": [base_tref, tref],
+                "type": self._link_type,
+                "anchorText": "",
+                "auto": self._auto,
+                "generated_by": self._generated_by_string
+            })
+            try:
+                link._normalize()
+                if not link._validate():
+                    continue
+            except InputError as e:
+                logger.warning(u"Skipping autolink {} - {}: {}".format(base_tref, tref, e))
+                continue
+            desired.setdefault(frozenset(link.refs), link)
+
+        with instrumentation.timer("mongo.links"):
+            existing = defaultdict(list)
+            for doc in db.links.find(self._links_query(), {"refs": 1}):
+                existing[frozenset(doc["refs"])].append(doc)
+            removed = [doc for key, docs in existing.iteritems() if key not in desired for doc in docs]
+            removed_ids = {doc["_id"] for doc in removed}
+            to_add = [link for key, link in desired.iteritems() if key not in existing]
+
+            others, partners = {}, defaultdict(set)
+            if to_add:
+                # Links to this text from other sources, which new links must not duplicate
+                for doc in db.links.find({"refs": {"$regex": self._requested_oref.regex()}}, {"refs": 1, "auto": 1}):
+                    if doc["_id"] in removed_ids or len(doc["refs"]) != 2:
+                        continue
+                    others.setdefault(frozenset(doc["refs"]), doc)
+                    partners[doc["refs"][0]].add(doc["refs"][1])
+                    partners[doc["refs"][1]].add(doc["refs"][0])
+
+        added, updated = [], 0
+        for link in to_add:
+            same = others.get(frozenset(link.refs))
+            if same:
+                if not same.get("auto"):
+                    samelink = Link().load_by_id(same["_id"])
+                    samelink.auto = link.auto
+                    samelink.generated_by = link.generated_by
+                    samelink.source_text_oid = link.source_text_oid
+                    samelink.refs = link.refs
+                    samelink.save()
+                    updated += 1
+                continue
+            candidates = partners.get(link.refs[0], set()) - {link.refs[1]}
+            if candidates:
+                precise = re.compile(Ref(link.refs[1]).regex())
+                if any(precise.match(r) for r in candidates):
+                    continue
+            added.append(link)
+
+        with instrumentation.timer("mongo.links"):
+            if added:
+                bulk = db.links.initialize_unordered_bulk_op()
+                for link in added:
+                    bulk.insert(link._saveable_attrs())
+                bulk.execute()
+            if removed_ids:
+                db.links.remove({"_id": {"$in": list(removed_ids)}})
+        self._links = None
+
+        if self._user and (added or removed):
+            log_bulk(self._user, Link, {
+                "title": self._requested_oref.normal(),
+                "generated_by": self._generated_by_string,
+                "added": [link.refs for link in added],
+                "removed": [doc["refs"] for doc in removed],
+            }, **kwargs)
+
+        if USE_VARNISH:
+            for tref in {r for refs in [l.refs for l in added] + [d["refs"] for d in removed] for r in refs}:
+                try:
+                    invalidate_ref(Ref(tref))
+                except InputError:
+                    pass
+
+        return {"added": len(added), "removed": len(removed), "updated": updated}
+
 
 class AbstractStructureAutoLinker(AbstractAutoLinker):
     """
@@ -180,17 +297,20 @@ class AbstractStructureAutoLinker(AbstractAutoLinker):
     def build_links(self, **kwargs):
         return self._build_links_internal(self._requested_oref)
 
-    def refresh_links(self, **kwargs):
+    def refresh_links(self, batch=False, **kwargs):
         """
         This functino both adds links and deletes pre existing ones that are no longer valid,
         by virtue of the fact that they were not detected as commentary links while iterating over the text.
         :param tref:
         :param user:
+        :param batch: If True, only the links that changed are written, in bulk.  See `_refresh_links_batch`
         :param kwargs:
         :return:
         """
+        if batch:
+            return self._refresh_links_batch(**kwargs)
         existing_links = self._load_links()
-        found_links = self._build_links_internal(self._requested_oref)
+        found_links = set(self._build_links_internal(self._requested_oref) or [])
         for exLink in existing_links:
             for r in exLink.refs:
                 if self._title not in r:  #current base ref
@@ -245,11 +365,12 @@ class MatchBaseTextDepthAutoLinker(BaseStructureAutoLinker):
         super(MatchBaseTextDepthAutoLinker, self).__init__(oref, 0, **kwargs)
 
 
-def rebuild_links_for_title(tref, user=None):
+def rebuild_links_for_title(tref, user=None, batch=True):
     """
     Utility function, can be called from a view or cli. Takes a ref or a more general title to rebuild auto links
     :param tref:
     :param user:
+    :param batch: If True, only the links that changed are written, in bulk, with one history record per text
     :return:
     """
     try:
@@ -260,11 +381,11 @@ def rebuild_links_for_title(tref, user=None):
         #TODO: there might need to be some error checking done on this
         title_indices = library.get_indices_by_collective_title(tref)
         for c in title_indices:
-            rebuild_links_for_title(c, user)
+            rebuild_links_for_title(c, user, batch)
         return
     linker = oref.autolinker(user=user)
     if linker:
-        linker.rebuild_links()
+        linker.rebuild_links(batch=batch)
 
 
 # TODO: refactor with lexicon class map into abstract
@@ -77,7 +77,7 @@ def attach_branch(new_node, parent_node, place=0):
     new_node.parent = parent_node
 
     index.save(override_dependencies=True)
-    library.rebuild()
+    library.refresh_index_record_in_cache(index)
     refresh_version_state(index.title)
 
     handle_dependant_indices(index.title)
@@ -107,7 +107,7 @@ def remove_branch(node):
     parent.children = [n for n in parent.children if n.key != node.key]
 
     index.save(override_dependencies=True)
-    library.rebuild()
+    library.refresh_index_record_in_cache(index)
     refresh_version_state(index.title)
 
     handle_dependant_indices(index.title)
@@ -174,7 +174,7 @@ def merge_default_into_parent(parent_node):
 
     # Save index and rebuild library
     index.save(override_dependencies=True)
-    library.rebuild()
+    library.refresh_index_record_in_cache(index)
     refresh_version_state(index.title)
 
     handle_dependant_indices(index.title)
@@ -214,7 +214,7 @@ def convert_simple_index_to_complex(index):
     index.nodes = new_parent
 
     index.save(override_dependencies=True)
-    library.rebuild()
+    library.refresh_index_record_in_cache(index)
     refresh_version_state(index.title)
 
     handle_dependant_indices(index.title)
@@ -251,7 +251,7 @@ def change_parent(node, new_parent, place=0):
     new_normal_form = node.ref().normal()
 
     index.save(override_dependencies=True)
-    library.rebuild()
+    library.refresh_index_record_in_cache(index)
 
     for link in linkset:
         link.refs = [ref.replace(old_normal_form, new_normal_form) for ref in link.refs]
@@ -488,7 +488,7 @@ def change_node_structure(ja_node, section_names, address_types=None, upsize_in_
     if delta > 0:
         cascade(ja_node.ref(), rewriter=fix_ref, needs_rewrite=needs_fixing)
 
-    library.rebuild()
+    library.refresh_index_record_in_cache(index)
     refresh_version_state(index.title)
 
     handle_dependant_indices(index.title)
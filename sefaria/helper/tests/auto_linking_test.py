@@ -107,3 +107,22 @@ class Test_AutoLinker(object):
 
 
 
+
+    def test_batch_rebuild_commentary_links(self):
+        title = 'Rashi on Genesis'
+        rf = Ref(title)
+        query = {"refs": {"$regex": rf.regex()}, "auto": True, "generated_by": "add_commentary_links"}
+        desired_link_count = self.desired_link_counts[title]
+        linker = rf.autolinker(user=1)
+        linker.rebuild_links(batch=True)
+        assert LinkSet(query).count() == desired_link_count
+
+        # Nothing changed, so nothing is written
+        assert linker.refresh_links(batch=True) == {"added": 0, "removed": 0, "updated": 0}
+
+        # A missing link is added back, in one history record
+        Link().load(query).delete()
+        assert LinkSet(query).count() == desired_link_count - 1
+        assert rf.autolinker(user=1).refresh_links(batch=True) == {"added": 1, "removed": 0, "updated": 0}
+        assert LinkSet(query).count() == desired_link_count
+        assert History().load({"rev_type": "bulk link", "new.title": title})
@@ -3,6 +3,7 @@ import re
 
 import sefaria.summaries as summaries
 from sefaria.model import *
+from sefaria.model.abstract import invalidate_record_cache
 from sefaria.system import cache as scache
 from sefaria.system.database import db
 from sefaria.datatype.jagged_array import JaggedTextArray
@@ -73,6 +74,7 @@ def resize_text(title, new_structure, upsize_in_place=False):
     old_structure = index["sectionNames"]
     index["sectionNames"] = new_structure
     db.index.save(index)
+    invalidate_record_cache(Index)  # The raw save bypasses the record cache, which refresh_index_record_in_cache reads from
 
     delta = len(new_structure) - len(old_structure)
     if delta == 0:
@@ -8,6 +8,7 @@ from diff_match_patch import diff_match_patch
 from bson.code import Code
 
 from sefaria.model import *
+from sefaria.model.history import reconstruct_text
 from sefaria.system.database import db
 
 dmp = diff_match_patch()
@@ -165,17 +166,9 @@ def text_at_revision(tref, version, lang, revision):
     """
     Returns the state of a text (identified by ref/version/lang) at revision number 'revision'
     """
-    changes = db.history.find({"ref": tref, "version": version, "language": lang}).sort([['revision', -1]])
-    current = TextChunk(Ref(tref), lang, version)
-    text = unicode(current.text)  # needed?
-
-    for i in range(changes.count()):
-        r = changes[i]
-        if r["revision"] == revision: break
-        patch = dmp.patch_fromText(r["revert_patch"])
-        text = dmp.patch_apply(patch, text)[0]
-
-    return text
+    target = db.history.find_one({"ref": tref, "version": version, "language": lang, "revision": revision}, {"_id": 1})
+    history_id = target["_id"] if target else None
+    return reconstruct_text(tref, version, lang, history_id, lambda: unicode(TextChunk(Ref(tref), lang, version).text))
 
 
 def next_revision_num():
@@ -34,7 +34,19 @@ CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
         'LOCATION': '/path/to/your/django_cache/',  # can be any accessible path, not necessarily a path inside sefaria eg. /home/user/data/django_cache.
-    }
+    },
+    # Cached Mongo records, kept apart from the default cache.  In production, memcached shared by all processes is better suited.
+    'records': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': '/path/to/your/django_cache_records/',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+    # Version tokens of cached families, kept apart so that they aren't culled with the entries they version.
+    'versions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': '/path/to/your/django_cache_versions/',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
 }
 
 SECRET_KEY = 'insert your long random secret key here !'
@@ -107,6 +119,14 @@ USE_VARNISH_ESI = False
 # Prevent modification of Index records
 DISABLE_INDEX_SAVE = False
 
+# Bounds on the in-process Ref cache (number of Refs, approximate bytes).  None disables a bound.
+REF_CACHE_MAX_ENTRIES = 100000
+REF_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Snapshot of the Library's title maps, shared by all processes on a server to speed up startup.  None disables.
+# It is unpickled at startup, so keep it in a directory owned by the app's user and not writable by anyone else.
+LIBRARY_SNAPSHOT_PATH = "/path/to/your/sefaria/data/library_snapshot.pkl"
+
 # Caching with Cloudflare
 CLOUDFLARE_ZONE = ""
 CLOUDFLARE_EMAIL = ""
@@ -14,7 +14,7 @@ import abstract
 # not sure why we have to do this now - it wasn't previously required
 import history, schema, text, link, note, layer, notification, queue, lock, following, user_profile, version_state, translation_request, lexicon, place, person, time, garden, group
 
-from history import History, HistorySet, log_add, log_delete, log_update, log_text
+from history import History, HistorySet, log_add, log_delete, log_update, log_bulk, log_text
 from schema import deserialize_tree, Term, TermSet, TermScheme, TermSchemeSet, TitledTreeNode, SchemaNode, ArrayMapNode, JaggedArrayNode, NumberedTitledTreeNode
 from text import library, get_index, Index, IndexSet, Version, VersionSet, TextChunk, TextFamily, Ref, merge_texts
 from link import Link, LinkSet, get_link_counts, get_book_link_collection, get_book_category_linkset
@@ -6,6 +6,12 @@ abstract.py - abstract classes for Sefaria models
 import collections
 import logging
 import copy
+import cPickle
+import hashlib
+import json
+import re
+import time
+import uuid
 
 #Should we import "from abc import ABCMeta, abstractmethod" and make these explicity abstract?
 #
@@ -14,6 +20,10 @@ from bson.objectid import ObjectId
 
 from sefaria.system.database import db
 from sefaria.system.exceptions import InputError
+from sefaria.settings import CACHES, MONGO_RECORD_CACHE_ALIAS, MONGO_RECORD_CACHE_TIMEOUT, MONGO_RECORD_CACHE_LOCAL_ENTRIES, \
+    MONGO_RECORD_CACHE_GENERATION_TTL
+import sefaria.system.cache as scache
+from sefaria.system import instrumentation
 
 logging.basicConfig()
 logger = logging.getLogger("abstract")
@@ -34,6 +44,7 @@ class AbstractMongoRecord(object):
     track_pkeys = False
     pkeys = []   # list of fields that others may depend on
     history_noun = None  # Label for history records
+    cache_records = False  # If True, loads of this class are read through `record_cache`.  Only for rarely changed records.
 
     def __init__(self, attrs=None):
         if attrs is None:
@@ -52,7 +63,14 @@ class AbstractMongoRecord(object):
         return self.load({"_id": _id})
 
     def load(self, query, proj=None):
-        obj = getattr(db, self.collection).find_one(query, proj)
+        def fetch():
+            with instrumentation.timer("mongo." + self.collection):
+                return getattr(db, self.collection).find_one(query, proj)
+
+        if self.cache_records:
+            obj = record_cache.get(type(self), ["find_one", query, proj], fetch)
+        else:
+            obj = fetch()
         if obj:
             assert set(obj.keys()) <= set(self._saveable_attr_keys()), \
                 "{} record loaded with unhandled key(s): {}".format(
@@ -115,7 +133,8 @@ class AbstractMongoRecord(object):
             if not (len(self.pkeys_orig_values) == len(self.pkeys)):
                 raise Exception("Aborted unsafe {} save. {} not fully tracked.".format(type(self).__name__, self.pkeys))
 
-        _id = getattr(db, self.collection).save(props, w=1)
+        with instrumentation.timer("mongo." + self.collection):
+            _id = getattr(db, self.collection).save(props, w=1)
 
         if is_new_obj:
             self._id = _id
@@ -127,6 +146,9 @@ class AbstractMongoRecord(object):
 
         if not override_dependencies:
             notify(self, "save", orig_vals=self.pkeys_orig_values, is_new=is_new_obj)
+        elif self.cache_records:
+            # Cache invalidation is otherwise done by dependency callback
+            invalidate_record_cache(self)
 
         # Set new values as pkey_orig_values so that future changes will be caught
         if self.track_pkeys:
@@ -140,7 +162,11 @@ class AbstractMongoRecord(object):
             raise InputError(u"Can not delete {} that doesn't exist in database.".format(type(self).__name__))
 
         notify(self, "delete")
-        getattr(db, self.collection).remove({"_id": self._id})
+        with instrumentation.timer("mongo." + self.collection):
+            getattr(db, self.collection).remove({"_id": self._id})
+        if self.cache_records:
+            # Again, in case a delete callback reloaded this record
+            invalidate_record_cache(self)
 
     def delete_by_query(self, query):
         r = self.load(query)
@@ -249,6 +275,25 @@ class AbstractMongoSet(collections.Iterable):
         self.current = 0
         self.max = None
         self._local_iter = None
+        self._cache_key = ["find", query, proj, sort, page, limit, hint] if self.recordClass.cache_records else None
+
+    @classmethod
+    def aggregate(cls, pipeline):
+        """
+        :param pipeline: Aggregation pipeline over the collection of `recordClass`.  It must produce documents of the shape of that collection, possibly projected.
+        :return: A set of the resulting records
+        """
+        mset = cls.__new__(cls)
+        with instrumentation.timer("mongo." + cls.recordClass.collection):
+            mset.raw_records = getattr(db, cls.recordClass.collection).aggregate(pipeline)["result"]
+        mset.has_more = False
+        mset.records = None
+        mset.current = 0
+        mset.max = None
+        mset._local_iter = None
+        mset._cache_key = None
+        mset._read_records()
+        return mset
 
     def __iter__(self):
         self._read_records()
@@ -261,15 +306,24 @@ class AbstractMongoSet(collections.Iterable):
     def _read_records(self):
         if self.records is None:
             self.records = []
-            for rec in self.raw_records:
+            if self._cache_key:
+                raw_records = record_cache.get(self.recordClass, self._cache_key, self._fetch_raw_records)
+            else:
+                raw_records = self._fetch_raw_records()
+            for rec in raw_records:
                 self.records.append(self.recordClass(attrs=rec))
             self.max = len(self.records)
 
+    def _fetch_raw_records(self):
+        with instrumentation.timer("mongo." + self.recordClass.collection):
+            return list(self.raw_records)
+
     def __len__(self):
-        if self.max:
+        if self.max is not None:
             return self.max
         else:
-            return self.raw_records.count()
+            with instrumentation.timer("mongo." + self.recordClass.collection):
+                return self.raw_records.count()
 
     def array(self):
         self._read_records()
@@ -300,6 +354,149 @@ class AbstractMongoSet(collections.Iterable):
         return self
 
 
+class RecordCache(object):
+    """
+    Read-through cache of raw Mongo documents, for the record classes that set `cache_records`.
+    Used by :meth:`AbstractMongoRecord.load` and by :class:`AbstractMongoSet`.
+
+    Results are kept pickled in a bounded in-process LRU, backed by the Django cache alias `MONGO_RECORD_CACHE_ALIAS`,
+    which is kept apart from the default cache so that records don't crowd out its entries.
+    Each hit unpickles a fresh copy, which callers are free to change.
+
+    Keys are made from the collection, the query and projection.  Each entry is stored with the generation token
+    of its collection, and only served while that is still the collection's token.
+    Saving or deleting any record of the collection replaces the token (see :func:`invalidate_record_cache`).
+    The process that does so sees the new token at once; other processes reread a collection's token at most
+    every `generation_ttl` seconds.
+    Queries with values that can't be serialized to a stable key are not cached, nor is anything
+    if the cache alias isn't configured.
+    """
+    def __init__(self, max_local_entries=MONGO_RECORD_CACHE_LOCAL_ENTRIES, timeout=MONGO_RECORD_CACHE_TIMEOUT,
+                 generation_ttl=MONGO_RECORD_CACHE_GENERATION_TTL, cache_type=MONGO_RECORD_CACHE_ALIAS):
+        self.max_local_entries = max_local_entries
+        self.timeout = timeout
+        self.generation_ttl = generation_ttl
+        self.cache_type = cache_type
+        self._local = collections.OrderedDict()
+        self._generations = {}
+        self._stats = {}
+
+    @property
+    def enabled(self):
+        return self.cache_type in CACHES
+
+    def get(self, klass, key_parts, fetch):
+        """
+        :param klass: record class
+        :param key_parts: list of the query arguments that determine the result
+        :param fetch: function that runs the query on a miss
+        :return: a copy of the cached result
+        """
+        key = self._key(klass.collection, key_parts) if self.enabled else None
+        if key is None:
+            return fetch()
+        stats = self._stats.setdefault(klass.__name__, {"local_hits": 0, "shared_hits": 0, "misses": 0})
+        generation = self._generation(klass.collection)
+
+        entry = self._local.pop(key, None)
+        if entry is not None and entry[0] == generation:
+            stats["local_hits"] += 1
+        else:
+            shared = scache.get_cache_factory(self.cache_type)
+            entry = shared.get(key)
+            if entry is not None and entry[0] == generation:
+                stats["shared_hits"] += 1
+            else:
+                stats["misses"] += 1
+                entry = (generation, cPickle.dumps(fetch(), cPickle.HIGHEST_PROTOCOL))
+                shared.set(key, entry, self.timeout)
+        self._local[key] = entry
+        while len(self._local) > self.max_local_entries:
+            self._local.popitem(last=False)
+
+        return cPickle.loads(entry[1])
+
+    def invalidate(self, collection):
+        if not self.enabled:
+            return
+        generation = uuid.uuid4().hex
+        scache.get_version_cache(self.cache_type).set(self._generation_key(collection), generation, scache.NAMESPACE_VERSION_TIMEOUT)
+        self._generations[collection] = (generation, time.time() + self.generation_ttl)
+
+    def clear_local(self):
+        self._local.clear()
+        self._generations.clear()
+
+    def stats(self):
+        """
+        :return: dict from class name to counts of local hits, shared hits and misses, and hit ratio
+        """
+        result = {}
+        for name, stats in self._stats.items():
+            lookups = sum(stats.values())
+            d = dict(stats)
+            d["hit_ratio"] = float(stats["local_hits"] + stats["shared_hits"]) / lookups if lookups else 0.0
+            result[name] = d
+        return result
+
+    def _key(self, collection, key_parts):
+        """
+        :return: The cache key of a query, or None if the query has values that can't be serialized to a stable key
+        """
+        try:
+            serial = json.dumps(key_parts, sort_keys=True, default=_key_default)
+        except (TypeError, ValueError):
+            return None
+        return "mongo_record.{}.{}".format(collection, hashlib.md5(serial).hexdigest())
+
+    def _generation(self, collection):
+        generation, expires = self._generations.get(collection, (None, 0))
+        if expires > time.time():
+            return generation
+        cache = scache.get_version_cache(self.cache_type)
+        gen_key = self._generation_key(collection)
+        generation = cache.get(gen_key)
+        if generation is None:
+            # A lost generation token is replaced with a new one, never an old one, so stale entries can not reappear
+            generation = uuid.uuid4().hex
+            cache.set(gen_key, generation, scache.NAMESPACE_VERSION_TIMEOUT)
+        self._generations[collection] = (generation, time.time() + self.generation_ttl)
+        return generation
+
+    @staticmethod
+    def _generation_key(collection):
+        return "mongo_record_generation.{}".format(collection)
+
+
+_pattern_type = type(re.compile(""))
+
+
+def _key_default(obj):
+    """
+    Serializes the query values that JSON can't, for :meth:`RecordCache._key`.  Raises TypeError for any other.
+    """
+    if isinstance(obj, ObjectId):
+        return {"$oid": str(obj)}
+    if isinstance(obj, _pattern_type):
+        return {"$regex": obj.pattern, "$flags": obj.flags}
+    raise TypeError("{!r} has no stable cache key".format(obj))
+
+
+record_cache = RecordCache()
+
+
+def invalidate_record_cache(inst, **kwargs):
+    """
+    Dependency callback for save and delete of records with `cache_records` set.  See dependencies.py
+    :param inst: record instance, or record class
+    """
+    record_cache.invalidate(inst.collection)
+
+
+def record_cache_stats():
+    return record_cache.stats()
+
+
 def get_subclasses(c):
     subclasses = c.__subclasses__()
     for d in list(subclasses):
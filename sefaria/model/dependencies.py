@@ -2,11 +2,25 @@
 dependencies.py -- list cross model dependencies and subscribe listeners to changes.
 """
 
-from . import abstract, link, note, history, schema, text, layer, version_state, translation_request, time, person, garden, notification, group, library
+from . import abstract, link, note, history, schema, text, layer, version_state, translation_request, time, person, garden, notification, group, library, lexicon
 
 from abstract import subscribe, cascade, cascade_to_list, cascade_delete, cascade_delete_to_list
 import sefaria.system.cache as scache
 
+# Read-through record cache.  Subscribed first, so that the other callbacks below load fresh records.
+for record_class in abstract.get_record_classes():
+    if record_class.cache_records:
+        for pkey in record_class.pkeys:
+            subscribe(abstract.invalidate_record_cache,                 record_class, "attributeChange", pkey)
+        subscribe(abstract.invalidate_record_cache,                     record_class, "save")
+        subscribe(abstract.invalidate_record_cache,                     record_class, "delete")
+
+# Library snapshot
+subscribe(text.bump_library_version_stamp,                              text.Index, "save")
+subscribe(text.bump_library_version_stamp,                              text.Index, "delete")
+subscribe(text.bump_library_version_stamp,                              schema.Term, "save")
+subscribe(text.bump_library_version_stamp,                              schema.Term, "delete")
+
 # Index Save / Create
 subscribe(text.process_index_change_in_core_cache,                      text.Index, "save")
 subscribe(version_state.create_version_state_on_index_creation,         text.Index, "save")
@@ -93,6 +107,10 @@ subscribe(cascade_delete(notification.NotificationSet, "global_id", "_id"),  not
 subscribe(group.process_group_name_change_in_sheets,                         group.Group, "attributeChange", "name")
 subscribe(group.process_group_delete_in_sheets,                              group.Group, "delete")
 
+# Word forms
+subscribe(lexicon.process_word_form_change,                                  lexicon.WordForm, "save")
+subscribe(lexicon.process_word_form_change,                                  lexicon.WordForm, "delete")
+
 
 # todo: notes? reviews?
 # todo: Scheme name change in Index
@@ -3,7 +3,7 @@ group.py
 Writes to MongoDB Collection: groups
 """
 from . import abstract as abst
-from sefaria.model.user_profile import public_user_data
+from sefaria.model.user_profile import public_user_data_many
 
 import logging
 logger = logging.getLogger(__name__)
@@ -56,9 +56,10 @@ class Group(abst.AbstractMongoRecord):
         if with_content: 
             contents["sheets"]       = group_sheets(self.name, authenticated)["sheets"]
             contents["tags"]         = sheet_tag_counts({"group": self.name})
-            contents["admins"]       = [public_user_data(uid) for uid in contents["admins"]]
-            contents["publishers"]   = [public_user_data(uid) for uid in contents["publishers"]]
-            contents["members"]      = [public_user_data(uid) for uid in contents["members"]]
+            user_data                = public_user_data_many(contents["admins"] + contents["publishers"] + contents["members"])
+            contents["admins"]       = [user_data[uid] for uid in contents["admins"]]
+            contents["publishers"]   = [user_data[uid] for uid in contents["publishers"]]
+            contents["members"]      = [user_data[uid] for uid in contents["members"]]
             contents["invitations"]  = getattr(self, "invitations", []) if authenticated else []
             contents["pinnedSheets"] = getattr(self, "pinned_sheets", [])
         return contents
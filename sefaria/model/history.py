@@ -1,6 +1,6 @@
 """
 history.py
-Writes to MongoDB Collection: history
+Writes to MongoDB Collections: history, history_snapshots
 
 "add index"     done
 "add link"      done
@@ -26,6 +26,7 @@ dmp = diff_match_patch()
 from . import abstract as abst
 from . import text
 from sefaria.system.database import db
+from sefaria.settings import HISTORY_SNAPSHOT_REVISIONS, HISTORY_SNAPSHOT_PATCH_BYTES
 
 
 def log_text(user, action, oref, lang, vtitle, old_text, new_text, **kwargs):
@@ -66,7 +67,72 @@ def log_text(user, action, oref, lang, vtitle, old_text, new_text, **kwargs):
         "method": kwargs.get("method", "Site")
     }
 
-    History(log).save()
+    h = History(log).save()
+    snapshot_text_if_due(log["ref"], vtitle, lang, h._id, new_text)
+
+
+def _text_changes_query(tref, vtitle, lang):
+    return {"ref": tref, "version": vtitle, "language": lang, "revert_patch": {"$exists": True}}
+
+
+def snapshot_text_if_due(tref, vtitle, lang, history_id, text):
+    """
+    Records the full text of a segment after the change `history_id`, if HISTORY_SNAPSHOT_REVISIONS changes,
+    or HISTORY_SNAPSHOT_PATCH_BYTES of revert patches, have been logged for it since its last snapshot.
+    Snapshots bound the number of patches that :func:`reconstruct_text` applies.
+    :return bool: True if a snapshot was written
+    """
+    key = {"ref": tref, "version": vtitle, "language": lang}
+    query = _text_changes_query(tref, vtitle, lang)
+    query["_id"] = {"$lte": history_id}
+    last = db.history_snapshots.find_one(key, {"history_id": 1}, sort=[("history_id", -1)])
+    if last:
+        query["_id"]["$gt"] = last["history_id"]
+
+    revisions = patch_bytes = 0
+    for change in db.history.find(query, {"revert_patch": 1}).limit(HISTORY_SNAPSHOT_REVISIONS):
+        revisions += 1
+        patch_bytes += len(change["revert_patch"])
+    if revisions < HISTORY_SNAPSHOT_REVISIONS and patch_bytes < HISTORY_SNAPSHOT_PATCH_BYTES:
+        return False
+
+    snapshot = dict(key, history_id=history_id, text=text, date=datetime.now())
+    db.history_snapshots.insert(snapshot)
+    return True
+
+
+def reconstruct_text(tref, vtitle, lang, history_id, current_text, use_snapshots=True):
+    """
+    Returns the text of a segment as it was right after the change `history_id`, or before any change if `history_id` is None.
+    Starts from the nearest later snapshot, or from the current text, and applies the revert patches
+    of the changes since, newest first.
+    :param current_text: function returning the current text of the segment, called only if no snapshot is used
+    :param use_snapshots: If False, always starts from the current text
+    """
+    query = _text_changes_query(tref, vtitle, lang)
+    ids = {}
+    if history_id is not None:
+        ids["$gt"] = history_id
+
+    snapshot = None
+    if use_snapshots:
+        snap_query = {"ref": tref, "version": vtitle, "language": lang}
+        if history_id is not None:
+            snap_query["history_id"] = {"$gte": history_id}
+        snapshot = db.history_snapshots.find_one(snap_query, {"history_id": 1, "text": 1}, sort=[("history_id", 1)])
+    if snapshot:
+        text = snapshot["text"]
+        ids["$lte"] = snapshot["history_id"]
+    else:
+        text = current_text()
+    if ids:
+        query["_id"] = ids
+
+    for change in db.history.find(query, {"revert_patch": 1}).sort([["_id", -1]]):
+        patch = dmp.patch_fromText(change["revert_patch"])
+        text = dmp.patch_apply(patch, text)[0]
+
+    return text
 
 
 def log_update(user, klass, old_dict, new_dict, **kwargs):
@@ -87,6 +153,16 @@ def log_add(user, klass, new_dict, **kwargs):
     return _log_general(user, kind, None, new_dict, rev_type, **kwargs)
 
 
+def log_bulk(user, klass, summary, **kwargs):
+    """
+    Records many adds and deletes of `klass` records, made together by one process, in a single history record.
+    :param summary: dict describing the change, stored as `new`
+    """
+    kind = klass.history_noun
+    rev_type = "bulk {}".format(kind)
+    return _log_general(user, kind, None, summary, rev_type, **kwargs)
+
+
 def _log_general(user, kind, old_dict, new_dict, rev_type, **kwargs):
     log = {
         #"revision": next_revision_num(),
@@ -188,6 +264,9 @@ def process_index_title_change_in_history(indx, **kwargs):
         h.new["ref"] = h.new["ref"].replace(kwargs["old"], kwargs["new"], 1)
         h.save()
 
+    # Snapshots are only a shortcut for reconstruct_text(), and can be rebuilt with scripts/backfill_history_snapshots.py
+    db.history_snapshots.remove(construct_query('ref', queries))
+
     title_hist = HistorySet({"title": {"$regex": title_pattern}}, sort=[('title', 1)])
     print "Cascading Index History {} to {}".format(kwargs['old'], kwargs['new'])
     for h in title_hist:
@@ -204,4 +283,5 @@ def process_version_title_change_in_history(ver, **kwargs):
         "version": kwargs["old"],
         "language": ver.language,
     }
-    db.history.update(query, {"$set": {"version": kwargs["new"]}}, upsert=False, multi=True)
\ No newline at end of file
+    db.history.update(query, {"$set": {"version": kwargs["new"]}}, upsert=False, multi=True)
+    db.history_snapshots.update(query, {"$set": {"version": kwargs["new"]}}, upsert=False, multi=True)
\ No newline at end of file
@@ -3,8 +3,13 @@ translation_request.py
 Writes to MongoDB Collection:
 """
 import re
+from collections import OrderedDict, defaultdict
+
 from . import abstract as abst
+from sefaria.system.database import db
 from sefaria.system.exceptions import InputError
+from sefaria.system import instrumentation
+from sefaria.settings import WORD_FORM_CACHE_ENTRIES
 
 
 class WordForm(abst.AbstractMongoRecord):
@@ -127,7 +132,54 @@ class LexiconEntrySet(abst.AbstractMongoSet):
             self.max = len(self.records)
 
 
+class WordFormCache(object):
+    """
+    In-process LRU of word form lookups, keyed by the lookup field and the form, used by :class:`LexiconLookupAggregator`.
+    Keeps the matching word form documents, or an empty list for forms that were not found.
+    Cleared when a WordForm is saved or deleted in this process.
+    """
+    def __init__(self, max_entries=WORD_FORM_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get_many(self, lookup_key, forms):
+        """
+        :return: (dict from each cached form to its documents, list of the forms that are not cached)
+        """
+        found, missing = {}, []
+        for form in forms:
+            docs = self._entries.pop((lookup_key, form), None)
+            if docs is None:
+                missing.append(form)
+            else:
+                self._entries[(lookup_key, form)] = docs
+                found[form] = docs
+        return found, missing
+
+    def set(self, lookup_key, form, docs):
+        if not self.max_entries:
+            return
+        self._entries[(lookup_key, form)] = docs
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+word_form_cache = WordFormCache()
+
+
+def process_word_form_change(wf, **kwargs):
+    word_form_cache.clear()
+
+
 class LexiconLookupAggregator(object):
+    """
+    Looks up the lexicon entries of a word or phrase, through the word forms of the phrase and of its n-grams.
+    All of the candidate forms are normalized up front, and looked up with one `$in` query per lookup field.
+    """
+    _word_form_fields = {"_id": 1, "form": 1, "c_form": 1, "lookups": 1, "refs": 1}
 
     @classmethod
     def _split_input(cls, input_str):
@@ -142,56 +194,116 @@ class LexiconLookupAggregator(object):
         return gram_list
 
     @classmethod
-    def _single_lookup(cls, input_word, lookup_key='form', **kwargs):
-        from sefaria.utils.hebrew import is_hebrew, strip_cantillation, has_cantillation
-        from sefaria.model import Ref
+    def _ngrams(cls, input_words):
+        """
+        :return list: The n-grams of `input_words` shorter than the whole, longest first, without repeats
+        """
+        seen = set()
+        gram_list = []
+        for i in reversed(range(len(input_words))):
+            for ng in cls._create_ngrams(input_words, i):
+                if ng not in seen:
+                    seen.add(ng)
+                    gram_list.append(ng)
+        return gram_list
 
-        lookup_ref = kwargs.get("lookup_ref", None)
-        wform_pkey = lookup_key
+    @classmethod
+    def _normalize(cls, input_word):
+        from sefaria.utils.hebrew import is_hebrew, strip_cantillation
         if is_hebrew(input_word):
             input_word = strip_cantillation(input_word)
-            """if not has_cantillation(input_word, detect_vowels=True):
-                wform_pkey = 'c_form'"""
-        query_obj = {wform_pkey: input_word}
-        if lookup_ref:
-            nref = Ref(lookup_ref).normal()
-            query_obj["refs"] = {'$regex': '^{}'.format(nref)}
-        form = WordForm().load(query_obj)
-        if not form and lookup_ref:
-            del query_obj["refs"]
-            form = WordForm().load(query_obj)
-        if form:
-            result = []
-            headword_query = []
-            for lookup in form.lookups:
-                headword_query.append({'headword': lookup['headword']})
-                # TODO: if we want the 'lookups' in wf to be a dict we can pass as is to the lexiconentry, we need to change the key 'lexicon' to 'parent_lexicon' in word forms
-            return headword_query
-        else:
-            return []
+        return input_word
+
+    @staticmethod
+    def _fold(form, lookup_key):
+        # `form` is matched case insensitively, as WordForm.load() does.  Other fields are matched exactly.
+        return form.lower() if lookup_key == 'form' else form
+
+    @classmethod
+    def _lookup_forms(cls, forms, lookup_key='form'):
+        """
+        Finds the word forms of all of `forms` at once, from `word_form_cache` or with one query.
+        :param forms: list of normalized forms
+        :return dict: from each folded form to the list of its word form documents, in _id order
+        """
+        folded = list(OrderedDict.fromkeys(cls._fold(f, lookup_key) for f in forms))
+        found, missing = word_form_cache.get_many(lookup_key, folded)
+        if missing:
+            terms = [f if lookup_key != 'form' or f.upper() == f else re.compile(u"^{}$".format(re.escape(f)), re.IGNORECASE | re.UNICODE)
+                     for f in missing]
+            docs = defaultdict(list)
+            with instrumentation.timer("mongo." + WordForm.collection):
+                for doc in db.word_form.find({lookup_key: {"$in": terms}}, cls._word_form_fields).sort("_id", 1):
+                    if isinstance(doc.get(lookup_key), basestring):
+                        docs[cls._fold(doc[lookup_key], lookup_key)].append(doc)
+            for f in missing:
+                found[f] = docs.get(f, [])
+                word_form_cache.set(lookup_key, f, found[f])
+        return found
+
+    @staticmethod
+    def _choose_form(docs, nref=None):
+        """
+        :return: The first of `docs` with a ref under `nref`, if any, otherwise the first of `docs`
+        """
+        if nref:
+            for doc in docs:
+                refs = doc.get("refs") or []
+                if isinstance(refs, basestring):
+                    refs = [refs]
+                if any(r.startswith(nref) for r in refs):
+                    return doc
+        return docs[0] if docs else None
+
+    @classmethod
+    def _headword_queries(cls, found, form, lookup_key='form', nref=None):
+        doc = cls._choose_form(found.get(cls._fold(form, lookup_key), []), nref)
+        # TODO: if we want the 'lookups' in wf to be a dict we can pass as is to the lexiconentry, we need to change the key 'lexicon' to 'parent_lexicon' in word forms
+        return [{'headword': lookup['headword']} for lookup in doc["lookups"]] if doc else []
 
+    @staticmethod
+    def _normal_lookup_ref(**kwargs):
+        from sefaria.model import Ref
+        lookup_ref = kwargs.get("lookup_ref", None)
+        return Ref(lookup_ref).normal() if lookup_ref else None
+
+    @classmethod
+    def _single_lookup(cls, input_word, lookup_key='form', **kwargs):
+        input_word = cls._normalize(input_word)
+        found = cls._lookup_forms([input_word], lookup_key)
+        return cls._headword_queries(found, input_word, lookup_key, cls._normal_lookup_ref(**kwargs))
 
     @classmethod
     def _ngram_lookup(cls, input_str, **kwargs):
-        words = cls._split_input(input_str)
-        input_length = len(words)
+        ngrams = [cls._normalize(ng) for ng in cls._ngrams(cls._split_input(input_str))]
+        found = cls._lookup_forms(ngrams)
+        nref = cls._normal_lookup_ref(**kwargs)
         queries = []
-        for i in reversed(range(input_length)):
-            ngrams = cls._create_ngrams(words, i)
-            for ng in ngrams:
-                res = cls._single_lookup(ng, **kwargs)
-                if res:
-                    queries += res
+        for ng in ngrams:
+            queries += cls._headword_queries(found, ng, nref=nref)
         return queries
 
     @classmethod
     def lexicon_lookup(cls, input_str, **kwargs):
-        results = cls._single_lookup(input_str, **kwargs)
+        """
+        Looks up the word forms of the whole input, and, unless 'never_split', of its n-grams, in one query.
+        If the whole input has no form, it is looked up again by 'c_form'.  The n-grams are used if the input
+        wasn't found, or if 'always_split'.  If 'lookup_ref' is given, forms with refs under it are preferred.
+        :return: :class:`LexiconEntrySet` of the entries found, or None
+        """
+        nref = cls._normal_lookup_ref(**kwargs)
+        phrase = cls._normalize(input_str)
+        split = not kwargs.get('never_split', None)
+        ngrams = [cls._normalize(ng) for ng in cls._ngrams(cls._split_input(input_str))] if split else []
+        found = cls._lookup_forms([phrase] + ngrams)
+
+        results = cls._headword_queries(found, phrase, nref=nref)
         if not results:
-            results = cls._single_lookup(input_str, lookup_key='c_form', **kwargs)
-        if not kwargs.get('never_split', None) and (len(results) == 0 or kwargs.get("always_split", None)):
-            ngram_results = cls._ngram_lookup(input_str, **kwargs)
-            results += ngram_results
+            results = cls._headword_queries(cls._lookup_forms([phrase], 'c_form'), phrase, 'c_form', nref)
+        if split and (len(results) == 0 or kwargs.get("always_split", None)):
+            for ng in ngrams:
+                results += cls._headword_queries(found, ng, nref=nref)
+        results = [{'headword': h} for h in OrderedDict.fromkeys(q['headword'] for q in results)]
         if len(results):
             return LexiconEntrySet({"$or": results})
         else:
@@ -8,6 +8,7 @@ from bson.objectid import ObjectId
 
 from sefaria.system.exceptions import DuplicateRecordError, InputError
 from sefaria.system.database import db
+from sefaria.settings import LINK_REF_KEY_QUERIES
 from . import abstract as abst
 from . import text
 
@@ -31,7 +32,8 @@ class Link(abst.AbstractMongoRecord):
         "anchorText",     # string of dibbur hamatchil (largely depcrated) 
         "auto",           # bool whether generated by automatic process
         "generated_by",   # string in ("add_commentary_links", "add_links_from_text", "mishnah_map")
-        "source_text_oid" # oid of text from which link was generated
+        "source_text_oid", # oid of text from which link was generated
+        "ref_keys"        # list of indexable forms of refs, see ref_key()
     ]
 
     def _normalize(self):
@@ -39,7 +41,9 @@ class Link(abst.AbstractMongoRecord):
         self.generated_by = getattr(self, "generated_by", None)
         self.source_text_oid = getattr(self, "source_text_oid", None)
         self.type = getattr(self, "type", "").lower()
-        self.refs = [text.Ref(self.refs[0]).normal(), text.Ref(self.refs[1]).normal()]
+        orefs = [text.Ref(self.refs[0]), text.Ref(self.refs[1])]
+        self.refs = [orefs[0].normal(), orefs[1].normal()]
+        self.ref_keys = [ref_key(orefs[0]), ref_key(orefs[1])]
 
         if getattr(self, "_id", None):
             self._id = ObjectId(self._id)
@@ -122,6 +126,61 @@ class Link(abst.AbstractMongoRecord):
                 return None
 
 
+REF_KEY_WIDTH = 5  # digits per section in ref_key()
+
+
+def _sections_key(sections, depth, pad):
+    return u".".join(format(s, "0{}d".format(REF_KEY_WIDTH)) for s in sections + [pad] * (depth - len(sections)))
+
+
+def ref_key(oref):
+    """
+    Indexable form of a Ref, stored for each side of a Link in `ref_keys`, and queried by :func:`ref_key_query`.
+
+    `start` and `end` are the sections and toSections of the Ref, zero padded to fixed width, and padded
+    to the depth of the node with the lowest and highest possible sections, so that they sort in text order.
+    `level` is twice the number of sections, plus one if the Ref is not a range.  See :func:`ref_key_query`.
+
+    :param oref: :class:`sefaria.text.Ref`
+    :return dict:
+    """
+    depth = max(getattr(oref.index_node, "depth", 0), len(oref.sections))
+    return {
+        "book": oref.book,
+        "start": _sections_key(oref.sections, depth, 0),
+        "end": _sections_key(oref.toSections, depth, 10 ** REF_KEY_WIDTH - 1),
+        "level": 2 * len(oref.sections) + (0 if oref.is_range() else 1)
+    }
+
+
+def ref_key_applies(oref):
+    """
+    :return bool: True if links to `oref` can be found with :func:`ref_key_query`.
+    False for refs to schema nodes with titled children, whose links are on other nodes.
+    """
+    return isinstance(oref.index_node, text.JaggedArrayNode) and not oref.index_node.has_titled_continuation()
+
+
+def ref_key_query(oref):
+    """
+    Query for the Links to `oref` or below, with range predicates on `ref_keys`.
+
+    Matches the same links as the regular expressions of `oref.regex()`:
+    A link matches if one of its refs starts within `oref`, at the granularity of `oref` or finer.
+    A ranged link ref at exactly the granularity of `oref` does not match, e.g. "Genesis 1:3-5" for "Genesis 1:3".
+    That is the `level` predicate.
+
+    :param oref: :class:`sefaria.text.Ref`, for which :func:`ref_key_applies`
+    :return dict:
+    """
+    key = ref_key(oref)
+    return {"ref_keys": {"$elemMatch": {
+        "book": key["book"],
+        "start": {"$gte": key["start"], "$lte": key["end"]},
+        "level": {"$gt": 2 * len(oref.sections)}
+    }}}
+
+
 class LinkSet(abst.AbstractMongoSet):
     recordClass = Link
 
@@ -129,14 +188,19 @@ class LinkSet(abst.AbstractMongoSet):
         '''
         LinkSet can be initialized with a query dictionary, as any other MongoSet.
         It can also be initialized with a :py:class: `sefaria.text.Ref` object,
-        and will use the :py:meth: `sefaria.text.Ref.regex()` method to return the set of Links that refer to that Ref or below.
+        and will return the set of Links that refer to that Ref or below.
+        With LINK_REF_KEY_QUERIES on, this uses range predicates on the indexed `ref_keys` of links (see :func:`ref_key_query`).
+        Otherwise, it uses the :py:meth: `sefaria.text.Ref.regex()` method.
         :param query_or_ref: A query dict, or a :py:class: `sefaria.text.Ref` object
         '''
-        try:
-            regex_list = query_or_ref.regex(as_list=True)
-            ref_clauses = [{"refs": {"$regex": r}} for r in regex_list]
-            super(LinkSet, self).__init__({"$or": ref_clauses}, page, limit, hint=[("refs", 1)])
-        except AttributeError:
+        if isinstance(query_or_ref, text.Ref):
+            if LINK_REF_KEY_QUERIES and ref_key_applies(query_or_ref):
+                super(LinkSet, self).__init__(ref_key_query(query_or_ref), page, limit)
+            else:
+                regex_list = query_or_ref.regex(as_list=True)
+                ref_clauses = [{"refs": {"$regex": r}} for r in regex_list]
+                super(LinkSet, self).__init__({"$or": ref_clauses}, page, limit, hint=[("refs", 1)])
+        else:
             super(LinkSet, self).__init__(query_or_ref, page, limit)
 
     def filter(self, sources):
@@ -347,7 +347,9 @@ class NotificationSet(abst.AbstractMongoSet):
         """
         Returns a nicely formatted string listing the people who acted in this notifcation set
         """
-        actors = [user_profile.user_name(id) for id in self.actors_list()]
+        actor_ids = self.actors_list()
+        actors_data = user_profile.public_user_data_many(actor_ids)
+        actors = [actors_data[id]["name"] for id in actor_ids]
         top, more = actors[:3], actors[3:]
         if len(more) == 1:
             top[2] = "2 others"
@@ -148,6 +148,7 @@ class Term(abst.AbstractMongoRecord):
     Terms that use the same TermScheme can be ordered.
     """
     collection = 'term'
+    cache_records = True
     track_pkeys = True
     pkeys = ["name"]
     title_group = None
@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
 
+import re
+import time
+from datetime import datetime
+
 import pytest
 
 from sefaria.system.database import db
@@ -121,3 +125,86 @@ class Test_Mongo_Record_Methods(object):
             assert res == c
 
 
+
+
+class Test_Record_Cache(object):
+
+    class FakeRecord(object):
+        collection = "record_cache_test"
+
+    def test_read_through_and_invalidate(self):
+        cache = abstract.RecordCache(max_local_entries=5, cache_type="default")
+        calls = []
+        fetch = lambda: calls.append(1) or {"a": [1]}
+        key = ["find_one", {"x": 1}, None]
+
+        r = cache.get(self.FakeRecord, key, fetch)
+        r["a"].append(2)  # results are copies, so this does not change the cache
+        assert cache.get(self.FakeRecord, key, fetch) == {"a": [1]}
+        assert len(calls) == 1
+
+        cache.invalidate(self.FakeRecord.collection)
+        assert cache.get(self.FakeRecord, key, fetch) == {"a": [1]}
+        assert len(calls) == 2
+        stats = cache.stats()["FakeRecord"]
+        assert stats["misses"] == 2
+        assert stats["local_hits"] == 1
+
+    def test_missing_record_is_cached(self):
+        cache = abstract.RecordCache(max_local_entries=5, cache_type="default")
+        calls = []
+        fetch = lambda: calls.append(1)
+        key = ["find_one", {"x": "not there"}, None]
+        assert cache.get(self.FakeRecord, key, fetch) is None
+        assert cache.get(self.FakeRecord, key, fetch) is None
+        assert len(calls) == 1
+        cache.invalidate(self.FakeRecord.collection)
+
+    def test_other_process_sees_invalidation(self):
+        a = abstract.RecordCache(max_local_entries=5, generation_ttl=0.1, cache_type="default")
+        b = abstract.RecordCache(max_local_entries=5, generation_ttl=0.1, cache_type="default")
+        calls = []
+        fetch = lambda: calls.append(1) or {"a": 1}
+        key = ["find_one", {"x": 2}, None]
+        a.invalidate(self.FakeRecord.collection)
+
+        a.get(self.FakeRecord, key, fetch)
+        b.get(self.FakeRecord, key, fetch)
+        assert len(calls) == 1
+        assert b.stats()["FakeRecord"]["shared_hits"] == 1
+
+        a.invalidate(self.FakeRecord.collection)
+        a.get(self.FakeRecord, key, fetch)
+        assert len(calls) == 2
+        time.sleep(0.2)
+        b.get(self.FakeRecord, key, fetch)
+        assert len(calls) == 2  # From the entry cached by `a`, under the new generation
+        assert b.stats()["FakeRecord"]["shared_hits"] == 2
+
+    def test_keys(self):
+        cache = abstract.RecordCache(cache_type="default")
+        assert cache._key("c", ["find", {"title": re.compile("^Gen", re.I)}]) == \
+            cache._key("c", ["find", {"title": re.compile(u"^Gen", re.I)}])
+        assert cache._key("c", ["find", {"title": re.compile("^Gen")}]) != \
+            cache._key("c", ["find", {"title": re.compile("^Gen", re.I)}])
+        assert cache._key("c", ["find", {"date": datetime.now()}]) is None
+
+        calls = []
+        fetch = lambda: calls.append(1)
+        cache.get(self.FakeRecord, ["find", {"date": datetime.now()}], fetch)
+        cache.get(self.FakeRecord, ["find", {"date": datetime.now()}], fetch)
+        assert len(calls) == 2
+
+    def test_set_count_does_not_read_records(self):
+        s = model.IndexSet()
+        assert s.count() >= 0
+        assert s.records is None
+
+    def test_save_invalidates(self):
+        t = model.Term().load({})
+        if not t or not abstract.record_cache.enabled:
+            return
+        assert model.Term().load({"name": t.name}).name == t.name
+        gen = abstract.record_cache._generation(model.Term.collection)
+        t.save()
+        assert abstract.record_cache._generation(model.Term.collection) != gen
@@ -142,6 +142,22 @@ def test_commentary_chunks():
     assert span.text[-1][-1] == verse.text
 
 
+def test_sliced_chunks_match_projected_chunks():
+    for tref in ["Daniel 2", "Daniel 2:3", "Daniel 2:3-5", "Daniel 2:3-4:5", "Rashi on Exodus 3:1", "Rashi on Exodus 3:1:2",
+                 "Rashi on Exodus 3:1-4:10", "Bemidbar Rabbah 66.4"]:
+        oref = Ref(tref)
+        query = oref.condition_query("he")
+        pipeline = oref.part_pipeline(query)
+        if pipeline is None:
+            pytest.skip("Database does not support slicing in aggregation")
+        chunk = TextChunk(oref, "he")
+        projected = VersionSet(query, proj=oref.part_projection()).array()
+        sliced = VersionSet.aggregate(pipeline).array()
+        assert len(projected) == len(sliced)
+        for p, s in zip(projected, sliced):
+            assert chunk.trim_text(p.content_node(oref.index_node)) == chunk.trim_text(s.content_node(oref.index_node), sliced=True)
+
+
 def test_spanning_family():
     f = TextFamily(Ref("Daniel 2:3-4:5"), context=0)
 
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+
+from diff_match_patch import diff_match_patch
+
+from sefaria.model.history import snapshot_text_if_due, reconstruct_text
+from sefaria.settings import HISTORY_SNAPSHOT_REVISIONS
+from sefaria.system.database import db
+
+dmp = diff_match_patch()
+KEY = {"ref": "History Test 1:1", "version": "History Test", "language": "en"}
+
+
+class Test_history_snapshots(object):
+    texts = [u""]
+    ids = []
+
+    @classmethod
+    def setup_class(cls):
+        for i in range(HISTORY_SNAPSHOT_REVISIONS * 2 + 5):
+            new_text = cls.texts[-1] + u" word{}".format(i)
+            patch = dmp.patch_toText(dmp.patch_make(dmp.diff_main(new_text, cls.texts[-1])))
+            _id = db.history.insert(dict(KEY, revert_patch=patch, rev_type="edit text", user=0, date=datetime.now()))
+            snapshot_text_if_due(KEY["ref"], KEY["version"], KEY["language"], _id, new_text)
+            cls.texts.append(new_text)
+            cls.ids.append(_id)
+
+    @classmethod
+    def teardown_class(cls):
+        db.history.remove(KEY)
+        db.history_snapshots.remove(KEY)
+
+    def test_snapshots_written(self):
+        assert db.history_snapshots.find(KEY).count() == 2
+
+    def test_reconstruct(self):
+        current = lambda: self.texts[-1]
+        for n in [1, HISTORY_SNAPSHOT_REVISIONS, HISTORY_SNAPSHOT_REVISIONS + 1, len(self.ids)]:
+            for use_snapshots in (True, False):
+                assert reconstruct_text(KEY["ref"], KEY["version"], KEY["language"], self.ids[n - 1], current, use_snapshots) == self.texts[n]
+        assert reconstruct_text(KEY["ref"], KEY["version"], KEY["language"], None, current) == u""
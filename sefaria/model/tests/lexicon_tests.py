@@ -40,3 +40,21 @@ class Test_Lexicon_Lookup(object):
 
         results = LexiconLookupAggregator.lexicon_lookup(word3)
         assert results.count() == 1
+
+
+class Test_Lexicon_Lookup_Engine(object):
+
+    def test_ngrams(self):
+        words = ["a", "b", "c"]
+        assert LexiconLookupAggregator._ngrams(words) == ["a", "b", "c", "a b", "b c"]
+        assert LexiconLookupAggregator._ngrams(["a"]) == []
+
+    def test_word_form_cache(self):
+        from sefaria.model.lexicon import word_form_cache
+        word = u"תִּשְׁמֹ֑רוּ"
+        word_form_cache.clear()
+        results = LexiconLookupAggregator.lexicon_lookup(word)
+        found, missing = word_form_cache.get_many('form', [LexiconLookupAggregator._normalize(word)])
+        assert len(found) == 1 and not missing
+        # Cached lookups give the same results
+        assert [r.headword for r in LexiconLookupAggregator.lexicon_lookup(word)] == [r.headword for r in results]
@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 
+import os
+
 import pytest
-from sefaria.model.text import library, Ref, Index
+from sefaria.model.text import library, Library, Ref, Index, get_library_version_stamp
 
 
 
@@ -279,6 +281,15 @@ class Test_get_titles_in_text(object):
             assert set(titles) == {u'ויקרא', u'ספר מקבים א'}
 
 
+    @pytest.mark.parametrize(('citing_only'), (True, False))
+    def test_matcher_agrees_with_regex(self, citing_only):
+        for lang, st in [("en", texts['weird_ref']), ("he", texts['weird_ref_he']),
+                         ("en", u"This is a test of a Brachot 7b and also of an Isaiah 12:13."),
+                         ("he", u"תלמוד לומר (דברים טז, יח) שופטים תתן שוטרים")]:
+            expected = [m.group('title') for m in library.all_titles_regex(lang, citing_only=citing_only).finditer(st)]
+            assert library.get_titles_in_string(st, lang, citing_only=citing_only) == expected
+
+
 class Test_Library(object):
     def test_cache_populated_on_instanciation(self):
         assert library._index_map
@@ -341,6 +352,48 @@ class Test_Library(object):
         assert u'רש"י על בראשית' in library._title_node_maps["he"]
 
 
+    def test_incremental_updates_consistent(self):
+        library.full_title_list("en")
+        library.full_title_list("he", with_terms=True)
+        library.citing_title_list("en")
+        library.remove_index_record_from_cache(library.get_index("Genesis"))
+        assert "Genesis" not in library.full_title_list("en")
+        library.add_index_record_to_cache(Index().load({"title": "Genesis"}))
+        assert "Genesis" in library.full_title_list("en")
+        assert "Genesis" in library.citing_title_list("en")
+        library.refresh_index_record_in_cache(library.get_index("Rashi on Genesis"))
+        assert library.check_consistency() == []
+
+    def test_refresh_keeps_unchanged_title_regex(self):
+        reg = library.all_titles_regex("en")
+        library.refresh_index_record_in_cache(library.get_index("Exodus"))
+        assert library.all_titles_regex("en") is reg
+
+    def test_snapshot_round_trip(self, tmpdir):
+        path = str(tmpdir.join("library.pkl"))
+        assert library.save_snapshot(path, "stamp")
+        loaded = Library(build_maps=False)
+        assert not loaded.load_snapshot(path, "other stamp")
+        assert loaded.load_snapshot(path, "stamp")
+        assert set(loaded._index_map) == set(library._index_map)
+        assert loaded.get_schema_node(u"שמות", "he").primary_title() == "Exodus"
+        assert loaded.full_title_list("en") == library.full_title_list("en")
+
+    def test_snapshot_writable_by_others_is_not_loaded(self, tmpdir):
+        path = str(tmpdir.join("library.pkl"))
+        assert library.save_snapshot(path, "stamp")
+        os.chmod(path, 0o666)
+        assert not Library(build_maps=False).load_snapshot(path, "stamp")
+
+    def test_override_dependencies_save_bumps_stamp(self):
+        stamp = get_library_version_stamp()
+        Index().load({"title": "Exodus"}).save(override_dependencies=True)
+        assert get_library_version_stamp() != stamp
+
+        stamp = get_library_version_stamp()
+        library.refresh_index_record_in_cache(library.get_index("Exodus"))
+        assert get_library_version_stamp() != stamp
+
     def test_get_title_node(self):
         node = library.get_schema_node("Exodus")
         assert node.is_flat()
@@ -349,6 +402,11 @@ class Test_Library(object):
         n2 = library.get_schema_node(u"שמות", "he")
         assert node == n2
 
+    def test_get_schema_node_for_ref_string(self):
+        for tref in ["Genesis 1:1", "Genesis Rabbah 1:1", "Rashi on Genesis 1:1:1", "Shabbat 31a:6", "Shulchan Arukh, Orach Chayim 1:1"]:
+            assert library.get_schema_node_for_ref_string(tref) == Ref(tref).index_node
+        assert library.get_schema_node_for_ref_string("Not a Title 1:1") is None
+
 
 def test_get_en_text_titles():
     txts = [u'Avot', u'Avoth', u'Daniel', u'Dan', u'Dan.'] # u"Me'or Einayim, Vayera"
@@ -518,6 +518,43 @@ class Test_Cache(object):
         r2 = Ref("Ramban on Genesis 1")
         assert r1 is not r2
 
+    def test_alias_shares_instance(self):
+        Ref.clear_cache()
+        r = Ref("Gen. 27:3")
+        assert Ref("Genesis 27:3") is r
+        assert Ref._raw_cache()["Gen. 27:3"] is r
+        Ref.remove_index_from_cache("Genesis")
+        assert "Gen. 27:3" not in Ref._raw_cache()
+        assert "Genesis 27:3" not in Ref._raw_cache()
+
+    def test_lru_eviction(self):
+        from sefaria.model.text import RefCache
+        c = RefCache(max_entries=2)
+        a, b, d = object(), object(), object()
+        c.add(a, "A 1", "A", alias="A. 1")
+        c.add(b, "B 1", "B")
+        assert c.get("A. 1") is a  # A is now most recently used
+        c.add(d, "C 1", "C")
+        assert c.get("B 1") is None
+        assert c.get("A 1") is a
+        assert c.get("C 1") is d
+        stats = c.stats()
+        assert stats["evictions"] == 1
+        assert stats["entries"] == 2
+        assert stats["hits"] == 3
+        assert stats["misses"] == 1
+
+    def test_byte_bound(self):
+        from sefaria.model.text import RefCache
+        c = RefCache(max_bytes=RefCache.ENTRY_OVERHEAD * 3)
+        for i in range(10):
+            c.add(object(), "A {}".format(i), "A")
+        assert len(c) < 3
+        assert c.bytes <= RefCache.ENTRY_OVERHEAD * 3
+        c.remove_index("A")
+        assert len(c) == 0
+        assert c.bytes == 0
+
     def test_tref_bleed(self):
         # Insure that instanciating trefs are correct for this instance, and don't bleed through the cache.
         Ref(u'שבת לא')
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.test.utils import override_settings
+
+from sefaria.model.notification import Notification
+from sefaria.model.user_profile import UserProfile, public_user_data, public_user_data_many, user_link, email_unread_notifications, \
+    unread_notification_digests
+
+
+def test_public_user_data_many():
+    missing = 999999999
+    data = public_user_data_many([1, 1, missing])
+    assert set(data.keys()) == {1, missing}
+
+    profile = UserProfile(id=1)
+    assert data[1]["name"] == profile.full_name
+    assert data[1]["profileUrl"] == "/profile/" + profile.slug
+    assert data[1]["imageUrl"] == profile.gravatar_url_small
+    assert public_user_data(1) == data[1]
+
+    assert data[missing]["name"] == UserProfile(id=missing).full_name
+    assert user_link(missing) == "<a href='/profile/' class='userLink'>User {}</a>".format(missing)
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise IOError("SMTP server is down")
+
+
+class Test_Email_Notifications(object):
+
+    def setup_method(self, method):
+        self.notification = Notification({"uid": 1}).make_message(sender_id=1, message="Test notification digest")
+        self.notification.save()
+
+    def teardown_method(self, method):
+        self.notification.delete()
+
+    def test_digests(self):
+        digests = list(unread_notification_digests("all", uids=[1], chunk_size=1))
+        assert [d["uid"] for d in digests] == [1]
+        assert digests[0]["count"] >= 1
+
+    @override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+    def test_send_once(self):
+        mail.outbox = []
+        stats = email_unread_notifications("all", uids=[1])
+        assert stats["sent"] == 1
+        assert len(mail.outbox) == 1
+        assert "Test notification digest" in mail.outbox[0].body
+        assert Notification().load({"_id": self.notification._id}).read_via == "email"
+
+        # Running again sends nothing
+        assert email_unread_notifications("all", uids=[1])["sent"] == 0
+        assert len(mail.outbox) == 1
+
+    @override_settings(EMAIL_BACKEND='sefaria.model.tests.user_profile_test.FailingEmailBackend')
+    def test_failed_send_leaves_unread(self):
+        stats = email_unread_notifications("all", uids=[1])
+        assert stats["failed"] == 1
+        assert not Notification().load({"_id": self.notification._id}).read
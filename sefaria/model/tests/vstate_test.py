@@ -41,3 +41,77 @@ class Test_VSNode(object):
         assert "Verse" in cd
         assert "Comment" in cd
 
+
+
+class Test_VState_Delta(object):
+    vtitles = ["VState Delta Test", "VState Delta Test 2"]
+
+    def setup_method(self, method):
+        self.teardown_method(method)
+        for vtitle in self.vtitles:
+            Version({
+                "language": "en",
+                "title": "Pirkei Avot",
+                "versionSource": "http://foobar.com",
+                "versionTitle": vtitle,
+                "chapter": []
+            }).save()
+        VersionState("Pirkei Avot").refresh()
+
+    def teardown_method(self, method):
+        for vtitle in self.vtitles:
+            v = Version().load({"title": "Pirkei Avot", "versionTitle": vtitle})
+            if v:
+                v.delete()
+        VersionState("Pirkei Avot").refresh()
+
+    def change(self, tref, text, vtitle="VState Delta Test"):
+        """
+        Saves `text` at `tref`, applies the change to the counts, and checks them against a recount.
+        """
+        oref = Ref(tref)
+        chunk = TextChunk(oref, "en", vtitle)
+        old_text = chunk.text
+        chunk.text = text
+        chunk.save()
+        assert VersionState("Pirkei Avot").apply_text_change(oref, "en", old_text, chunk.text)
+        assert VersionState("Pirkei Avot").verify() == []
+
+    def test_add_and_empty_segment(self):
+        self.change("Pirkei Avot 1:1", "Added")
+        self.change("Pirkei Avot 1:1", "")
+
+    def test_add_section(self):
+        self.change("Pirkei Avot 2", ["One", "", "Three"])
+        self.change("Pirkei Avot 2", ["One", "Two", "Three", "Four"])
+
+    def test_add_past_end(self):
+        last = len(TextChunk(Ref("Pirkei Avot 1"), "he").text)
+        self.change("Pirkei Avot 1:{}".format(last + 3), "Beyond the end of the chapter")
+
+    def test_second_version(self):
+        self.change("Pirkei Avot 1:2", "First version")
+        self.change("Pirkei Avot 1:2", "Second version", vtitle="VState Delta Test 2")
+        self.change("Pirkei Avot 1:2", "", vtitle="VState Delta Test 2")
+
+    def test_covers(self):
+        assert VersionState._covers([1, 0, 1], [1, 1])
+        assert VersionState._covers([[1], [0, 1]], [[0], []])
+        assert not VersionState._covers([1], [1, 1])
+        assert not VersionState._covers(1, [1])
+        assert VersionState._covers([1], 0)
+        assert not VersionState._covers([1], 1)
+
+    def test_place(self):
+        # Existing positions are left alone, missing ones padded as TextChunk._pad() pads the content
+        assert VersionState._place([1, -1], [2], [[1], [1, 1]], 2) == [None, None, [1, -1]]
+        assert VersionState._place([1], [3], [[1]], 2) == [None, [], [], [1]]
+        assert VersionState._place(1, [0, 2], [[1]], 2) == [[None, 0, 1]]
+
+    def test_delta_matches_recount(self):
+        vs = VersionState("Exodus")
+        vs.refresh()
+        assert vs.verify() == []
+        old_text = TextChunk(Ref("Exodus 1:1"), "en").text
+        assert vs.apply_text_change(Ref("Exodus 1:1"), "en", old_text, old_text)
+        assert vs.verify() == []
@@ -7,11 +7,17 @@ import logging
 logger = logging.getLogger(__name__)
 
 import sys
+import os
+import stat
+import uuid
+import cPickle as pickle
 import regex
 import copy
 import bleach
 import json
 import itertools
+from collections import OrderedDict
+from bson.son import SON
 
 try:
     import re2 as re
@@ -24,12 +30,15 @@ from . import abstract as abst
 from schema import deserialize_tree, SchemaNode, JaggedArrayNode, TitledTreeNode, AddressTalmud, TermSet, TitleGroup
 
 import sefaria.system.cache as scache
+from sefaria.system import instrumentation
+from sefaria.system.database import db, server_version
 from sefaria.system.exceptions import InputError, BookNameError, PartialRefInputError, IndexSchemaError, NoVersionFoundError
 from sefaria.utils.talmud import daf_to_section
 from sefaria.utils.hebrew import is_hebrew, hebrew_term
 from sefaria.utils.util import list_depth
+from sefaria.utils.aho_corasick import AhoCorasick
 from sefaria.datatype.jagged_array import JaggedTextArray, JaggedArray
-from sefaria.settings import DISABLE_INDEX_SAVE, USE_VARNISH
+from sefaria.settings import DISABLE_INDEX_SAVE, USE_VARNISH, REF_CACHE_MAX_ENTRIES, REF_CACHE_MAX_BYTES, LIBRARY_SNAPSHOT_PATH
 
 
 """
@@ -167,6 +176,7 @@ class Index(abst.AbstractMongoRecord, AbstractIndex):
     """
     collection = 'index'
     history_noun = 'index'
+    cache_records = True
     criteria_field = 'title'
     criteria_override_field = 'oldTitle'  # used when primary attribute changes. field that holds old value.
     track_pkeys = True
@@ -217,7 +227,11 @@ class Index(abst.AbstractMongoRecord, AbstractIndex):
     def save(self, override_dependencies=False):
         if DISABLE_INDEX_SAVE:
             raise InputError("Index saving has been disabled on this system.")
-        return super(Index, self).save(override_dependencies=override_dependencies)
+        super(Index, self).save(override_dependencies=override_dependencies)
+        if override_dependencies:
+            # Otherwise done by dependency callback
+            bump_library_version_stamp()
+        return self
 
     def _set_derived_attributes(self):
         if getattr(self, "schema", None):
@@ -988,16 +1002,22 @@ class VersionSet(abst.AbstractMongoSet):
     def verse_count(self):
         return sum([v.verse_count() for v in self])
 
-    def merge(self, node=None):
+    def merge(self, node=None, prune=None):
         """
         Returns merged result, but does not change underlying data
+        :param node: Schema node whose content is merged.  If None, the whole content of each version.
+        :param prune: Optional function applied to the content of each version before merging, to restrict the merge to part of it
         """
         for v in self:
             if not getattr(v, "versionTitle", None):
                 logger.error("No version title for Version: {}".format(vars(v)))
         if node is None:
-            return merge_texts([getattr(v, "chapter", []) for v in self], [getattr(v, "versionTitle", None) for v in self])
-        return merge_texts([v.content_node(node) for v in self], [getattr(v, "versionTitle", None) for v in self])
+            texts = [getattr(v, "chapter", []) for v in self]
+        else:
+            texts = [v.content_node(node) for v in self]
+        if prune:
+            texts = [prune(t) for t in texts]
+        return merge_texts(texts, [getattr(v, "versionTitle", None) for v in self])
 
 
 # used in VersionSet.merge(), merge_text_versions(), and export.export_merged()
@@ -1062,6 +1082,7 @@ class TextChunk(AbstractTextRecord):
     """
     text_attr = "text"
 
+    @instrumentation.timed("text_chunk")
     def __init__(self, oref, lang="en", vtitle=None, exclude_copyrighted=False):
         """
         :param oref:
@@ -1092,14 +1113,15 @@ class TextChunk(AbstractTextRecord):
 
         if lang and vtitle:
             self._saveable = True
-            v = Version().load({"title": self._oref.index.title, "language": lang, "versionTitle": vtitle}, self._oref.part_projection())
+            vset, sliced = self._versionset({"title": self._oref.index.title, "language": lang, "versionTitle": vtitle})
+            v = vset[0] if vset.count() else None
             if exclude_copyrighted and v.is_copyrighted():
                 raise InputError("Can not provision copyrighted text. {} ({}/{})".format(oref.normal(), vtitle, lang))
             if v:
                 self._versions += [v]
-                self.text = self._original_text = self.trim_text(v.content_node(self._oref.index_node))
+                self.text = self._original_text = self.trim_text(v.content_node(self._oref.index_node), sliced)
         elif lang:
-            vset = VersionSet(self._oref.condition_query(lang), proj=self._oref.part_projection())
+            vset, sliced = self._versionset(self._oref.condition_query(lang))
 
             if vset.count() == 0:
                 if VersionSet({"title": self._oref.index.title}).count() == 0:
@@ -1110,13 +1132,13 @@ class TextChunk(AbstractTextRecord):
                 if exclude_copyrighted and v.is_copyrighted():
                     raise InputError("Can not provision copyrighted text. {} ({}/{})".format(oref.normal(), v.versionTitle, v.language))
                 self._versions += [v]
-                self.text = self.trim_text(v.content_node(self._oref.index_node))
+                self.text = self.trim_text(v.content_node(self._oref.index_node), sliced)
                 #todo: Should this instance, and the non-merge below, be made saveable?
             else:  # multiple versions available, merge
                 if exclude_copyrighted:
                     vset.remove(Version.is_copyrighted)
-                merged_text, sources = vset.merge(self._oref.index_node)  #todo: For commentaries, this merges the whole chapter.  It may show up as merged, even if our part is not merged.
-                self.text = self.trim_text(merged_text)
+                # Each version is trimmed to our part before merging, so that only our part is merged, and sources reflect only our part.
+                self.text, sources = vset.merge(self._oref.index_node, prune=lambda t: self.trim_text(t, sliced))
                 if len(set(sources)) == 1:
                     for v in vset:
                         if v.versionTitle == sources[0]:
@@ -1129,6 +1151,17 @@ class TextChunk(AbstractTextRecord):
         else:
             raise Exception("TextChunk requires a language.")
 
+    def _versionset(self, query):
+        """
+        :param query: Query for Versions
+        :return: (VersionSet, bool) - The Versions matching `query`, projected to this chunk, and whether their content was sliced
+        down to our Ref in the database (see :meth:`Ref.part_pipeline`), rather than at the top level only (see :meth:`Ref.part_projection`)
+        """
+        pipeline = self._oref.part_pipeline(query)
+        if pipeline:
+            return VersionSet.aggregate(pipeline), True
+        return VersionSet(query, proj=self._oref.part_projection()), False
+
     def __unicode__(self):
         args = u"{}, {}".format(self._oref, self.lang)
         if self.vtitle:
@@ -1289,12 +1322,13 @@ class TextChunk(AbstractTextRecord):
                 )
 
     #maybe use JaggedArray.subarray()?
-    def trim_text(self, txt):
+    def trim_text(self, txt, sliced=False):
         """
         Trims a text loaded from Version record with self._oref.part_projection() to the specifications of self._oref
         This works on simple Refs and range refs of unlimited depth and complexity.
         (in place?)
         :param txt:
+        :param sliced: True if `txt` was loaded with self._oref.part_pipeline(), which slices through the level where the range begins
         :return: List|String depending on depth of Ref
         """
         range_index = self._oref.range_index()
@@ -1305,7 +1339,7 @@ class TextChunk(AbstractTextRecord):
             pass
         else:
             for i in range(0, self._ref_depth):
-                if i == 0 == range_index:  # First level slice handled at DB level
+                if i == 0 == range_index or (sliced and i <= range_index):  # Slice handled at DB level
                     pass
                 elif range_index > i:  # Either not range, or range begins later.  Return simple value.
                     if i == 0 and len(txt):   # We already sliced the first level w/ Ref.part_projection()
@@ -1320,11 +1354,14 @@ class TextChunk(AbstractTextRecord):
                     txt = txt[start:end]
                 else:  # range_index < i, range continues here
                     begin = end = txt
-                    for _ in range(range_index, i - 1):
-                        begin = begin[0]
-                        end = end[-1]
-                    begin[0] = begin[0][sections[i] - 1:]
-                    end[-1] = end[-1][:toSections[i]]
+                    try:
+                        for _ in range(range_index, i - 1):
+                            begin = begin[0]
+                            end = end[-1]
+                        begin[0] = begin[0][sections[i] - 1:]
+                        end[-1] = end[-1][:toSections[i]]
+                    except IndexError:  # This version has no content at the start or end of the range
+                        pass
 
         return txt
 
@@ -1687,30 +1724,161 @@ class TextFamily(object):
 """
 
 
+class RefCache(object):
+    """
+    Bounded store of Ref instances, with least-recently-used eviction.
+
+    Each Ref is held once, keyed by its uid.  Other strings that resolved to the same Ref (trefs in other
+    forms or languages) are kept as aliases of that uid, and are evicted along with it.
+    Refs are also grouped by index title, so that all of the Refs of one Index can be dropped
+    without scanning the rest of the cache.
+
+    The cache is bounded both by number of Refs and by a rough estimate of their size in bytes.
+    """
+    # Approximate footprint of a Ref instance and its bookkeeping, apart from the key strings
+    ENTRY_OVERHEAD = 2048
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clear()
+
+    def clear(self):
+        self._refs = OrderedDict()      # uid -> Ref, least recently used first
+        self._aliases = {}              # tref -> uid
+        self._alias_keys = {}           # uid -> set of trefs
+        self._index_uids = {}           # index title -> set of uids
+        self._uid_index = {}            # uid -> index title
+        self._sizes = {}                # uid -> estimated bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._refs)
+
+    def __contains__(self, key):
+        return key in self._refs or key in self._aliases
+
+    def get(self, key):
+        """
+        Returns the Ref cached under `key`, which may be a uid or an alias, and marks it as recently used.
+        Returns None on a miss.
+        """
+        uid = self._aliases.get(key, key)
+        ref = self._refs.pop(uid, None)
+        if ref is None:
+            self.misses += 1
+            return None
+        self._refs[uid] = ref
+        self.hits += 1
+        return ref
+
+    def add(self, ref, uid, title, alias=None):
+        """
+        Caches `ref` under `uid` (unless it is already cached), and records `alias` as another key for it.
+        Returns the cached instance for `uid`, which may be an earlier instance than `ref`.
+        """
+        cached = self._refs.get(uid)
+        if cached is None:
+            cached = ref
+            self._refs[uid] = ref
+            self._alias_keys[uid] = set()
+            self._uid_index[uid] = title
+            self._index_uids.setdefault(title, set()).add(uid)
+            self._sizes[uid] = self.ENTRY_OVERHEAD + len(uid)
+            self.bytes += self._sizes[uid]
+
+        if alias and alias != uid and alias not in self._aliases:
+            self._aliases[alias] = uid
+            self._alias_keys[uid].add(alias)
+            self._sizes[uid] += len(alias)
+            self.bytes += len(alias)
+
+        self._evict()
+        return cached
+
+    def remove(self, uid):
+        self._refs.pop(uid, None)
+        for alias in self._alias_keys.pop(uid, ()):
+            del self._aliases[alias]
+        title = self._uid_index.pop(uid, None)
+        uids = self._index_uids.get(title)
+        if uids is not None:
+            uids.discard(uid)
+            if not uids:
+                del self._index_uids[title]
+        self.bytes -= self._sizes.pop(uid, 0)
+
+    def remove_index(self, title):
+        """
+        Removes all Refs of the Index titled `title`.  Cost is proportional to the number of such Refs, not to the size of the cache.
+        """
+        for uid in list(self._index_uids.get(title, ())):
+            self.remove(uid)
+
+    def _evict(self):
+        while self._refs and (
+                (self.max_entries is not None and len(self._refs) > self.max_entries)
+                or (self.max_bytes is not None and self.bytes > self.max_bytes)):
+            uid = next(iter(self._refs))
+            self.remove(uid)
+            self.evictions += 1
+
+    def raw(self):
+        """
+        Returns a dict of every key, uid or alias, to its Ref
+        """
+        d = dict(self._refs)
+        d.update({alias: self._refs[uid] for alias, uid in self._aliases.iteritems()})
+        return d
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._refs),
+            "aliases": len(self._aliases),
+            "indexes": len(self._index_uids),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": float(self.hits) / lookups if lookups else 0.0
+        }
+
+
 class RefCacheType(type):
     """
     Metaclass for Ref class.
-    Caches all Ref isntances according to the string they were instanciated with and their normal form.
+    Caches Ref instances according to the string they were instanciated with and their normal form.
     Returns cached instance on instanciation if either instanciation string or normal form are matched.
+    The cache is bounded by REF_CACHE_MAX_ENTRIES and REF_CACHE_MAX_BYTES.  See :class:`RefCache`.
     """
 
     def __init__(cls, name, parents, dct):
         super(RefCacheType, cls).__init__(name, parents, dct)
-        cls.__tref_oref_map = {}
-        cls.__index_tref_map = {}
+        cls.__cache = RefCache(max_entries=REF_CACHE_MAX_ENTRIES, max_bytes=REF_CACHE_MAX_BYTES)
 
     def cache_size(cls):
-        return len(cls.__tref_oref_map)
+        return len(cls.__cache)
+
+    def cache_stats(cls):
+        return cls.__cache.stats()
 
     def cache_dump(cls):
-        return [(a, repr(b)) for (a, b) in cls.__tref_oref_map.iteritems()]
+        return {
+            "stats": cls.__cache.stats(),
+            "refs": [(a, repr(b)) for (a, b) in cls.__cache.raw().iteritems()]
+        }
 
     def _raw_cache(cls):
-        return cls.__tref_oref_map
+        return cls.__cache.raw()
 
     def clear_cache(cls):
-        cls.__tref_oref_map = {}
-        cls.__index_tref_map = {}
+        cls.__cache.clear()
 
     def remove_index_from_cache(cls, index_title):
         """
@@ -1719,14 +1887,7 @@ class RefCacheType(type):
         :param index_title:
         :return:
         """
-        try:
-            for tref in cls.__index_tref_map[index_title]:
-                try:
-                    del cls.__tref_oref_map[tref]
-                except KeyError:
-                    continue
-        except KeyError:
-            pass
+        cls.__cache.remove_index(index_title)
 
     def __call__(cls, *args, **kwargs):
         if len(args) == 1:
@@ -1737,44 +1898,17 @@ class RefCacheType(type):
         obj_arg = kwargs.get("_obj")
 
         if tref:
-            if tref in cls.__tref_oref_map:
-                ref = cls.__tref_oref_map[tref]
+            ref = cls.__cache.get(tref)
+            if ref is not None:
+                instrumentation.count("ref_cache.hit")
                 ref.tref = tref
                 return ref
-            else:
-                result = super(RefCacheType, cls).__call__(*args, **kwargs)
-                uid = result.uid()
-                title = result.index.title
-                if uid in cls.__tref_oref_map:
-                    #del result  #  Do we need this to keep memory clean?
-                    cls.__tref_oref_map[tref] = cls.__tref_oref_map[uid]
-                    try:
-                        cls.__index_tref_map[title] += [tref]
-                    except KeyError:
-                        cls.__index_tref_map[title] = [tref]
-                    return cls.__tref_oref_map[uid]
-                cls.__tref_oref_map[uid] = result
-                cls.__tref_oref_map[tref] = result
-                try:
-                    cls.__index_tref_map[title] += [tref]
-                except KeyError:
-                    cls.__index_tref_map[title] = [tref]
-                cls.__index_tref_map[title] += [uid]
-
-                return result
+            instrumentation.count("ref_cache.miss")
+            result = super(RefCacheType, cls).__call__(*args, **kwargs)
+            return cls.__cache.add(result, result.uid(), result.index.title, alias=tref)
         elif obj_arg:
             result = super(RefCacheType, cls).__call__(*args, **kwargs)
-            uid = result.uid()
-            title = result.index.title
-            if uid in cls.__tref_oref_map:
-                #del result  #  Do we need this to keep memory clean?
-                return cls.__tref_oref_map[uid]
-            cls.__tref_oref_map[uid] = result
-            try:
-                cls.__index_tref_map[title] += [uid]
-            except KeyError:
-                cls.__index_tref_map[title] = [uid]
-            return result
+            return cls.__cache.add(result, result.uid(), result.index.title)
         else:  # Default.  Shouldn't be used.
             return super(RefCacheType, cls).__call__(*args, **kwargs)
 
@@ -3334,6 +3468,41 @@ class Ref(object):
 
         return projection
 
+    def part_pipeline(self, query):
+        """
+        Returns an aggregation pipeline that selects Versions matching `query`, with their content sliced down to this ref.
+
+        :meth:`part_projection` can only slice the top level of a Version's content.  This pipeline slices every level of the ref,
+        through the level at which a range begins.  The trimming of the ends of a range at deeper levels is left to :meth:`TextChunk.trim_text`.
+        Requires MongoDB 3.2.
+
+        :param query: Query for Versions, e.g. from :meth:`condition_query`
+        :return list: the pipeline, or None if this ref has no sections, or the database does not support slicing in aggregation
+        """
+        if not self.sections or server_version() < [3, 2]:
+            return None
+
+        projection = {k: 1 for k in Version.required_attrs + Version.optional_attrs}
+        del projection[Version.content_attr]
+        projection["_id"] = 0
+
+        content = "$" + self.storage_address()
+        range_index = self.range_index()
+        for i in range(0, min(range_index + 1, len(self.sections))):
+            if i < range_index:
+                part = {"$arrayElemAt": [content, self.sections[i] - 1]}
+            else:
+                part = {"$slice": [content, self.sections[i] - 1, self.toSections[i] - self.sections[i] + 1]}
+            content = {"$cond": [{"$isArray": content}, part, None]}
+        empty = "" if not self.is_range() and len(self.sections) == self.index_node.depth else []
+        projection[self.storage_address()] = {"$ifNull": [content, empty]}
+
+        return [
+            {"$match": query},
+            {"$sort": SON([("priority", -1), ("_id", 1)])},
+            {"$project": projection}
+        ]
+
     def condition_query(self, lang=None):
         """
         Return condition to select only versions with content at the location of this Ref.
@@ -3549,18 +3718,28 @@ class Ref(object):
         :return string: normal url form
         """
         if not self._url:
-            self._url = self.normal().replace(" ", "_").replace(":", ".")
-
-            # Change "Mishna_Brachot_2:3" to "Mishna_Brachot.2.3", but don't run on "Mishna_Brachot"
-            if len(self.sections) > 0:
-                last = self._url.rfind("_")
-                if last == -1:
-                    return self._url
-                lref = list(self._url)
-                lref[last] = "."
-                self._url = "".join(lref)
+            self._url = Ref.url_form(self.normal(), len(self.sections) > 0)
         return self._url
 
+    @staticmethod
+    def url_form(normal, has_sections=True):
+        """
+        :param normal: The normal English form of a Ref
+        :param has_sections: False if the Ref is of a whole node, without sections
+        :return string: normal url form
+        """
+        url = normal.replace(" ", "_").replace(":", ".")
+
+        # Change "Mishna_Brachot_2:3" to "Mishna_Brachot.2.3", but don't run on "Mishna_Brachot"
+        if has_sections:
+            last = url.rfind("_")
+            if last == -1:
+                return url
+            lref = list(url)
+            lref[last] = "."
+            url = "".join(lref)
+        return url
+
     def noteset(self, public=True, uid=None):
         """
         :return: :class:`NoteSet` for this Ref
@@ -3629,9 +3808,15 @@ class Library(object):
 
     Exposes methods to add, remove, or register change of an index record.  These are primarily called by the dependencies mechanism on Index Create/Update/Destroy.
 
+    When ``LIBRARY_SNAPSHOT_PATH`` is set, the core maps are loaded from a snapshot file, which is rebuilt whenever the library version stamp changes.
+    See :func:`get_library_version_stamp`.
     """
+    SNAPSHOT_FORMAT = 1  # Bump when the structure of the snapshot, or of the objects in it, changes
 
-    def __init__(self):
+    def __init__(self, build_maps=True):
+        """
+        :param build_maps: Build the title maps from the database?  False only for a library that is built separately, as in :meth:`check_consistency`.
+        """
         self.langs = ["en", "he"]
 
         # Maps, keyed by language, from index key to array of titles
@@ -3651,6 +3836,12 @@ class Library(object):
         self._title_regex_strings = {}
         self._title_regexes = {}
 
+        # Title matching automata, keyed like `_title_regexes`.  See `title_matcher()`
+        self._title_matchers = {}
+
+        # Compiled address regexes for individual titles, keyed by (title, lang).  See `_get_compiled_regex()`
+        self._title_address_regexes = {}
+
         # Maps, keyed by language, from term names to text refs
         self._term_ref_maps = {lang: {} for lang in self.langs}
 
@@ -3659,14 +3850,91 @@ class Library(object):
 
         # Table of Contents
         self._toc = None
-        self._toc_json = None
+        self._toc_serialized = None
         self._search_filter_toc = None
-        self._search_filter_toc_json = None
+        self._search_filter_toc_serialized = None
         self._category_id_dict = None
         self._toc_size = 16
 
-        if not hasattr(sys, '_doc_build'):  # Can't build cache without DB
+        if build_maps and not hasattr(sys, '_doc_build'):  # Can't build cache without DB
+            self._load_core_maps()
+
+    def _load_core_maps(self):
+        """
+        Loads the core maps from the snapshot at ``LIBRARY_SNAPSHOT_PATH``, if it was taken at the current library version stamp.
+        Otherwise, builds them from the database, and writes a new snapshot.
+        """
+        if not LIBRARY_SNAPSHOT_PATH:
             self._build_core_maps()
+            return
+        stamp = get_library_version_stamp()
+        if self.load_snapshot(LIBRARY_SNAPSHOT_PATH, stamp):
+            return
+        self._build_core_maps()
+        for lang in self.langs:
+            self.get_term_dict(lang)
+        self.save_snapshot(LIBRARY_SNAPSHOT_PATH, stamp)
+
+    def load_snapshot(self, path, stamp):
+        """
+        Loads the core maps from a snapshot written by :meth:`save_snapshot`.
+        :param path: Snapshot file
+        :param stamp: Library version stamp that the snapshot must have been taken at
+        :return bool: True if the snapshot was loaded, False if it is missing, stale, unreadable or unsafe to unpickle.
+        """
+        try:
+            with open(path, "rb") as f:
+                st = os.fstat(f.fileno())
+                if st.st_uid != os.getuid() or st.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+                    # Unpickling runs code, so only a file that no other user could have written is loaded
+                    logger.warning(u"Not loading library snapshot {}: it is owned by another user or writable by others".format(path))
+                    return False
+                snapshot = pickle.load(f)
+        except IOError:
+            return False
+        except Exception as e:
+            logger.warning(u"Failed to read library snapshot {}: {}".format(path, e))
+            return False
+
+        if snapshot.get("format") != self.SNAPSHOT_FORMAT or snapshot.get("stamp") != stamp:
+            return False
+
+        self._index_map = snapshot["index_map"]
+        self._index_title_maps = snapshot["index_title_maps"]
+        self._title_node_maps = snapshot["title_node_maps"]
+        self._term_ref_maps = snapshot["term_ref_maps"]
+        return True
+
+    def save_snapshot(self, path, stamp):
+        """
+        Writes the core maps - Index records with their schema trees, title maps and term maps - to `path`.
+        The file is written beside `path` and renamed into place, so that concurrently starting processes never read a partial snapshot.
+        :param path: Snapshot file
+        :param stamp: Library version stamp that the maps were built at
+        :return bool: True if the snapshot was written
+        """
+        snapshot = {
+            "format": self.SNAPSHOT_FORMAT,
+            "stamp": stamp,
+            "index_map": self._index_map,
+            "index_title_maps": self._index_title_maps,
+            "title_node_maps": self._title_node_maps,
+            "term_ref_maps": self._term_ref_maps,
+        }
+        tmp_path = u"{}.{}.tmp".format(path, os.getpid())
+        try:
+            with open(tmp_path, "wb") as f:
+                os.fchmod(f.fileno(), 0o644)
+                pickle.dump(snapshot, f, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_path, path)
+        except Exception as e:
+            logger.warning(u"Failed to write library snapshot {}: {}".format(path, e))
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+        return True
 
     def _build_core_maps(self):
         # Build index and title node dicts in an efficient way
@@ -3691,18 +3959,24 @@ class Library(object):
         self._full_title_list_jsons = {}
         self._title_regex_strings = {}
         self._title_regexes = {}
+        self._title_matchers = {}
+        self._title_address_regexes = {}
         # TOC is handled separately since it can be edited in place
 
-    def _reset_toc_derivate_objects(self):
-        scache.delete_cache_elem('toc_cache')
-        scache.delete_cache_elem('toc_json_cache')
-        scache.set_cache_elem('toc_cache', self.get_toc(), 600000)
-        scache.set_cache_elem('toc_json_cache', self.get_toc_json(), 600000)
+    def _reset_toc_derivate_objects(self, changed=None, search_changed=None):
+        """
+        Stores the TOCs and their serializations in the shared cache.
+        :param changed: set of the names of the top level categories of the TOC that changed since it was last serialized.
+        If None, the whole TOC is serialized again.  `search_changed` is the same, for the search filter TOC.
+        """
+        from sefaria.summaries import SerializedToc
+        self._toc_serialized = SerializedToc(self.get_toc(), self._toc_serialized, changed)
+        self._search_filter_toc_serialized = SerializedToc(self.get_search_filter_toc(), self._search_filter_toc_serialized, search_changed)
 
-        scache.delete_cache_elem('search_filter_toc_cache')
-        scache.delete_cache_elem('search_filter_toc_json_cache')
+        scache.set_cache_elem('toc_cache', self.get_toc(), 600000)
+        scache.set_cache_elem('toc_serialized_cache', self._toc_serialized, 600000)
         scache.set_cache_elem('search_filter_toc_cache', self.get_search_filter_toc(), 600000)
-        scache.set_cache_elem('search_filter_toc_json_cache', self.get_search_filter_toc_json(), 600000)
+        scache.set_cache_elem('search_filter_toc_serialized_cache', self._search_filter_toc_serialized, 600000)
 
         scache.delete_template_cache("texts_list")
         scache.delete_template_cache("texts_dashboard")
@@ -3717,10 +3991,11 @@ class Library(object):
 
     def rebuild_toc(self):
         self._toc = None
-        self._toc_json = None
+        self._toc_serialized = None
         self._search_filter_toc = None
-        self._search_filter_toc_json = None
+        self._search_filter_toc_serialized = None
         self._category_id_dict = None
+        scache.delete_cache_elem(['toc_cache', 'toc_serialized_cache', 'search_filter_toc_cache', 'search_filter_toc_serialized_cache'])
         self._reset_toc_derivate_objects()
 
     def get_toc(self):
@@ -3736,16 +4011,23 @@ class Library(object):
                 scache.set_cache_elem('toc_cache', self._toc)
         return self._toc
 
+    def get_toc_serialized(self):
+        """
+        Returns the :class:`sefaria.summaries.SerializedToc` of the TOC, with its JSON, compressed variants and ETag.
+        """
+        if not self._toc_serialized:
+            self._toc_serialized = scache.get_cache_elem('toc_serialized_cache')
+            if not self._toc_serialized:
+                from sefaria.summaries import SerializedToc
+                self._toc_serialized = SerializedToc(self.get_toc())
+                scache.set_cache_elem('toc_serialized_cache', self._toc_serialized)
+        return self._toc_serialized
+
     def get_toc_json(self):
         """
         Returns JSON representation of TOC.
         """
-        if not self._toc_json:
-            self._toc_json = scache.get_cache_elem('toc_json_cache')
-            if not self._toc_json:
-                self._toc_json = json.dumps(self.get_toc())
-                scache.set_cache_elem('toc_json_cache', self._toc_json)
-        return self._toc_json
+        return self.get_toc_serialized().json
 
     def get_search_filter_toc(self):
         """
@@ -3760,48 +4042,54 @@ class Library(object):
                 scache.set_cache_elem('search_filter_toc_cache', self._search_filter_toc)
         return self._search_filter_toc
 
+    def get_search_filter_toc_serialized(self):
+        """
+        Returns the :class:`sefaria.summaries.SerializedToc` of the search filter TOC.
+        """
+        if not self._search_filter_toc_serialized:
+            self._search_filter_toc_serialized = scache.get_cache_elem('search_filter_toc_serialized_cache')
+            if not self._search_filter_toc_serialized:
+                from sefaria.summaries import SerializedToc
+                self._search_filter_toc_serialized = SerializedToc(self.get_search_filter_toc())
+                scache.set_cache_elem('search_filter_toc_serialized_cache', self._search_filter_toc_serialized)
+        return self._search_filter_toc_serialized
+
     def get_search_filter_toc_json(self):
         """
         Returns JSON representation of TOC.
         """
-        if not self._search_filter_toc_json:
-            self._search_filter_toc_json = scache.get_cache_elem('search_filter_toc_json_cache')
-            if not self._search_filter_toc_json:
-                self._search_filter_toc_json = json.dumps(self.get_search_filter_toc())
-                scache.set_cache_elem('search_filter_toc_json_cache', self._search_filter_toc_json)
-        return self._search_filter_toc_json
+        return self.get_search_filter_toc_serialized().json
 
     def recount_index_in_toc(self, indx):
         from sefaria.summaries import update_title_in_toc
-        self._toc = update_title_in_toc(self.get_toc(), indx, recount=True)
-        self._search_filter_toc = update_title_in_toc(self.get_search_filter_toc(), indx, recount=False, for_search=True)
-        self._toc_json = None
-        self._search_filter_toc_json = None
+        changed, search_changed = set(), set()
+        self._toc = update_title_in_toc(self.get_toc(), indx, recount=True, changed=changed)
+        self._search_filter_toc = update_title_in_toc(self.get_search_filter_toc(), indx, recount=False, for_search=True, changed=search_changed)
         self._category_id_dict = None
-        self._reset_toc_derivate_objects()
+        self._reset_toc_derivate_objects(changed, search_changed)
 
     def delete_index_from_toc(self, bookname):
-        from sefaria.summaries import recur_delete_element_from_toc
-        self._toc = recur_delete_element_from_toc(bookname, self.get_toc())
-        self._search_filter_toc = recur_delete_element_from_toc(bookname, self.get_search_filter_toc())
-        self._toc_json = None
-        self._search_filter_toc_json = None
+        from sefaria.summaries import delete_title_from_toc
+        changed, search_changed = set(), set()
+        self._toc = delete_title_from_toc(self.get_toc(), bookname, changed=changed)
+        self._search_filter_toc = delete_title_from_toc(self.get_search_filter_toc(), bookname, changed=search_changed)
         self._category_id_dict = None
-        self._reset_toc_derivate_objects()
+        self._reset_toc_derivate_objects(changed, search_changed)
 
     def update_index_in_toc(self, indx, old_ref=None):
         """
+        Updates the entry of `indx` in the TOCs, touching only its category path,
+        and serializes again only the top level categories that changed.
         :param indx:
-        :param old_ref:
+        :param old_ref: The title of `indx` before it changed, if it did
         :return:
         """
         from sefaria.summaries import update_title_in_toc
-        self._toc = update_title_in_toc(self.get_toc(), indx, old_ref=old_ref, recount=False)
-        self._search_filter_toc = update_title_in_toc(self.get_search_filter_toc(), indx, old_ref=old_ref, recount=False, for_search=True)
-        self._toc_json = None
-        self._search_filter_toc_json = None
+        changed, search_changed = set(), set()
+        self._toc = update_title_in_toc(self.get_toc(), indx, old_ref=old_ref, recount=False, changed=changed)
+        self._search_filter_toc = update_title_in_toc(self.get_search_filter_toc(), indx, old_ref=old_ref, recount=False, for_search=True, changed=search_changed)
         self._category_id_dict = None
-        self._reset_toc_derivate_objects()
+        self._reset_toc_derivate_objects(changed, search_changed)
 
     def get_index(self, bookname):
         """
@@ -3836,34 +4124,38 @@ class Library(object):
         Update library title dictionaries and caches with information from provided index.
         Index can be passed with primary title in `index_title` or as an object in `index_object`
         :param index_object: Index record
-        :param rebuild: Perform a rebuild of derivative objects afterwards?  False only in cases of batch update.
-        :return:
+        :param rebuild: Update derivative objects afterwards?  False only in cases of batch update.
+        :return: dict from language to the titles added
         """
         assert index_object, "Library.add_index_record_to_cache called without index"
         self._index_map[index_object.title] = index_object
+        added = {}
         try:
             for lang in self.langs:
                 title_dict = index_object.nodes.title_dict(lang)
                 self._index_title_maps[lang][index_object.title] = title_dict.keys()
                 self._title_node_maps[lang].update(title_dict)
+                added[lang] = title_dict.keys()
         except IndexSchemaError as e:
             logger.error(u"Error in generating title node dictionary: {}".format(e))
 
         if rebuild:
-            self._reset_index_derivative_objects()
+            self._update_index_derivative_objects(added=added, cited=getattr(index_object, "is_cited", False))
+        return added
 
     def remove_index_record_from_cache(self, index_object=None, old_title=None, rebuild = True):
         """
         Update provided index from library title dictionaries and caches
         :param index_object:
         :param old_title: In the case of a title change - the old title of the Index record
-        :param rebuild: Perform a rebuild of derivative objects afterwards?
-        :return:
+        :param rebuild: Update derivative objects afterwards?
+        :return: dict from language to the titles removed
         """
 
         index_title = old_title or index_object.title
         Ref.remove_index_from_cache(index_title)
 
+        removed = {}
         for lang in self.langs:
             simple_titles = self._index_title_maps[lang].get(index_title)
             if simple_titles:
@@ -3877,12 +4169,13 @@ class Library(object):
                     except KeyError:
                         pass
                 del self._index_title_maps[lang][index_title]
+                removed[lang] = simple_titles
             else:
                 logger.warning("Failed to remove '{}' from {} index-title and title-node cache: nothing to remove".format(index_title, lang))
-                return
 
         if rebuild:
-            self._reset_index_derivative_objects()
+            self._update_index_derivative_objects(removed=removed)
+        return removed
 
     def refresh_index_record_in_cache(self, index_object, old_title = None):
         """
@@ -3891,11 +4184,102 @@ class Library(object):
         :return:
         """
 
-        self.remove_index_record_from_cache(index_object, old_title=old_title, rebuild=False)
+        removed = self.remove_index_record_from_cache(index_object, old_title=old_title, rebuild=False)
         new_index = None
         new_index = Index().load({"title":index_object.title})
         assert new_index, u"No Index record found for {}: {}".format(index_object.__class__.__name__, index_object.title)
-        self.add_index_record_to_cache(new_index, rebuild=True)
+        added = self.add_index_record_to_cache(new_index, rebuild=False)
+        self._update_index_derivative_objects(removed=removed, added=added, cited=getattr(new_index, "is_cited", False))
+        # Callers that write the Index without dependency callbacks (schema migrations, resize_text) all come here
+        bump_library_version_stamp()
+
+    def _update_index_derivative_objects(self, removed=None, added=None, cited=False):
+        """
+        Brings the title lists and title regexes up to date with a change to one Index,
+        rather than dropping them all as :meth:`_reset_index_derivative_objects` does.
+        Title regexes and matchers are only dropped (to be rebuilt on demand) if some title list actually changed.
+        :param removed: dict from language to titles removed from the title maps
+        :param added: dict from language to titles added to the title maps
+        :param cited: Is the Index that `added` belongs to cited?  See :meth:`citing_title_list`
+        """
+        removed = removed or {}
+        added = added or {}
+        changed = False
+
+        for lang in self.langs:
+            old_titles = set(removed.get(lang, []))
+            new_titles = added.get(lang, [])
+            affected = old_titles | set(new_titles)
+            if not affected:
+                continue
+
+            for key, include_new in [(lang, True), (lang + "_terms", True), ("citing-{}".format(lang), cited)]:
+                titles = self._full_title_lists.get(key)
+                if not titles:
+                    continue
+                keep = self.get_term_dict(lang) if key.endswith("_terms") else {}
+                updated = [t for t in titles if t not in old_titles or t in keep]
+                if include_new:
+                    present = set(updated)
+                    updated += [t for t in new_titles if t not in present]
+                if {t for t in titles if t in affected} != {t for t in updated if t in affected}:
+                    changed = True
+                self._full_title_lists[key] = updated
+
+            for title in affected:
+                self._title_address_regexes.pop((title, lang), None)
+
+        if changed:
+            self._title_regex_strings = {}
+            self._title_regexes = {}
+            self._title_matchers = {}
+        self._full_title_list_jsons = {}
+
+    def check_consistency(self):
+        """
+        Compares the incrementally maintained title maps and title lists of this library with those of a full build from the database.
+        :return: list of descriptions of each discrepancy found.  Empty if consistent.
+        """
+        fresh = Library(build_maps=False)
+        fresh._term_ref_maps = self._term_ref_maps
+        fresh._build_core_maps()
+        errors = []
+
+        def node_sig(node):
+            return node.index.title, node.full_title("en")
+
+        for lang in self.langs:
+            mine, theirs = self._title_node_maps[lang], fresh._title_node_maps[lang]
+            for title in set(mine) - set(theirs):
+                errors.append(u"Extra {} title in title-node map: {}".format(lang, title))
+            for title in set(theirs) - set(mine):
+                errors.append(u"Missing {} title in title-node map: {}".format(lang, title))
+            for title in set(mine) & set(theirs):
+                if node_sig(mine[title]) != node_sig(theirs[title]):
+                    errors.append(u"{} title '{}' maps to {}, expected {}".format(lang, title, node_sig(mine[title]), node_sig(theirs[title])))
+
+            mine, theirs = self._index_title_maps[lang], fresh._index_title_maps[lang]
+            for index_title in set(mine) | set(theirs):
+                if set(mine.get(index_title, [])) != set(theirs.get(index_title, [])):
+                    errors.append(u"{} titles of index '{}' differ from full build".format(lang, index_title))
+
+        primary_titles = {title for title, indx in self._index_map.items() if title == indx.title}
+        for title in primary_titles ^ set(fresh._index_map):
+            errors.append(u"Index map differs from full build at '{}'".format(title))
+        for title, indx in self._index_map.items():
+            if indx.title not in fresh._index_map:
+                errors.append(u"Index map key '{}' points to unknown index '{}'".format(title, indx.title))
+
+        for key, titles in self._full_title_lists.items():
+            if key.startswith("citing-"):
+                expected = fresh.citing_title_list(key[len("citing-"):])
+            else:
+                lang, _, terms = key.partition("_")
+                expected = fresh.full_title_list(lang, with_terms=bool(terms))
+            if set(titles) != set(expected):
+                errors.append(u"Title list '{}' differs from full build".format(key))
+
+        return errors
 
     #todo: the for_js path here does not appear to be in use.
     #todo: Rename, as method not gauraunteed to return all titles
@@ -3958,6 +4342,48 @@ class Library(object):
             self._title_regexes[key] = reg
         return reg
 
+    def title_matcher(self, lang="en", with_terms=False, citing_only=False):
+        """
+        :return: An :class:`AhoCorasick` automaton over the same titles as :meth:`all_titles_regex`.
+        Built once per rebuild of the library's title maps.
+        """
+        if citing_only:
+            key = "citing_titles_" + lang
+        else:
+            key = "all_titles_" + lang
+            key += "_terms" if with_terms else ""
+        matcher = self._title_matchers.get(key)
+        if matcher is None:
+            if citing_only:
+                titles = self.citing_title_list(lang)
+            else:
+                titles = self.full_title_list(lang, with_terms=with_terms)
+            matcher = AhoCorasick(titles)
+            self._title_matchers[key] = matcher
+        return matcher
+
+    def _find_titles(self, st, lang="en", with_terms=False, citing_only=False):
+        """
+        Finds titles in `st` in one pass.  Matches what `all_titles_regex().finditer()` would: at each position,
+        the longest title followed by the end of the string or by one of ``:., <``, scanning on after the delimiters.
+        :return: generator of (title, start) tuples
+        """
+        delimiters = u":., <"
+        best = {}
+        for start, end in self.title_matcher(lang, with_terms, citing_only).iter_matches(st):
+            if end == len(st) or st[end] in delimiters:
+                if end > best.get(start, 0):
+                    best[start] = end
+        pos = 0
+        for start in sorted(best):
+            if start < pos:
+                continue
+            end = best[start]
+            yield st[start:end], start
+            pos = end
+            while pos < len(st) and st[pos] in delimiters:
+                pos += 1
+
     def full_title_list(self, lang="en", with_terms=False):
         """
         :return: list of strings of all possible titles
@@ -4071,6 +4497,22 @@ class Library(object):
         title = title.replace("_", " ")
         return self.get_title_node_dict(lang).get(title)
 
+    def get_schema_node_for_ref_string(self, tref, lang="en"):
+        """
+        Returns the schema node whose title begins the normal ref string `tref`, trying the longest prefix of whole words first.
+        Much cheaper than instanciating a Ref, for when only the node or Index of a ref is needed,
+        but does not validate or parse the rest of the ref.
+        :param tref: A normal ref string, e.g. "Shulchan Arukh, Orach Chayim 1:1"
+        :return: :class:`sefaria.model.schema.SchemaNode`, or None
+        """
+        title_dict = self.get_title_node_dict(lang)
+        words = tref.split(u" ")
+        for i in range(len(words), 0, -1):
+            node = title_dict.get(u" ".join(words[:i]))
+            if node:
+                return node
+        return None
+
     def get_text_titles_json(self, lang="en"):
         """
         :return: JSON of full texts list, (cached)
@@ -4144,11 +4586,7 @@ class Library(object):
         """
         if not lang:
             lang = "he" if is_hebrew(s) else "en"
-        if lang=="en":
-            #todo: combine into one regex
-            return [m.group('title') for m in self.all_titles_regex(lang, citing_only=citing_only).finditer(s)]
-        elif lang=="he":
-            return [m.group('title') for m in self.all_titles_regex(lang, citing_only=citing_only).finditer(s)]
+        return [title for title, start in self._find_titles(s, lang, citing_only=citing_only)]
 
     def get_refs_in_string(self, st, lang=None, citing_only=False):
         """
@@ -4175,12 +4613,9 @@ class Library(object):
                 else:
                     refs += res
         else:  # lang == "en"
-            for match in self.all_titles_regex(lang, citing_only=citing_only).finditer(st):
-                title = match.group('title')
-                if not title:
-                    continue
+            for title, start in self._find_titles(st, lang, citing_only=citing_only):
                 try:
-                    res = self._build_ref_from_string(title, st[match.start():])  # Slice string from title start
+                    res = self._build_ref_from_string(title, st[start:])  # Slice string from title start
                 except AssertionError as e:
                     logger.info(u"Skipping Schema Node: {}".format(title))
                 except InputError as e:
@@ -4209,6 +4644,17 @@ class Library(object):
                     [)}]										# zero-width: literal ')' or brace
                 )"""
 
+    def _get_compiled_regex(self, title, lang):
+        """
+        :return: compiled result of :meth:`get_regex_string`, cached until the next rebuild of the title maps
+        """
+        key = (title, lang)
+        reg = self._title_address_regexes.get(key)
+        if reg is None:
+            reg = regex.compile(self.get_regex_string(title, lang), regex.VERBOSE)
+            self._title_address_regexes[key] = reg
+        return reg
+
     #todo: handle ranges in inline refs
     def _build_ref_from_string(self, title=None, st=None, lang="en"):
         """
@@ -4222,12 +4668,11 @@ class Library(object):
         assert isinstance(node, JaggedArrayNode)  # Assumes that node is a JaggedArrayNode
 
         try:
-            re_string = self.get_regex_string(title, lang)
+            reg = self._get_compiled_regex(title, lang)
         except AttributeError as e:
             logger.warning(u"Library._build_ref_from_string() failed to create regex for: {}.  {}".format(title, e))
             return []
 
-        reg = regex.compile(re_string, regex.VERBOSE)
         ref_match = reg.match(st)
         if ref_match:
             sections = []
@@ -4267,12 +4712,11 @@ class Library(object):
 
         refs = []
         try:
-            re_string = self.get_regex_string(title, lang)
+            reg = self._get_compiled_regex(title, lang)
         except AttributeError as e:
             logger.warning(u"Library._build_all_refs_from_string() failed to create regex for: {}.  {}".format(title, e))
             return refs
 
-        reg = regex.compile(re_string, regex.VERBOSE)
         for ref_match in reg.finditer(st):
             sections = []
             gs = ref_match.groupdict()
@@ -4319,6 +4763,25 @@ class Library(object):
 
         return d
 
+def get_library_version_stamp():
+    """
+    :return: Token that changes whenever the Index and Term records behind the Library's core maps change.
+    """
+    doc = db.library_state.find_one({"_id": "core_maps"})
+    if not doc:
+        return bump_library_version_stamp()
+    return doc["stamp"]
+
+
+def bump_library_version_stamp(*args, **kwargs):
+    """
+    Marks any existing Library snapshot as stale.  Subscribed to changes of Index and Term records.
+    """
+    stamp = uuid.uuid4().hex
+    db.library_state.save({"_id": "core_maps", "stamp": stamp})
+    return stamp
+
+
 library = Library()
 
 
@@ -4370,7 +4833,7 @@ def process_index_title_change_in_core_cache(indx, **kwargs):
     if USE_VARNISH:
         from sefaria.system.sf_varnish import invalidate_title
         invalidate_title(old_title)
-    scache.delete_cache_elem(scache.generate_text_toc_cache_key(old_title))
+    scache.invalidate_text_toc(old_title)
     library.refresh_index_record_in_cache(indx, old_title=old_title)
 
 
@@ -4378,7 +4841,7 @@ def process_index_change_in_core_cache(indx, **kwargs):
     if kwargs.get("is_new"):
         library.add_index_record_to_cache(indx)
     else:
-        scache.delete_cache_elem(scache.generate_text_toc_cache_key(indx.title))
+        scache.invalidate_text_toc(indx.title)
         library.refresh_index_record_in_cache(indx)
         if USE_VARNISH:
             from sefaria.system.sf_varnish import invalidate_index
@@ -4394,7 +4857,7 @@ def process_index_delete_in_toc(indx, **kwargs):
 
 
 def process_index_delete_in_core_cache(indx, **kwargs):
-    scache.delete_cache_elem(scache.generate_text_toc_cache_key(indx.title))
+    scache.invalidate_text_toc(indx.title)
     library.remove_index_record_from_cache(indx)
     if USE_VARNISH:
         from sefaria.system.sf_varnish import invalidate_index, invalidate_counts
@@ -4402,9 +4865,9 @@ def process_index_delete_in_core_cache(indx, **kwargs):
         invalidate_counts(indx.title)
 
 def process_version_save_in_cache(ver, **kwargs):
-    scache.delete_cache_elem(scache.generate_text_toc_cache_key(ver.title))
+    scache.invalidate_text_toc(ver.title)
 
 def process_version_delete_in_cache(ver, **kwargs):
-    scache.delete_cache_elem(scache.generate_text_toc_cache_key(ver.title))
+    scache.invalidate_text_toc(ver.title)
 
 
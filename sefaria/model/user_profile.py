@@ -6,7 +6,7 @@ import sys
 
 if not hasattr(sys, '_doc_build'):
 	from django.contrib.auth.models import User
-	from django.core.mail import EmailMultiAlternatives
+	from django.core.mail import EmailMultiAlternatives, get_connection
 	from django.template.loader import render_to_string
 	from django.core.validators import URLValidator, EmailValidator
 	from django.core.exceptions import ValidationError
@@ -14,6 +14,11 @@ if not hasattr(sys, '_doc_build'):
 from sefaria.model.following import FollowersSet, FolloweesSet
 from sefaria.model.text import Ref
 from sefaria.system.database import db
+from sefaria.system import cache as scache
+from sefaria.settings import PUBLIC_USER_DATA_CACHE_TIMEOUT
+
+import logging
+logger = logging.getLogger(__name__)
 
 
 class UserProfile(object):
@@ -81,10 +86,8 @@ class UserProfile(object):
 		self.followees = FolloweesSet(self.id)
 
 		# Gravatar
-		default_image           = "https://www.sefaria.org/static/img/profile-default.png"
-		gravatar_base           = "http://www.gravatar.com/avatar/" + hashlib.md5(self.email.lower()).hexdigest() + "?"
-		self.gravatar_url       = gravatar_base + urllib.urlencode({'d':default_image, 's':str(250)})
-		self.gravatar_url_small = gravatar_base + urllib.urlencode({'d':default_image, 's':str(80)})
+		self.gravatar_url       = gravatar_url(self.email, 250)
+		self.gravatar_url_small = gravatar_url(self.email, 80)
 
 	@property
 	def full_name(self):
@@ -117,13 +120,6 @@ class UserProfile(object):
 			d["_id"] = self._id
 		db.profiles.save(d)
 
-		# invalidate user links cache if needed
-		if self._name_updated or self._slug_updated:
-			global user_links
-			if self.id in user_links:
-				del user_links[self.id]
-			self._slug_updated = False
-
 		# store name changes on Django User object
 		if self._name_updated:
 			user = User.objects.get(id=self.id)
@@ -132,6 +128,10 @@ class UserProfile(object):
 			user.save()
 			self._name_updated = False
 
+		# invalidate cached public data, after the Django User is updated
+		invalidate_public_user_data(self.id)
+		self._slug_updated = False
+
 		return self
 
 	def errors(self):
@@ -270,7 +270,7 @@ class UserProfile(object):
 		return json.dumps(self.to_DICT)
 
 
-def email_unread_notifications(timeframe):
+def email_unread_notifications(timeframe, processes=1, uids=None):
 	"""
 	Looks for all unread notifications and sends each user one email with a summary.
 	Marks any sent notifications as "read".
@@ -279,37 +279,135 @@ def email_unread_notifications(timeframe):
 	* 'daily'  - only send to users who have the daily email setting
 	* 'weekly' - only send to users who have the weekly email setting
 	* 'all'    - send all notifications
+
+	Emails are rendered and sent by a pool of `processes` workers, each over one SMTP connection.
+	Each user's notifications are marked read before their email is sent, and marked unread again
+	if sending fails, so a run that is interrupted can be run again without sending anything twice.
+	:param uids: If given, only email these users
+	:return dict: The number of users whose digest was "sent", "skipped" or "failed"
 	"""
-	from sefaria.model.notification import NotificationSet
+	from multiprocessing import Pool
 
-	users = db.notifications.find({"read": False, "is_global": False}).distinct("uid")
+	digests = unread_notification_digests(timeframe, uids=uids)
+	stats = {"sent": 0, "skipped": 0, "failed": 0}
+	pool = Pool(processes, initializer=_init_digest_worker) if processes > 1 else None
+	if not pool:
+		_init_digest_worker()
+	try:
+		results = pool.imap_unordered(send_notification_digest, digests) if pool else (send_notification_digest(d) for d in digests)
+		for uid, status in results:
+			stats[status] += 1
+	finally:
+		if pool:
+			pool.close()
+			pool.join()
+		else:
+			_digest_connection.close()
 
-	for uid in users:
-		profile = UserProfile(id=uid)
-		if profile.settings["email_notifications"] != timeframe and timeframe != 'all':
-			continue
-		notifications = NotificationSet().unread_personal_for_user(uid)
-		if notifications.count() == 0:
-			continue
-		try:
-			user = User.objects.get(id=uid)
-		except User.DoesNotExist:
+	logger.info(u"Notification emails ({}): {}".format(timeframe, stats))
+	return stats
+
+
+def unread_notification_digests(timeframe, uids=None, chunk_size=500):
+	"""
+	Yields a dictionary for each user with unread personal notifications to be emailed for `timeframe`,
+	with the user's "uid", "first_name", "email", and the "count" of their unread notifications.
+	Users whose profile setting excludes `timeframe` are filtered out before notifications are grouped by user
+	in one aggregation, and the Django Users of each `chunk_size` users are loaded in one query.
+	"""
+	match = {"read": False, "is_global": False}
+	if uids is not None:
+		match["uid"] = {"$in": uids}
+	if timeframe == "daily":
+		# The default, for users without the setting
+		others = db.profiles.distinct("id", {"settings.email_notifications": {"$exists": True, "$ne": "daily"}})
+		match.setdefault("uid", {})["$nin"] = others
+	elif timeframe != "all":
+		chosen = db.profiles.distinct("id", {"settings.email_notifications": timeframe})
+		match["uid"] = {"$in": list(set(chosen) & set(uids)) if uids is not None else chosen}
+
+	groups = db.notifications.aggregate([
+		{"$match": match},
+		{"$group": {"_id": "$uid", "count": {"$sum": 1}}},
+	], cursor={})
+
+	chunk = []
+	for group in groups:
+		chunk.append(group)
+		if len(chunk) == chunk_size:
+			for digest in _user_digests(chunk):
+				yield digest
+			chunk = []
+	for digest in _user_digests(chunk):
+		yield digest
+
+
+def _user_digests(groups):
+	users = {user.id: user for user in User.objects.filter(id__in=[group["_id"] for group in groups])} if groups else {}
+	for group in groups:
+		user = users.get(group["_id"])
+		if not user:
 			continue
+		yield {"uid": group["_id"], "first_name": user.first_name, "email": user.email, "count": group["count"]}
+
+
+# SMTP connection of the current process, reused for every email it sends
+_digest_connection = None
 
-		message_html  = render_to_string("email/notifications_email.html", {"notifications": notifications, "recipient": user.first_name})
+def _init_digest_worker():
+	global _digest_connection
+	_digest_connection = get_connection()
+	_digest_connection.open()  # Left open, so that sending does not close it after each email
+
+
+def _reopen_digest_connection():
+	_digest_connection.close()
+	try:
+		_digest_connection.open()
+	except Exception as e:
+		logger.warning(u"Failed to reopen SMTP connection: {}".format(e))
+
+
+def send_notification_digest(digest):
+	"""
+	Renders and sends one email, for a dictionary yielded by `unread_notification_digests`.
+	The notifications are marked read first.  If they have all been marked read since the digest
+	was made (by the site, or by another run) nothing is sent.
+	:return tuple: uid, and "sent", "skipped" or "failed"
+	"""
+	from sefaria.model.notification import NotificationSet
+
+	uid = digest["uid"]
+	notifications = NotificationSet().unread_personal_for_user(uid)
+	ids = [n._id for n in notifications]
+	if not ids:
+		return uid, "skipped"
+	claimed = db.notifications.update({"_id": {"$in": ids}, "read": False},
+									  {"$set": {"read": True, "read_via": "email"}}, multi=True)
+	if not claimed["n"]:
+		return uid, "skipped"
+
+	try:
+		message_html  = render_to_string("email/notifications_email.html", {"notifications": notifications, "recipient": digest["first_name"]})
 		#message_text = util.strip_tags(message_html)
 		actors_string = notifications.actors_string()
 		verb          = "have" if " and " in actors_string else "has"
 		subject       = "%s %s new activity on Sefaria" % (actors_string, verb)
 		from_email    = "Sefaria <hello@sefaria.org>"
-		to            = user.email
+		to            = digest["email"]
 
-		msg = EmailMultiAlternatives(subject, message_html, from_email, [to])
+		msg = EmailMultiAlternatives(subject, message_html, from_email, [to], connection=_digest_connection)
 		msg.content_subtype = "html"  # Main content is now text/html
 		#msg.attach_alternative(message_text, "text/plain")
 		msg.send()
+	except Exception as e:
+		logger.exception(u"Failed to email notifications to user {}: {}".format(uid, e))
+		db.notifications.update({"_id": {"$in": ids}, "read_via": "email"},
+								{"$set": {"read": False, "read_via": None}}, multi=True)
+		_reopen_digest_connection()
+		return uid, "failed"
 
-		notifications.mark_read(via="email")
+	return uid, "sent"
 
 
 def unread_notifications_count_for_user(uid):
@@ -319,54 +417,104 @@ def unread_notifications_count_for_user(uid):
 	return NotificationSet().unread_for_user(uid).count()
 
 
-public_user_data_cache = {}
-def public_user_data(uid):
-	"""Returns a dictionary with common public data for `uid`"""
-	if uid in public_user_data_cache:
-		return public_user_data_cache[uid]
+def gravatar_url(email, size):
+	"""Returns the URL of the Gravatar image of `email`, `size` pixels square"""
+	default_image = "https://www.sefaria.org/static/img/profile-default.png"
+	gravatar_base = "http://www.gravatar.com/avatar/" + hashlib.md5(email.lower()).hexdigest() + "?"
+	return gravatar_base + urllib.urlencode({'d': default_image, 's': str(size)})
+
+
+def _public_user_data_key(uid):
+	return "public_user_data.{}".format(uid)
 
-	profile = UserProfile(id=uid)
-	try:
-		user = User.objects.get(id=uid)
-		is_staff = user.is_staff()
-	except:
-		is_staff = False
 
-	data = {
-		"name": profile.full_name,
-		"profileUrl": "/profile/" + profile.slug,
-		"imageUrl": profile.gravatar_url_small,
-		"isStaff": is_staff,
+def _make_public_user_data(uid, profile, user):
+	"""
+	Returns the public data of `uid`, from its profile document and Django User (either may be None),
+	with the same defaults as UserProfile
+	"""
+	fields = {
+		"first_name": user.first_name if user else "User",
+		"last_name":  user.last_name if user else str(uid),
+		"email":      user.email if user else "test@sefaria.org",
+		"slug":       "",
+	}
+	if profile:
+		fields.update({k: profile[k] for k in fields if k in profile})
+	return {
+		"name": fields["first_name"] + " " + fields["last_name"],
+		"profileUrl": "/profile/" + fields["slug"],
+		"imageUrl": gravatar_url(fields["email"], 80),
+		"isStaff": bool(user and user.is_staff),
 		"uid": uid
 	}
-	public_user_data_cache[uid] = data
+
+
+def public_user_data_many(uids):
+	"""
+	Returns a dictionary from each uid in `uids` to a dictionary with common public data for that user.
+
+	Data is cached per user in the shared Django cache for PUBLIC_USER_DATA_CACHE_TIMEOUT seconds,
+	and removed when the user's profile is saved.  Users missing from the cache are loaded together,
+	with one query for their profiles and one for their Django Users.
+	"""
+	uids = list(set(uids))
+	keys = {uid: _public_user_data_key(uid) for uid in uids}
+	cached = scache.get_cache_elems(keys.values()) if uids else {}
+	data = {uid: cached[keys[uid]] for uid in uids if keys[uid] in cached}
+
+	missing = [uid for uid in uids if uid not in data]
+	if missing:
+		profiles = {p["id"]: p for p in db.profiles.find({"id": {"$in": missing}}, {"id": 1, "slug": 1, "first_name": 1, "last_name": 1, "email": 1})}
+		users = {}
+		try:
+			users = {user.id: user for user in User.objects.filter(id__in=[_int_id(uid) for uid in missing])}
+		except:
+			pass
+		loaded = {}
+		for uid in missing:
+			data[uid] = _make_public_user_data(uid, profiles.get(uid), users.get(_int_id(uid)))
+			loaded[keys[uid]] = data[uid]
+		scache.set_cache_elems(loaded, PUBLIC_USER_DATA_CACHE_TIMEOUT)
+
 	return data
 
 
+def _int_id(uid):
+	try:
+		return int(uid)
+	except (TypeError, ValueError):
+		return uid
+
+
+def public_user_data(uid):
+	"""Returns a dictionary with common public data for `uid`"""
+	return public_user_data_many([uid])[uid]
+
+
+def invalidate_public_user_data(uid):
+	scache.delete_cache_elem(_public_user_data_key(uid))
+
+
 def user_name(uid):
 	"""Returns a string of a user's full name"""
 	data = public_user_data(uid)
 	return data["name"]
 
 
-# Simple Cache for user links
-user_links = {}
-def user_link(uid):
-	"""Returns a string with an <a> tag linking to a users profile"""
-	if uid in user_links:
-		return user_links[uid]
-	
-	data = public_user_data(uid)
-	link = "<a href='" + data["profileUrl"] + "' class='userLink'>" + data["name"] + "</a>"
-	user_links[uid] = link
-	return link
+def user_link(uid, data=None):
+	"""
+	Returns a string with an <a> tag linking to a users profile
+	:param data: The public user data of `uid`, if already loaded
+	"""
+	data = data or public_user_data(uid)
+	return "<a href='" + data["profileUrl"] + "' class='userLink'>" + data["name"] + "</a>"
 
 
 def is_user_staff(uid):
 	"""
 	Returns True if the user with uid is staff.
 	"""
-	data = public_user_data(uid)
 	try:
 		uid  = int(uid)
 		user = User.objects.get(id=uid)
@@ -397,11 +545,12 @@ def annotate_user_list(uids):
 	Returns a list of dictionaries giving details (names, profile links) 
 	for the user ids list in uids.
 	"""
+	user_data = public_user_data_many(uids)
 	annotated_list = []
 	for uid in uids:
-		data = public_user_data(uid)
+		data = user_data[uid]
 		annotated = {
-			"userLink": user_link(uid),
+			"userLink": user_link(uid, data),
 			"imageUrl": data["imageUrl"]
 		}
 		annotated_list.append(annotated)
@@ -3,6 +3,8 @@ version_state.py
 Writes to MongoDB Collection:
 """
 import logging
+import copy
+from multiprocessing import Pool
 
 
 logger = logging.getLogger(__name__)
@@ -145,6 +147,9 @@ class VersionState(abst.AbstractMongoRecord, AbstractSchemaContent):
         if self.is_new_state:  # refresh done on init
             return
         self.content = self.index.nodes.visit_content(self._content_node_visitor, self.content)
+        self._save_counts()
+
+    def _save_counts(self):
         self.index.nodes.visit_structure(self._aggregate_structure_state, self)
         self.linksCount = link.LinkSet(Ref(self.index.title)).count()
         self.save()
@@ -153,6 +158,96 @@ class VersionState(abst.AbstractMongoRecord, AbstractSchemaContent):
             from sefaria.system.sf_varnish import invalidate_counts
             invalidate_counts(self.index)
 
+    def apply_text_change(self, oref, lang, old_text, new_text):
+        """
+        Updates the counts for a change of the text of one version at `oref`, from `old_text` to `new_text`,
+        as after a TextChunk save.  Only the counts of the node of `oref` are recalculated,
+        from the difference of the masks of the old and new text, without loading any versions.
+
+        When the change can not be counted exactly this way - ranges, or text that no longer covers
+        the positions of the old text - falls back to a full :meth:`refresh`.
+
+        :param oref: :class:`Ref` of the saved TextChunk
+        :param lang: "en" or "he"
+        :param old_text: The text at `oref` before the save
+        :param new_text: The text at `oref` after the save
+        :return bool: True if the change was counted incrementally, False if the text was recounted
+        """
+        if self.is_new_state:  # refresh done on init, with the new text
+            return False
+        snode = oref.index_node
+        current = self.content_node(snode) if isinstance(snode, text.JaggedArrayNode) and not oref.is_range() else None
+        old_mask = JaggedTextArray(old_text).mask().array()
+        new_mask = JaggedTextArray(new_text).mask().array()
+        if not current or not current.get("_all") or not self._covers(new_mask, old_mask):
+            self.refresh()
+            return False
+
+        diff = JaggedIntArray._add(new_mask, self._negate(old_mask))
+        all_old = current["_all"]["availableTexts"]
+        delta = JaggedIntArray(self._place(diff, [i - 1 for i in oref.sections], all_old, snode.depth))
+        all_ja = JaggedIntArray(all_old) + delta
+        zero_mask = all_ja.zero_mask()
+
+        padded_ja = {}
+        for l, lkey in self.lang_map.items():
+            padded_ja[lkey] = JaggedIntArray(current[lkey]["availableTexts"]) + zero_mask
+            if l == lang:
+                padded_ja[lkey] = padded_ja[lkey] + delta
+
+        self._set_node_state(snode, current, all_ja, padded_ja)
+        self._save_counts()
+        return True
+
+    @classmethod
+    def _covers(cls, new, old):
+        """
+        True if the mask `new` has every position of the mask `old`, so that summing their difference into
+        the counts gives the same shape as a recount.
+        """
+        if isinstance(old, list):
+            return isinstance(new, list) and len(new) >= len(old) and all(cls._covers(n, o) for n, o in zip(new, old))
+        return not isinstance(new, list) or old == 0
+
+    @classmethod
+    def _negate(cls, mask):
+        return [cls._negate(m) for m in mask] if isinstance(mask, list) else -mask
+
+    @classmethod
+    def _place(cls, diff, indexes, existing, depth, level=0):
+        """
+        Nests `diff` at `indexes`, to be added to counts of shape `existing`.
+        Positions before `indexes` that exist in `existing` are None, so that adding leaves them unchanged.
+        Positions beyond `existing` are padded as TextChunk._pad() pads the version's content.
+        """
+        if level == len(indexes):
+            return diff
+        existing = existing if isinstance(existing, list) else []
+        i = indexes[level]
+        pad = 0 if level == depth - 1 else []
+        placed = [None if p < len(existing) else pad for p in range(i)]
+        placed.append(cls._place(diff, indexes, existing[i] if i < len(existing) else None, depth, level + 1))
+        return placed
+
+    def verify(self):
+        """
+        Recounts the text, without saving, and compares the result with the current counts.
+        :return list: (node address, language key, attribute) for each count that differs from the recount
+        """
+        recount = self.index.nodes.visit_content(self._content_node_visitor, copy.deepcopy(self.content))
+        differences = []
+
+        def compare(snode, *contents, **kwargs):
+            stored, counted = contents
+            for lkey in counted:
+                for attr, value in counted[lkey].items():
+                    if stored.get(lkey, {}).get(attr) != value:
+                        differences.append((snode.version_address(), lkey, attr))
+            return stored
+
+        self.index.nodes.visit_content(compare, self.content, recount)
+        return differences
+
     def get_flag(self, flag):
         return self.flags.get(flag, None)
 
@@ -211,18 +306,33 @@ class VersionState(abst.AbstractMongoRecord, AbstractSchemaContent):
         # Sum all of the languages
         ja['_all'] = reduce(lambda x, y: x + y, [ja[lkey] for lkey in self.lang_keys])
         zero_mask = ja['_all'].zero_mask()
-        current["_all"] = {"availableTexts": ja['_all'].array()}
+
+        # build zero-padded count ("availableTexts")
+        for lkey in self.lang_keys:
+            padded_ja[lkey] = ja[lkey] + zero_mask
+
+        self._set_node_state(snode, current, ja['_all'], padded_ja, ja)
+        return current
+
+    def _set_node_state(self, snode, current, all_ja, padded_ja, count_ja=None):
+        """
+        Sets the counts and the data derived from them on `current`, the VersionState content node of `snode`
+        :param all_ja: JaggedIntArray of counts for all languages
+        :param padded_ja: JaggedIntArrays of counts for each language key, zero padded to the shape of `all_ja`
+        :param count_ja: JaggedIntArrays from which to count units at each level, for each language key.  Defaults to `padded_ja`.
+        """
+        depth = snode.depth
+        count_ja = count_ja or padded_ja
+        current["_all"] = {"availableTexts": all_ja.array()}
 
         # Get derived data for all languages
         for lang, lkey in self.lang_map.items():
-            # build zero-padded count ("availableTexts")
-            padded_ja[lkey] = ja[lkey] + zero_mask
             current[lkey]["availableTexts"] = padded_ja[lkey].array()
 
             # number of units at each level ("availableCounts") from raw counts
             # depth_sum() reduces anything greater than 1 to 1,
             # so that the count returned is an accurate measure of how much material is there
-            current[lkey]["availableCounts"] = [ja[lkey].depth_sum(d) for d in range(depth)]
+            current[lkey]["availableCounts"] = [count_ja[lkey].depth_sum(d) for d in range(depth)]
 
             # Percent of text available, versus its metadata count ("percentAvailable")
             # and if it's a valid measure ('percentAvailableInvalid')
@@ -281,8 +391,6 @@ class VersionState(abst.AbstractMongoRecord, AbstractSchemaContent):
             else:
                 current[lkey]['sparseness'] = 4
 
-        return current
-
     def _node_count(self, snode, lang="en"):
         """
         Count available versions of a text in the db, segment by segment.
@@ -473,15 +581,31 @@ class StateNode(object):
         return en[unit]
 
 
-def refresh_all_states():
-    indices = IndexSet()
+def _refresh_state(title):
+    logger.debug(u"Rebuilding state for {}".format(title))
+    try:
+        VersionState(title).refresh()
+    except Exception as e:
+        logger.warning(u"Got exception rebuilding state for {}: {}".format(title, e))
+
 
-    for index in indices:
-        logger.debug(u"Rebuilding state for {}".format(index.title))
+def refresh_all_states(processes=1):
+    """
+    Recounts the VersionState of every Index, and rebuilds the TOC.
+    :param processes: With more than one, states are recounted from a pool of `processes` workers.
+    """
+    titles = [index.title for index in IndexSet()]
+
+    if processes > 1:
+        pool = Pool(processes)
         try:
-            VersionState(index).refresh()
-        except Exception as e:
-            logger.warning(u"Got exception rebuilding state for {}: {}".format(index.title, e))
+            pool.map(_refresh_state, titles, chunksize=10)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for title in titles:
+            _refresh_state(title)
 
     library.rebuild_toc()
 
@@ -3,7 +3,7 @@ from datetime import datetime
 from bson.objectid import ObjectId
 
 import sefaria.model as model
-from sefaria.model.user_profile import user_link
+from sefaria.model.user_profile import user_link, public_user_data_many
 from sefaria.utils.util import *
 from sefaria.system.database import db
 
@@ -69,14 +69,14 @@ def get_reviews(tref, lang, version):
 	"""
 	Returns a list of reviews pertaining to ref/lang/version
 	"""
-	reviews = []
 	tref = model.Ref(tref).normal()
 	refRe = '^%s$|^%s:' % (tref, tref)
 	cursor = db.history.find({"ref": {"$regex": refRe}, "language": lang, "version": version, "rev_type": "review"}).sort([["date", -1]])
-	for r in cursor:
+	reviews = list(cursor)
+	user_data = public_user_data_many([r["user"] for r in reviews])
+	for r in reviews:
 		r["_id"] = str(r["_id"])
-		r["userLink"] = user_link(r["user"])
-		reviews.append(r)
+		r["userLink"] = user_link(r["user"], user_data[r["user"]])
 
 	return reviews
 
@@ -8,6 +8,7 @@ import os
 from pprint import pprint
 from datetime import datetime, timedelta
 import re
+import json
 import bleach
 
 # To allow these files to be run directly from command line (w/o Django shell)
@@ -22,6 +23,7 @@ from pyelasticsearch import ElasticHttpNotFoundError, ElasticHttpError
 
 from sefaria.model import *
 from sefaria.model.text import AbstractIndex
+from sefaria.model.schema import AddressTalmud, JaggedArrayNode
 from sefaria.model.user_profile import user_link, public_user_data
 from sefaria.system.database import db
 from sefaria.system.exceptions import InputError
@@ -151,6 +153,16 @@ def make_text_index_document(tref, version, lang):
     text = TextFamily(oref, context=0, commentary=False, version=version, lang=lang).contents()
 
     content = text["he"] if lang == 'he' else text["text"]
+    return make_text_index_document_from_content(oref, version, lang, content)
+
+
+def make_text_index_document_from_content(oref, version, lang, content):
+    """
+    Create a document for indexing from already loaded text content of ref/version/lang.
+    Returns False if there is no content.
+    :param oref: :class:`Ref`
+    :param content: String, or list of strings, as in `TextChunk.text`
+    """
     if not content:
         # Don't bother indexing if there's no content
         return False
@@ -160,21 +172,30 @@ def make_text_index_document(tref, version, lang):
 
     content = bleach.clean(content, strip=True, tags=())
 
+    padded_oref = oref.padded_ref()
+    node = padded_oref.index_node
+    sections = padded_oref.sections[:]
+    he_title = node.full_title("he")
+    if "Talmud" in node.addressTypes:
+        # replace ints with daf strings (3->"2a") for Talmud addresses, as in TextFamily.contents()
+        sections = [AddressTalmud.toStr("en", n) if node.addressTypes[i] == "Talmud" else n for i, n in enumerate(sections)]
+        he_title = padded_oref.he_normal()
+
     if oref.is_talmud():
-        title = text["book"] + " Daf " + text["sections"][0]
+        title = padded_oref.book + " Daf " + sections[0]
     else:
-        title = text["book"] + " " + " ".join([u"{} {}".format(p[0], p[1]) for p in zip(text["sectionNames"], text["sections"])])
+        title = padded_oref.book + " " + " ".join([u"{} {}".format(p[0], p[1]) for p in zip(node.sectionNames, sections)])
     title += u" ({})".format(version)
 
     if lang == "he":
-        title = text.get("heTitle", "") + " " + title
+        title = he_title + " " + title
 
     if getattr(oref.index, "dependence", None) == 'Commentary':  # uch, special casing
-        categories = text["categories"][:]
+        categories = oref.index.categories[:]
         categories.remove('Commentary')
         categories[0] += " Commentaries"  # this will create an additional bucket for each top level category's commentary
     else:
-        categories = text["categories"]
+        categories = oref.index.categories
 
     return {
         "title": title, 
@@ -182,7 +203,7 @@ def make_text_index_document(tref, version, lang):
         "heRef": oref.he_normal(),
         "version": version, 
         "lang": lang,
-        "titleVariants": text["titleVariants"],
+        "titleVariants": node.all_tree_titles("en"),
         "content": content,
         "he_content": content if (lang == "he") else "",
         "categories": categories,
@@ -426,6 +447,208 @@ def index_all_sections(index_name, skip=0, merged=False, debug=False):
     print "Indexed %d documents." % doc_count
 
 
+class BulkIndexStats(object):
+    """
+    Running totals for a bulk reindex
+    """
+    def __init__(self):
+        self.start = datetime.now()
+        self.units = 0
+        self.docs = 0
+        self.bytes = 0
+        self.requests = 0
+        self.errors = 0
+
+    def add(self, result):
+        self.units += 1
+        self.docs += result["docs"]
+        self.bytes += result["bytes"]
+        self.requests += result["requests"]
+        self.errors += result["errors"]
+
+    def report(self):
+        seconds = max((datetime.now() - self.start).total_seconds(), 0.001)
+        return u"{} units, {} docs in {} requests ({} errors), {:.1f} MB, {:.1f} docs/sec, elapsed {}".format(
+            self.units, self.docs, self.requests, self.errors, self.bytes / 1048576.0, self.docs / seconds, datetime.now() - self.start)
+
+
+def version_units(merged=False, debug=False):
+    """
+    Returns the units of work for a bulk reindex: a (index title, version title, language) for each Version,
+    or for a merged index, an (index title, None, language) for each language of each Index.
+    """
+    units = []
+    for index in library.all_index_records():
+        if merged:
+            units += [(index.title, None, lang) for lang in VersionSet({"title": index.title}).distinct("language")]
+        else:
+            units += [(index.title, v.versionTitle, v.language) for v in VersionSet({"title": index.title}, proj={"versionTitle": 1, "language": 1})]
+        if debug and len(units) >= 10:
+            return units[:10]
+    return units
+
+
+def make_version_index_documents(title, version, lang, bavli_amud=True):
+    """
+    Generator of (doc id, doc) for every document of a Version, or of the merged text in `lang` if `version` is None.
+    Reads the Version content once and walks it in memory, producing the same documents as `index_text()`.
+    :param bool bavli_amud:  Is this Bavli? Bavli text is indexed by section, not segment.
+    """
+    index = library.get_index(title)
+    if version:
+        v = Version().load({"title": title, "versionTitle": version, "language": lang})
+        if not v:
+            return
+    else:
+        vset = VersionSet({"title": title, "language": lang})
+
+    for node in index.nodes.get_leaf_nodes():
+        if not isinstance(node, JaggedArrayNode):
+            continue
+        content = v.content_node(node) if version else vset.merge(node)[0]
+        doc_depth = node.depth
+        if bavli_amud and u"Bavli" in index.categories and node.depth > 1:
+            doc_depth -= 1
+        for indexes, segment in _walk_jagged_array(content, doc_depth):
+            sections = [i + 1 for i in indexes]
+            try:
+                oref = Ref(_obj={
+                    "index": index,
+                    "book": node.full_title("en"),
+                    "index_node": node,
+                    "primary_category": index.get_primary_category(),
+                    "sections": sections,
+                    "toSections": sections[:]
+                })
+                doc = make_text_index_document_from_content(oref, version, lang, segment)
+            except Exception as e:
+                logger.error(u"Error making index document {} {} / {} / {} : {}".format(node.full_title("en"), sections, version, lang, e))
+                continue
+            if doc:
+                yield make_text_doc_id(oref.normal(), version, lang), doc
+
+
+def _walk_jagged_array(ja, depth, indexes=()):
+    """
+    Yields (indexes, element) for each element of nested list `ja` at `depth`, skipping empty elements
+    """
+    if depth == 0:
+        if ja:
+            yield list(indexes), ja
+        return
+    if not isinstance(ja, list):
+        return
+    for i, sub in enumerate(ja):
+        if sub:
+            for item in _walk_jagged_array(sub, depth - 1, indexes + (i,)):
+                yield item
+
+
+def bulk_index_docs(index_name, docs):
+    """
+    Sends (doc id, doc) pairs to ElasticSearch in one _bulk request
+    :return: (bytes sent, number of documents that failed)
+    """
+    lines = []
+    for doc_id, doc in docs:
+        lines.append(json.dumps({"index": {"_index": index_name, "_type": "text", "_id": doc_id}}))
+        lines.append(json.dumps(doc))
+    body = "\n".join(lines) + "\n"
+    res = es.send_request("POST", ["_bulk"], body, encode_body=False)
+    errors = 0
+    if res.get("errors"):
+        for item in res.get("items", []):
+            action = item.get("index", {})
+            if action.get("status", 200) >= 300:
+                errors += 1
+                logger.error(u"ERROR bulk indexing {} : {}".format(action.get("_id"), action.get("error")))
+    return len(body), errors
+
+
+def index_version_unit(args):
+    """
+    Indexes one unit from `version_units()`, in batches of `bulk_size` documents.
+    Module level so that it can be run in a worker process.
+    """
+    index_name, (title, version, lang), bulk_size = args
+    result = {"unit": [title, version, lang], "docs": 0, "bytes": 0, "requests": 0, "errors": 0}
+    batch = []
+    try:
+        for doc in make_version_index_documents(title, version, lang):
+            batch.append(doc)
+            if len(batch) >= bulk_size:
+                sent, errors = bulk_index_docs(index_name, batch)
+                result["bytes"] += sent
+                result["errors"] += errors
+                result["docs"] += len(batch)
+                result["requests"] += 1
+                batch = []
+        if batch:
+            sent, errors = bulk_index_docs(index_name, batch)
+            result["bytes"] += sent
+            result["errors"] += errors
+            result["docs"] += len(batch)
+            result["requests"] += 1
+    except Exception as e:
+        logger.error(u"ERROR indexing {} / {} / {} : {}".format(title, version, lang, e))
+        result["failed"] = True
+    return result
+
+
+def _init_index_worker():
+    # Each worker process needs its own connection pool to ElasticSearch
+    global es
+    es = ElasticSearch(SEARCH_ADMIN)
+
+
+def _read_checkpoint(checkpoint_file):
+    done = set()
+    if checkpoint_file and os.path.exists(checkpoint_file):
+        with open(checkpoint_file) as f:
+            for line in f:
+                if line.strip():
+                    done.add(tuple(json.loads(line)))
+    return done
+
+
+def index_all_versions(index_name, merged=False, debug=False, processes=4, bulk_size=500, checkpoint_file=None):
+    """
+    Index the text of every Version (or the merged text of every Index) with _bulk requests, from a pool of `processes` workers.
+    If `checkpoint_file` is given, each unit completed without errors is recorded there, and units already recorded
+    are skipped, so that an interrupted run can be resumed, and units with failed documents are indexed again.
+    :return: :class:`BulkIndexStats`
+    """
+    from multiprocessing import Pool
+
+    done = _read_checkpoint(checkpoint_file)
+    units = [u for u in version_units(merged=merged, debug=debug) if tuple(u) not in done]
+    print "Beginning bulk index of {} units ({} already done).".format(len(units), len(done))
+
+    stats = BulkIndexStats()
+    checkpoint = open(checkpoint_file, "a") if checkpoint_file else None
+    pool = Pool(processes, initializer=_init_index_worker) if processes > 1 else None
+    try:
+        work = [(index_name, u, bulk_size) for u in units]
+        results = pool.imap_unordered(index_version_unit, work) if pool else (index_version_unit(w) for w in work)
+        for result in results:
+            stats.add(result)
+            if checkpoint and not result.get("failed") and not result["errors"]:
+                checkpoint.write(json.dumps(result["unit"]) + "\n")
+                checkpoint.flush()
+            if stats.units % 100 == 0:
+                logger.info(stats.report())
+                print stats.report()
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        if checkpoint:
+            checkpoint.close()
+
+    print stats.report()
+    return stats
+
+
 def index_public_sheets(index_name):
     """
     Index all source sheets that are publicly listed.
@@ -528,9 +751,11 @@ def get_new_and_current_index_names(merged=False, debug=False):
     return {"new": new_index_name, "current": old_index_name, "alias": alias_name}
 
 
-def index_all(skip=0, merged=False, debug=False):
+def index_all(skip=0, merged=False, debug=False, bulk=True, processes=4, bulk_size=500, checkpoint_file=None):
     """
     Fully create the search index from scratch.
+    :param bulk: If True, index with `index_all_versions()`.  Otherwise, index ref by ref with `index_all_sections()`, starting at `skip`.
+    :param checkpoint_file: See `index_all_versions()`.  If it records progress, the index is not recreated.
     """
     start = datetime.now()
 
@@ -538,9 +763,14 @@ def index_all(skip=0, merged=False, debug=False):
     new_index_name = name_dict['new']
     curr_index_name = name_dict['current']
     alias_name = name_dict['alias']
-    if skip == 0:
-        create_index(new_index_name, merged=merged)
-    index_all_sections(new_index_name, skip=skip, merged=merged, debug=debug)
+    if bulk:
+        if not _read_checkpoint(checkpoint_file):
+            create_index(new_index_name, merged=merged)
+        index_all_versions(new_index_name, merged=merged, debug=debug, processes=processes, bulk_size=bulk_size, checkpoint_file=checkpoint_file)
+    else:
+        if skip == 0:
+            create_index(new_index_name, merged=merged)
+        index_all_sections(new_index_name, skip=skip, merged=merged, debug=debug)
     if not merged:
         index_public_sheets(new_index_name)
 
@@ -105,6 +105,7 @@ MIDDLEWARE_CLASSES = (
     'django.contrib.messages.middleware.MessageMiddleware',
     'django_mobile.middleware.MobileDetectionMiddleware',
     'sefaria.system.middleware.ProfileMiddleware',
+    'sefaria.system.middleware.InstrumentationMiddleware',
     'django_mobile.middleware.SetFlavourMiddleware',
     #'django.middleware.cache.UpdateCacheMiddleware',
     #'django.middleware.cache.FetchFromCacheMiddleware',
@@ -258,9 +259,73 @@ CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
         'LOCATION': '/var/tmp/django_cache',
-    }
+    },
+    # Mongo records, see MONGO_RECORD_CACHE_ALIAS
+    'records': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': '/var/tmp/django_cache_records',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+    # Version tokens of cached families, see VERSION_TOKEN_CACHE
+    'versions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': '/var/tmp/django_cache_versions',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
 }
 
+# Cache alias that the version tokens of memoized functions and cached Mongo collections are kept in,
+# apart from the entries they version, so that culling those can't drop a token and invalidate a whole family.
+# Without this alias in CACHES, tokens are kept with the entries.  See sefaria.system.cache.get_version_cache
+VERSION_TOKEN_CACHE = 'versions'
+
+# Upper bounds on the in-process cache of Ref instances, see sefaria.model.text.RefCache
+# None for either disables that bound.
+REF_CACHE_MAX_ENTRIES = 100000
+REF_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Read-through cache for Mongo records of classes that set `cache_records`, see sefaria.model.abstract.RecordCache
+# Records are cached in the MONGO_RECORD_CACHE_ALIAS alias of CACHES, which should be shared by all processes
+# (memcached, or a file based cache with its own LOCATION); without it in CACHES, records are not cached.
+# Processes notice records saved by another process within MONGO_RECORD_CACHE_GENERATION_TTL seconds.
+MONGO_RECORD_CACHE_ALIAS = 'records'
+MONGO_RECORD_CACHE_TIMEOUT = 60 * 60
+MONGO_RECORD_CACHE_LOCAL_ENTRIES = 2000
+MONGO_RECORD_CACHE_GENERATION_TTL = 5
+
+# File from which the Library's core maps are loaded at startup, see sefaria.model.text.Library.load_snapshot
+# None builds them from the database in every process.
+# The file is unpickled, so it must be in a directory owned by the user the app runs as, and not writable by any other user
+# (never a shared directory such as /tmp or /var/tmp).  A file that is not owned by that user, or is writable by others, is not loaded.
+LIBRARY_SNAPSHOT_PATH = None
+
+# Number of recent requests per view kept for the percentiles at /admin/instrumentation, see sefaria.system.instrumentation
+INSTRUMENTATION_SAMPLES = 1000
+
+# Find the links of a Ref with range queries on the indexed `ref_keys` of links, rather than with regular expressions.
+# Turn on once scripts/backfill_link_ref_keys.py has been run on the database.  See sefaria.model.link.ref_key_query
+LINK_REF_KEY_QUERIES = False
+
+# Find the sheets of a Ref in the sheet_refs index, rather than with regular expressions on sheet sources.
+# Turn on once sefaria.sheets.update_included_refs(hours=0) has built the index.  See sefaria.sheets.get_sheets_for_ref
+SHEET_REF_INDEX_QUERIES = False
+
+# A full text snapshot of a segment is written to history_snapshots after this many logged changes,
+# or this many bytes of revert patches, since its last snapshot.  See sefaria.model.history.snapshot_text_if_due
+HISTORY_SNAPSHOT_REVISIONS = 50
+HISTORY_SNAPSHOT_PATCH_BYTES = 64 * 1024
+
+# Seconds that Varnish PURGEs and BANs are gathered for before a background thread sends them together.
+# None sends each one at once, in the calling thread.  See sefaria.system.invalidation
+VARNISH_INVALIDATION_WINDOW = 0.25
+
+# Most word form lookups kept in memory by each process, see sefaria.model.lexicon.WordFormCache.  0 turns the cache off.
+WORD_FORM_CACHE_ENTRIES = 50000
+
+# Seconds that the public data of a user (name, profile and image URLs) is kept in the Django cache,
+# see sefaria.model.user_profile.public_user_data_many.  Saving a profile removes it at once.
+PUBLIC_USER_DATA_CACHE_TIMEOUT = 60 * 60 * 24
+
 # Grab enviornment specific settings from a file which
 # is left out of the repo.
 try:
@@ -1,7 +1,7 @@
 """
 sheets.py - backend core for Sefaria Source sheets
 
-Writes to MongoDB Collection: sheets
+Writes to MongoDB Collections: sheets, sheet_refs
 """
 import regex
 import dateutil.parser
@@ -13,11 +13,11 @@ import sefaria.model.abstract as abstract
 from sefaria.system.database import db
 from sefaria.model.notification import Notification, NotificationSet
 from sefaria.model.following import FollowersSet
-from sefaria.model.user_profile import UserProfile, annotate_user_list, public_user_data, user_link
+from sefaria.model.user_profile import UserProfile, annotate_user_list, public_user_data_many, user_link
 from sefaria.utils.util import strip_tags, string_overlap,titlecase
 from sefaria.system.exceptions import InputError
 from history import record_sheet_publication, delete_sheet_publication
-from settings import SEARCH_INDEX_ON_SAVE
+from settings import SEARCH_INDEX_ON_SAVE, SHEET_REF_INDEX_QUERIES
 import search
 
 
@@ -45,7 +45,7 @@ def user_sheets(user_id, sort_by="date"):
 		sheet_list = db.sheets.find({"owner": int(user_id), "status": {"$ne": 5}}).sort([["views", -1]])
 
 	response = {
-		"sheets": [sheet_to_dict(s) for s in sheet_list],
+		"sheets": sheet_list_to_dicts(sheet_list),
 	}
 	return response
 
@@ -58,24 +58,25 @@ def group_sheets(group, authenticated):
 
     sheets = db.sheets.find(query).sort([["title", 1]])
     response = {
-        "sheets": [sheet_to_dict(s) for s in sheets],
+        "sheets": sheet_list_to_dicts(sheets),
     }
     return response
 
 
-def sheet_to_dict(sheet):
+def sheet_to_dict(sheet, owner_data=None):
 	"""
 	Returns a JSON serializable dictionary of Mongo document `sheet`.
 	Annotates sheet with user profile info that is useful to client.
+	:param owner_data: The public user data of the sheet's owner, if already loaded
 	"""
-	profile = UserProfile(id=sheet["owner"])
+	owner_data = owner_data or public_user_data_many([sheet["owner"]])[sheet["owner"]]
 	sheet_dict = {
 		"id": sheet["id"],
 		"title": sheet["title"] if "title" in sheet else "Untitled Sheet",
 		"status": sheet["status"],
 		"author": sheet["owner"],
-		"ownerName": profile.full_name,
-		"ownerImageUrl": profile.gravatar_url_small,
+		"ownerName": owner_data["name"],
+		"ownerImageUrl": owner_data["imageUrl"],
 		"size": len(sheet["sources"]),
 		"views": sheet["views"],
 		"modified": dateutil.parser.parse(sheet["dateModified"]).strftime("%m/%d/%Y"),
@@ -84,6 +85,16 @@ def sheet_to_dict(sheet):
 	return sheet_dict
 
 
+def sheet_list_to_dicts(sheets):
+	"""
+	Returns a list of the dictionaries of `sheet_to_dict` for each Mongo document in `sheets`,
+	loading the public data of all of their owners at once.
+	"""
+	sheets = list(sheets)
+	owner_data = public_user_data_many([s["owner"] for s in sheets])
+	return [sheet_to_dict(s, owner_data[s["owner"]]) for s in sheets]
+
+
 def user_tags(uid):
 	"""
 	Returns a list of tags that `uid` has, ordered by tag order in user profile (if existing)
@@ -160,7 +171,7 @@ def sheet_list(user_id=None):
 		sheet_list = db.sheets.find({"owner": int(user_id), "status": {"$ne": 5}}).sort([["dateModified", -1]])
 
 	response = {
-		"sheets": [sheet_to_dict(s) for s in sheet_list],
+		"sheets": sheet_list_to_dicts(sheet_list),
 	}
 	return response
 
@@ -218,7 +229,7 @@ def save_sheet(sheet, user_id, search_override=False):
 							}).delete()
 
 	db.sheets.update({"id": sheet["id"]}, sheet, True, False)
-
+	update_sheet_ref_index(sheet)
 
 	if sheet["status"] == "public" and SEARCH_INDEX_ON_SAVE and not search_override:
 		index_name = search.get_new_and_current_index_names()['current']
@@ -344,7 +355,7 @@ def refine_ref_by_text(ref, text):
 
 def update_included_refs(hours=1):
 	"""
-	Rebuild included_refs index on all sheets that have been modified
+	Rebuild included_refs index and sheet_refs index entries on all sheets that have been modified
 	in the last 'hours' or all sheets if hours is 0.
 	"""
 	if hours == 0:
@@ -361,6 +372,72 @@ def update_included_refs(hours=1):
 		sources = sheet.get("sources", [])
 		refs = refs_in_sources(sources)
 		db.sheets.update({"_id": sheet["_id"]}, {"$set": {"included_refs": refs}})
+		update_sheet_ref_index(sheet)
+
+
+def expand_sheet_ref(tref):
+	"""
+	Returns the entry fields for source ref 'tref' in the sheet_refs index:
+	its normal form, its anchor verse, and the normal forms of the segment refs it covers.
+	Refs above section level are not expanded, and are found by no lookup.
+	Returns None for refs that don't parse.
+	"""
+	try:
+		oref = model.Ref(tref)
+	except InputError:
+		return None
+	entry = {
+		"anchorRef":    oref.normal(),
+		"anchorVerse":  oref.sections[-1] if len(oref.sections) else 1,
+		"expandedRefs": [],
+	}
+	if isinstance(oref.index_node, model.JaggedArrayNode) and len(oref.sections) >= oref.index_node.depth - 1:
+		try:
+			entry["expandedRefs"] = [r.normal() for r in oref.all_segment_refs()]
+		except (InputError, IndexError):
+			pass
+	return entry
+
+
+def update_sheet_ref_index(sheet):
+	"""
+	Rebuilds the entries of 'sheet' in the sheet_refs index, which maps the segment refs of the
+	sources of public sheets to the sheet data needed by get_sheets_for_ref().
+	There is one entry for each source with a ref.
+	"""
+	remove_sheet_from_ref_index(sheet["id"])
+	if sheet.get("status") != "public":
+		return
+	sheet_oid = sheet["_id"] if "_id" in sheet else db.sheets.find_one({"id": sheet["id"]}, {"_id": 1})["_id"]
+	entries = []
+	for source in sheet.get("sources", []):
+		if "ref" not in source:
+			continue
+		entry = expand_sheet_ref(source["ref"])
+		if entry is None:
+			continue
+		entry.update({
+			"sheet_id":  sheet["id"],
+			"sheet_oid": sheet_oid,
+			"title":     sheet.get("title", ""),
+			"owner":     sheet["owner"],
+			"views":     sheet.get("views", 0),
+		})
+		entries.append(entry)
+	if entries:
+		db.sheet_refs.insert(entries)
+
+
+def remove_sheet_from_ref_index(sheet_id):
+	db.sheet_refs.remove({"sheet_id": sheet_id})
+
+
+def increment_sheet_views(sheet_id):
+	"""
+	Counts a view of sheet 'sheet_id', on the sheet and on its entries in the sheet_refs index.
+	"""
+	db.sheets.update({"id": sheet_id}, {"$inc": {"views": 1}})
+	db.sheet_refs.update_many({"sheet_id": sheet_id}, {"$inc": {"views": 1}})
 
 
 def get_public_sheets(page=None):
@@ -399,10 +476,48 @@ def get_sheets_for_ref(tref, pad=True, context=1):
 	if context:
 		oref = oref.context_ref(context)
 
-	ref_re = oref.regex()
+	if SHEET_REF_INDEX_QUERIES and isinstance(oref.index_node, model.JaggedArrayNode):
+		segment_refs = [r.normal() for r in oref.all_segment_refs()]
+		entries = db.sheet_refs.find({"expandedRefs": {"$in": segment_refs}},
+			{"expandedRefs": 0}).sort([["views", -1], ["sheet_id", 1]])
+	else:
+		entries = _sheet_ref_entries_by_regex(oref)
+	entries = list(entries)
+
+	owner_data = public_user_data_many([e["owner"] for e in entries])
 
 	results = []
+	for entry in entries:
+		ownerData = owner_data[entry["owner"]]
+		com = {
+			"category":        "Sheets",
+			"type":            "sheet",
+			"owner":           entry["owner"],
+			"_id":             str(entry["sheet_oid"]),
+			"anchorRef":       entry["anchorRef"],
+			"anchorVerse":     entry["anchorVerse"],
+			"public":          True,
+			"commentator":     user_link(entry["owner"], ownerData), # legacy, used in S1
+			"text":            "<a class='sheetLink' href='/sheets/%d'>%s</a>" % (entry["sheet_id"], strip_tags(entry["title"])), # legacy, used in S1
+			"title":           strip_tags(entry["title"]),
+			"sheetUrl":        "/sheets/" + str(entry["sheet_id"]),
+			"ownerName":       ownerData["name"],
+			"ownerProfileUrl": ownerData["profileUrl"],
+			"ownerImageUrl":   ownerData["imageUrl"],
+			"views":           entry["views"]
+		}
+
+		results.append(com)
 
+	return results
+
+
+def _sheet_ref_entries_by_regex(oref):
+	"""
+	Yields entries in the form of the sheet_refs index for public sheets with sources matching 'oref',
+	found with regular expressions on the sources of sheets.
+	"""
+	ref_re = oref.regex()
 	regex_list = oref.regex(as_list=True)
 	ref_clauses = [{"sources.ref": {"$regex": r}} for r in regex_list]
 	sheets = db.sheets.find({"$or": ref_clauses, "status": "public"},
@@ -419,29 +534,16 @@ def get_sheets_for_ref(tref, pad=True, context=1):
 				match = model.Ref(match)
 			except InputError:
 				continue
-			ownerData = public_user_data(sheet["owner"])
-			com = {
-				"category":        "Sheets",
-				"type":            "sheet",
-				"owner":           sheet["owner"],
-				"_id":             str(sheet["_id"]),
-				"anchorRef":       match.normal(),
-				"anchorVerse":     match.sections[-1] if len(match.sections) else 1,
-				"public":          True,
-				"commentator":     user_link(sheet["owner"]), # legacy, used in S1
-				"text":            "<a class='sheetLink' href='/sheets/%d'>%s</a>" % (sheet["id"], strip_tags(sheet["title"])), # legacy, used in S1
-				"title":           strip_tags(sheet["title"]),
-				"sheetUrl":        "/sheets/" + str(sheet["id"]),
-				"ownerName":       ownerData["name"],
-				"ownerProfileUrl": ownerData["profileUrl"],
-				"ownerImageUrl":   ownerData["imageUrl"],
-				"views":           sheet["views"]
+			yield {
+				"sheet_id":    sheet["id"],
+				"sheet_oid":   sheet["_id"],
+				"title":       sheet["title"],
+				"owner":       sheet["owner"],
+				"views":       sheet["views"],
+				"anchorRef":   match.normal(),
+				"anchorVerse": match.sections[-1] if len(match.sections) else 1,
 			}
 
-			results.append(com)
-
-	return results
-
 
 def update_sheet_tags(sheet_id, tags):
 	"""
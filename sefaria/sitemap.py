@@ -4,13 +4,23 @@ sitemap.py - generate sitemaps of all available texts for search engines.
 Outputs sitemaps and sitemapindex to the first entry of STATICFILES_DIRS.
 """
 import os
+import json
+import filecmp
+import hashlib
 from datetime import datetime
 
 from sefaria.model import *
+from sefaria.datatype.jagged_array import JaggedIntArray
 from sefaria.system.database import db
 from sefaria.summaries import flatten_toc
 from settings import STATICFILES_DIRS
 
+import logging
+logger = logging.getLogger(__name__)
+
+# Sitemaps can have at most 50k URLs
+TEXTS_SITEMAP_URLS = 40000
+
 
 static_urls = [
 	"https://www.sefaria.org",
@@ -36,28 +46,171 @@ static_urls = [
 ]
 
 
-def chunks(l, n):
+def section_urls(vstate):
+	"""
+	Yields the URL of each section of the text of `vstate` that has content available, in order.
+	These are the URLs of the Refs of `Index.all_section_refs()`, made from the availability data
+	without creating (and caching) the Refs.
+	"""
+	for node in vstate.index.nodes.get_leaf_nodes():
+		try:
+			available = vstate.state_node(node).var("all", "availableTexts")
+			depth = JaggedIntArray(available).get_depth() - 1
+			title = node.full_title("en")
+			for indxs in _non_empty_sections(available, depth):
+				sections = [a + 1 for a in indxs]
+				normal = title
+				if sections:
+					normal += u" " + u":".join([node.address_class(i).toStr("en", n) for i, n in enumerate(sections)])
+				yield Ref.url_form(normal, len(sections) > 0)
+		except Exception as e:
+			logger.warning(u"Failed to generate section urls for {}. {}".format(node.full_title("en"), e))
+
+
+def _non_empty_sections(available, depth, _cur=None):
 	"""
-	Yield successive n-sized chunks from l.
+	Yields the 0 based indexes, `depth` levels deep, of each non empty part of the jagged array `available`.
+	Like `JaggedArray.non_empty_sections()`, but without building the list of all sections.
 	"""
-	for i in xrange(0, len(l), n):
-		yield l[i:i+n]
+	_cur = _cur or []
+	if depth <= len(_cur):
+		if _has_content(available):
+			yield _cur
+		return
+	if not isinstance(available, list):
+		return
+	for i, sub in enumerate(available):
+		for indxs in _non_empty_sections(sub, depth, _cur + [i]):
+			yield indxs
 
 
-def generate_texts_sitemaps():
+def _has_content(available):
+	if isinstance(available, list):
+		return any(_has_content(a) for a in available)
+	return bool(available)
+
+
+def book_fingerprint(vstate):
 	"""
-	Create sitemap for each text section for which content is available.
-	Returns the number of files written (each sitemap can have only 50k URLs)
+	Returns a hash of everything the section URLs of the text of `vstate` are made from:
+	the titles and address types of its nodes, and the sections available in each.
+	"""
+	h = hashlib.md5()
+	for node in vstate.index.nodes.get_leaf_nodes():
+		try:
+			available = vstate.state_node(node).var("all", "availableTexts")
+		except Exception:
+			available = None
+		h.update(json.dumps([node.full_title("en"), getattr(node, "addressTypes", None), available]))
+	return h.hexdigest()
+
+
+class SitemapWriter(object):
+	"""
+	Writes URLs, one per line, to files of at most `max_urls` URLs each, named `pattern % n`,
+	starting the next file as each one fills.
+
+	Each file is written to a temporary file that replaces the previous file of the same name only
+	if its contents changed, so that the modified time of a sitemap (its lastmod in the sitemap index)
+	is the time it last changed.
+	"""
+	def __init__(self, pattern, max_urls=TEXTS_SITEMAP_URLS):
+		self.pattern = pattern
+		self.max_urls = max_urls
+		self.filenames = []
+		self._file = None
+		self._count = 0
+
+	def write(self, url):
+		if self._file is None or self._count >= self.max_urls:
+			self._close_file()
+			filename = self.pattern % len(self.filenames)
+			self.filenames.append(filename)
+			self._file = open(STATICFILES_DIRS[0] + filename + ".tmp", "w")
+			self._count = 0
+		self._file.write(url.encode('utf-8') + "\n")
+		self._count += 1
+
+	def _close_file(self):
+		if self._file is not None:
+			self._file.close()
+			replace_if_changed(self._file.name, STATICFILES_DIRS[0] + self.filenames[-1])
+			self._file = None
+
+	def close(self):
+		"""
+		Finishes the last file, and removes files of the previous run beyond the last one written.
+		:return list: The names of the files written
+		"""
+		self._close_file()
+		n = len(self.filenames)
+		while os.path.exists(STATICFILES_DIRS[0] + self.pattern % n):
+			os.remove(STATICFILES_DIRS[0] + self.pattern % n)
+			n += 1
+		return self.filenames
+
+
+def replace_if_changed(tmp, path):
+	"""
+	Moves the file `tmp` to `path`, unless `path` already has the same contents.
 	"""
-	refs = library.ref_list()
-	urls = ["https://www.sefaria.org/" + oref.url() for oref in refs]
+	if os.path.exists(path) and filecmp.cmp(tmp, path, shallow=False):
+		os.remove(tmp)
+	else:
+		os.rename(tmp, path)
 
-	maps = list(chunks(urls, 40000))
 
-	for n in range(len(maps)):
-		write_urls(maps[n], "texts-sitemap%d.txt" % n)
+def generate_texts_sitemaps(incremental=True):
+	"""
+	Create sitemap for each text section for which content is available.
+	Returns the number of files written (each sitemap can have only 50k URLs)
 
-	return len(maps)
+	The URLs of each book are kept, with a fingerprint of the book's availability data, in
+	texts-sitemap-state.txt and texts-sitemap-state.json.  A run only makes URLs for the books whose
+	fingerprint changed since the last run, and copies the rest.  URLs are streamed one book at a time,
+	from the VersionState records to the sitemap files.
+	:param incremental: If False, make the URLs of every book
+	"""
+	state_path = STATICFILES_DIRS[0] + "texts-sitemap-state"
+	old_manifest, old_urls = {}, None
+	if incremental and os.path.exists(state_path + ".json") and os.path.exists(state_path + ".txt"):
+		with open(state_path + ".json") as f:
+			old_manifest = json.load(f)
+		old_urls = open(state_path + ".txt", "rb")
+
+	new_manifest = {}
+	new_urls = open(state_path + ".txt.tmp", "wb")
+	writer = SitemapWriter("texts-sitemap%d.txt")
+	regenerated = 0
+	try:
+		for doc in db.vstate.find({}, {"title": 1, "content": 1}):
+			vstate = VersionState(attrs=doc)
+			if not getattr(vstate, "index", None):
+				continue
+			fingerprint = book_fingerprint(vstate)
+			old = old_manifest.get(vstate.title)
+			if old_urls and old and old["fingerprint"] == fingerprint:
+				old_urls.seek(old["start"])
+				urls = old_urls.read(old["length"]).decode('utf-8').splitlines()
+			else:
+				urls = list(section_urls(vstate))
+				regenerated += 1
+			start = new_urls.tell()
+			for url in urls:
+				new_urls.write(url.encode('utf-8') + "\n")
+				writer.write("https://www.sefaria.org/" + url)
+			new_manifest[vstate.title] = {"fingerprint": fingerprint, "start": start, "length": new_urls.tell() - start}
+	finally:
+		new_urls.close()
+		if old_urls:
+			old_urls.close()
+
+	os.rename(state_path + ".txt.tmp", state_path + ".txt")
+	with open(state_path + ".json", "w") as f:
+		json.dump(new_manifest, f)
+	logger.info(u"Made section urls for {} of {} books".format(regenerated, len(new_manifest)))
+
+	return len(writer.close())
 
 
 def generate_texts_toc_sitemap():
@@ -117,32 +270,35 @@ def write_urls(urls, filename):
 	Writes the list URLS, one per line, to filename.
 	"""
 	out = STATICFILES_DIRS[0] + filename
-	f = open(out, 'w')
+	f = open(out + ".tmp", 'w')
 	for url in urls:
 		f.write(url.encode('utf-8') + "\n")
 	f.close()
+	replace_if_changed(out + ".tmp", out)
 
 
 def generate_sitemap_index(sitemaps):
-	now = datetime.now().strftime("%Y-%m-%d")
-	xml = ""
+	"""
+	Writes the sitemap index of the given sitemap files, one entry at a time.
+	The lastmod of each sitemap is the date its file last changed.
+	"""
+	out = STATICFILES_DIRS[0] + "sitemapindex.xml"
+	f = open(out, 'w')
+	f.write("""<?xml version="1.0" encoding="UTF-8"?>
+		<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+		""")
 	for m in sitemaps:
-		xml += """
+		path = STATICFILES_DIRS[0] + m
+		modified = datetime.fromtimestamp(os.path.getmtime(path)) if os.path.exists(path) else datetime.now()
+		f.write("""
 		   <sitemap>
 			  <loc>https://www.sefaria.org/static/%s</loc>
 			  <lastmod>%s</lastmod>
 		   </sitemap>
-		   """ % (m, now)
-
-	sitemapindex = """<?xml version="1.0" encoding="UTF-8"?>
-		<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
-		%s
+		   """ % (m, modified.strftime("%Y-%m-%d")))
+	f.write("""
 		</sitemapindex>
-		""" % xml
-
-	out = STATICFILES_DIRS[0] + "sitemapindex.xml"
-	f = open(out, 'w')
-	f.write(sitemapindex)
+		""")
 	f.close()
 
 
@@ -4,10 +4,18 @@ summaries.py - create and manage Table of Contents document for all texts
 
 Writes to MongoDB Collection: summaries
 """
+import gzip
+import hashlib
 import json
+from cStringIO import StringIO
 from datetime import datetime
 from pprint import pprint
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 import sefaria.system.cache as scache
 from sefaria.system.database import db
 from sefaria.utils.hebrew import hebrew_term
@@ -194,40 +202,94 @@ def recur_delete_element_from_toc(bookname, toc):
                 toc_elem['to_delete'] = True
     return toc
 
-def update_title_in_toc(toc, index, old_ref=None, recount=True, for_search=False):
+def update_title_in_toc(toc, index, old_ref=None, recount=True, for_search=False, changed=None):
     """
     Update text summary docs to account for change or insertion of 'text'
+    Only the category path of the text (and its old path, if its categories changed) is modified and resorted.
     * recount - whether or not to perform a new count of available text
+    * changed - a set, to which the names of the top level categories that were modified are added
     """
-    resort_other = False
     indx_dict = index.toc_contents() if not for_search else index.slim_toc_contents()
     cats = get_toc_categories(index, for_search=for_search)
-    """if cats[0] == "Other":
-        resort_other = True"""
     if recount:
         VersionState(index.title).refresh()
 
-    node = get_or_make_summary_node(toc, cats)
     text = add_counts_to_index(indx_dict)
 
-    found = False
     test_title = old_ref or text["title"]
+    old_cats = find_title_path(toc, test_title)
+    if old_cats is not None and old_cats != cats:
+        remove_title_from_toc(toc, test_title, old_cats)
+        if changed is not None:
+            changed.add(old_cats[0] if old_cats else test_title)
+
+    node = get_or_make_summary_node(toc, cats)
     for item in node:
         if item.get("title") == test_title:
             item.update(text)
-            found = True
             break
-    if not found:
+    else:
         node.append(text)
-        node[:] = sort_toc_node(node)
+    # The title and sparseness of the text may have changed its place
+    sort_toc_path(toc, cats)
+
+    if changed is not None:
+        changed.add(cats[0])
+    return toc
+
+
+def find_title_path(toc, title):
+    """
+    :return list: The categories of the TOC node in which the text `title` is found, or None if it isn't found
+    """
+    for elem in toc:
+        if elem.get("title") == title:
+            return []
+        if "category" in elem:
+            path = find_title_path(elem["contents"], title)
+            if path is not None:
+                return [elem["category"]] + path
+    return None
 
-    # If a new category may have been added to other, resort the categories
-    """if resort_other:
-        toc[-1]["contents"] = sort_toc_node(toc[-1]["contents"])"""
 
+def remove_title_from_toc(toc, title, cats):
+    """
+    Removes the text `title` from the TOC node named by `cats`, and removes the categories of the path that are left empty.
+    """
+    nodes = [toc]
+    for cat in cats:
+        nodes.append(get_or_make_summary_node(nodes[-1], [cat], make_if_not_found=False))
+    nodes[-1][:] = [x for x in nodes[-1] if x.get("title") != title]
+    for depth in range(len(cats), 0, -1):
+        if not nodes[depth]:
+            nodes[depth - 1][:] = [x for x in nodes[depth - 1] if x.get("category") != cats[depth - 1]]
+
+
+def delete_title_from_toc(toc, title, changed=None):
+    """
+    Removes the text `title` from the TOC, touching only its category path.
+    * changed - a set, to which the name of the top level category that was modified is added
+    """
+    cats = find_title_path(toc, title)
+    if cats is None:
+        return toc
+    remove_title_from_toc(toc, title, cats)
+    if changed is not None:
+        changed.add(cats[0] if cats else title)
     return toc
 
 
+def sort_toc_path(toc, cats):
+    """
+    Sorts each level of the TOC along the path named by `cats`, leaving the rest of the TOC as it is.
+    """
+    node = toc
+    for cat in [None] + cats:
+        if cat is not None:
+            node = get_or_make_summary_node(node, [cat], make_if_not_found=False)
+        node[:] = sort_toc_node(node)
+
+
 def get_or_make_summary_node(summary, nodes, contents_only=True, make_if_not_found=True):
     """
     Returns the node in 'summary' that is named by the list of categories in 'nodes',
@@ -392,3 +454,46 @@ def flatten_toc(toc, include_categories=False, categories_in_titles=False, versi
 
     return results
 
+
+class SerializedToc(object):
+    """
+    The JSON of a table of contents, serialized once for API responses and page renders,
+    with gzip and brotli (if available) variants and an ETag.
+
+    The JSON of each top level category is kept, so that when `changed` names the top level categories
+    that were modified since `previous`, only those are serialized again.
+    """
+    def __init__(self, toc, previous=None, changed=None):
+        reuse = previous.fragments if previous is not None and changed is not None else {}
+        self.fragments = {}
+        parts = []
+        for node in toc:
+            key = node.get("category") or node.get("title")
+            fragment = reuse[key] if key in reuse and key not in changed else json.dumps(node)
+            self.fragments[key] = fragment
+            parts.append(fragment)
+        # Same output as json.dumps(toc)
+        self.json = "[" + ", ".join(parts) + "]"
+        self.etag = '"{}"'.format(hashlib.md5(self.json).hexdigest())
+
+        buf = StringIO()
+        with gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=9, mtime=0) as f:
+            f.write(self.json)
+        self.gzip = buf.getvalue()
+        self.brotli = brotli.compress(self.json) if brotli else None
+
+    def encoded(self, accept_encoding):
+        """
+        :param accept_encoding: The value of a request's Accept-Encoding header
+        :return: (content, content encoding) of the best variant accepted, with encoding None for plain JSON
+        """
+        accepted = set()
+        for e in (accept_encoding or "").split(","):
+            parts = [p.strip() for p in e.split(";")]
+            if not any(p.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000") for p in parts[1:]):
+                accepted.add(parts[0])
+        if self.brotli is not None and "br" in accepted:
+            return self.brotli, "br"
+        if "gzip" in accepted:
+            return self.gzip, "gzip"
+        return self.json, None
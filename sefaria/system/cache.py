@@ -1,12 +1,24 @@
 
 import hashlib
+import json
 import sys
+import time
+import uuid
+from collections import defaultdict
+from functools import wraps
+
+from sefaria.system import instrumentation
 
 try:
     from sefaria.settings import USE_VARNISH
 except ImportError:
     USE_VARNISH = False
 
+try:
+    from sefaria.settings import CACHES, VERSION_TOKEN_CACHE
+except ImportError:
+    CACHES, VERSION_TOKEN_CACHE = {}, None
+
 if not hasattr(sys, '_doc_build'):
     from django.core.cache import cache
 
@@ -33,6 +45,17 @@ def get_cache_factory(cache_type):
     return cache_factory[cache_type]
 
 
+def get_version_cache(cache_type=None):
+    """
+    :return: The cache that version tokens (see :func:`namespace_version`) are kept in:
+    the `VERSION_TOKEN_CACHE` alias, if configured, so that they aren't culled along with the entries they version,
+    else the cache of `cache_type`.
+    """
+    if VERSION_TOKEN_CACHE in CACHES:
+        return get_cache_factory(VERSION_TOKEN_CACHE)
+    return get_cache_factory(cache_type)
+
+
 #get the cache key for storage
 def cache_get_key(*args, **kwargs):
     serialise = []
@@ -45,45 +68,176 @@ def cache_get_key(*args, **kwargs):
     return key
 
 
-def django_cache_decorator(time=300, cache_key='', cache_type=None):
+def _args_key(args, kwargs):
     """
-    Easily add caching to a function in django
+    Digest of a call's arguments.  Objects that JSON can't serialize are serialized by their unicode()
+    (for a Ref, its normal form), and keyword arguments are sorted, so equal calls always get equal keys.
     """
-    cache = get_cache_factory(cache_type)
-    if not cache_key:
-        cache_key = None
+    serial = json.dumps([args, kwargs], sort_keys=True, default=unicode)
+    return hashlib.md5(serial.encode("utf-8")).hexdigest()
+
+
+# Per family counts of "hit", "stale", "miss", "wait" and "lock_timeout" for memoized functions, see memo_stats()
+_memo_stats = defaultdict(lambda: defaultdict(int))
+
+
+def _count_memo(family, event):
+    _memo_stats[family][event] += 1
+    instrumentation.count("cache.{}.{}".format(family, event))
+    if event in ("hit", "stale"):
+        instrumentation.count("cache.hit")
+    elif event == "miss":
+        instrumentation.count("cache.miss")
+
+
+def memo_stats():
+    """
+    :return dict: For each family of memoized functions, the counts of each kind of lookup in this process, and the hit ratio
+    """
+    result = {}
+    for family, counts in _memo_stats.items():
+        d = dict(counts)
+        lookups = d.get("hit", 0) + d.get("stale", 0) + d.get("miss", 0) + d.get("wait", 0)
+        d["hit_ratio"] = float(lookups - d.get("miss", 0)) / lookups if lookups else 0.0
+        result[family] = d
+    return result
+
+
+NAMESPACE_VERSION_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def _namespace_version_key(family, namespace=None):
+    if namespace is None:
+        return "memo_version.{}".format(family)
+    return "memo_version.{}.{}".format(family, hashlib.md5(unicode(namespace).encode("utf-8")).hexdigest())
 
-    def decorator(fn):
-        def wrapper(*args, **kwargs):
-            #logger.debug([args, kwargs])
 
-            # Inner scope variables are read-only so we set a new var
-            _cache_key = cache_key
+def namespace_version(family, namespace=None, cache_type=None):
+    """
+    :return string: The current version token of the family of memoized results, or of one namespace within the family.
+    Every memoized key includes the tokens, so replacing one (see :func:`bump_namespace`) invalidates all of its keys at once.
+    """
+    cache = get_version_cache(cache_type)
+    key = _namespace_version_key(family, namespace)
+    version = cache.get(key)
+    if version is None:
+        # A lost token is replaced with a new one, never an old one, so stale entries can not reappear
+        version = uuid.uuid4().hex
+        cache.set(key, version, NAMESPACE_VERSION_TIMEOUT)
+    return version
 
-            if not _cache_key:
-                _cache_key = cache_get_key(fn.__name__, *args, **kwargs)
 
-            #logger.debug(['_cach_key.......',_cache_key])
-            result = cache.get(_cache_key)
+def bump_namespace(family, namespace=None, cache_type=None):
+    """
+    Invalidates all memoized results of `family`, or of one namespace within it, in O(1).
+    """
+    cache = get_version_cache(cache_type)
+    cache.set(_namespace_version_key(family, namespace), uuid.uuid4().hex, NAMESPACE_VERSION_TIMEOUT)
 
-            if not result:
-                result = fn(*args, **kwargs)
-                cache.set(_cache_key, result, time)
 
-            return result
+def memoize(timeout=300, family=None, namespace=None, stale_timeout=0, lock_timeout=30, lock_wait=5, cache_type=None):
+    """
+    Caches the results of the decorated function in the Django cache.
+
+    - Any result is cached, including None, empty lists and zeros.
+    - Only one caller computes a missing result; others wait up to `lock_wait` seconds for it, and then compute it themselves.
+      The lock is taken with the cache's `add()`, so this holds only on a backend where `add()` is atomic, such as memcached.
+      On the file based and local memory backends, callers that miss at the same moment may all compute the result.
+    - Results older than `timeout` seconds are served for up to `stale_timeout` more seconds,
+      while the one caller that takes the lock recomputes them.
+    - Keys include a version token of `family` (by default, the function's name), and of the namespace
+      given by calling `namespace` with the function's arguments, if provided.
+      :func:`bump_namespace` invalidates either at once.
+    - Lookups are counted per family, see :func:`memo_stats`.
+
+    :param timeout: Seconds a result is fresh
+    :param family: Name of the family of cached results
+    :param namespace: Function of the decorated function's arguments, that returns a namespace within the family
+    :param stale_timeout: Seconds after `timeout` that a result may be served while it's recomputed
+    :param lock_timeout: Seconds after which the lock of a computation that didn't finish is released
+    :param lock_wait: Seconds to wait for another process's computation
+    """
+    cache = get_cache_factory(cache_type)
+
+    def decorator(fn):
+        _family = family or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            version = namespace_version(_family, cache_type=cache_type)
+            if namespace is not None:
+                version += "." + namespace_version(_family, namespace(*args, **kwargs), cache_type=cache_type)
+            key = "memo.{}.{}.{}".format(_family, hashlib.md5(version).hexdigest(), _args_key(args, kwargs))
+            lock_key = key + ".lock"
+
+            entry = cache.get(key)
+            if entry is not None:
+                fresh_until, value = entry
+                if fresh_until >= time.time():
+                    _count_memo(_family, "hit")
+                    return value
+                if not cache.add(lock_key, 1, lock_timeout):
+                    # Another process is recomputing it
+                    _count_memo(_family, "stale")
+                    return value
+
+            elif not cache.add(lock_key, 1, lock_timeout):
+                _count_memo(_family, "wait")
+                deadline = time.time() + lock_wait
+                while time.time() < deadline:
+                    time.sleep(0.05)
+                    entry = cache.get(key)
+                    if entry is not None:
+                        return entry[1]
+                _count_memo(_family, "lock_timeout")
+                return fn(*args, **kwargs)
+
+            _count_memo(_family, "miss")
+            try:
+                value = fn(*args, **kwargs)
+                cache.set(key, (time.time() + timeout, value), timeout + stale_timeout)
+            finally:
+                cache.delete(lock_key)
+            return value
+
+        wrapper.family = _family
         return wrapper
     return decorator
+
+
+def django_cache_decorator(time=300, cache_key='', cache_type=None):
+    """
+    Easily add caching to a function in django
+    Kept for existing callers; see :func:`memoize`.  `cache_key`, if given, is used as the family.
+    """
+    return memoize(timeout=time, family=cache_key or None, cache_type=cache_type)
 #-------------------------------------------------------------#
 
 
 def get_cache_elem(key):
-    return cache.get(key)
+    value = cache.get(key)
+    instrumentation.count("cache.miss" if value is None else "cache.hit")
+    return value
+
+
+def get_cache_elems(keys):
+    """
+    :return dict: from each of `keys` that is in the cache to its value, fetched in one round trip
+    """
+    values = cache.get_many(keys)
+    instrumentation.count("cache.hit", len(values))
+    instrumentation.count("cache.miss", len(keys) - len(values))
+    return values
 
 
 def set_cache_elem(key, value, duration = 600000):
     return cache.set(key, value, duration)
 
 
+def set_cache_elems(mapping, duration = 600000):
+    return cache.set_many(mapping, duration)
+
+
 def delete_cache_elem(key):
     if isinstance(key, (list, tuple)):
         try:
@@ -105,10 +259,8 @@ def delete_template_cache(fragment_name='', *args):
     delete_cache_elem('template.cache.%s.%s' % (fragment_name, hashlib.md5(u':'.join([arg for arg in args])).hexdigest()))
 
 
-def generate_text_toc_cache_key(index_name):
-    index_name = index_name.replace("_", " ")
-    keys = []
-    keys.append(cache_get_key(*['make_toc_html', index_name])) #without optional kwargs - fix for s2
-    for zoom in [0,1,2]: #most commonly used values
-        keys.append(cache_get_key(*['make_toc_html', index_name], **{'zoom' : zoom}))
-    return keys
+def invalidate_text_toc(index_name):
+    """
+    Invalidates the memoized Table of Contents HTML of every zoom level of a text, see reader.views.make_toc_html
+    """
+    bump_namespace("make_toc_html", index_name.replace("_", " "))
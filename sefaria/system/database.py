@@ -24,6 +24,19 @@ else:
             db.authenticate(SEFARIA_DB_USER, SEFARIA_DB_PASSWORD)
 
 
+_server_version = None
+
+
+def server_version():
+    """
+    :return: Version of the MongoDB server, as a list of ints, e.g. [3, 2, 10, 0]
+    """
+    global _server_version
+    if _server_version is None:
+        _server_version = connection.server_info()["versionArray"]
+    return _server_version
+
+
 def drop_test():
     global connection
     connection.drop_database(TEST_DB)
@@ -41,6 +54,8 @@ def ensure_indices():
     db.history.ensure_index("revision")
     db.history.ensure_index("method")
     db.history.ensure_index([("ref", pymongo.ASCENDING), ("version", pymongo.ASCENDING), ("language", pymongo.ASCENDING)])
+    db.history.ensure_index([("ref", pymongo.ASCENDING), ("version", pymongo.ASCENDING), ("language", pymongo.ASCENDING), ("_id", pymongo.DESCENDING)])
+    db.history_snapshots.ensure_index([("ref", pymongo.ASCENDING), ("version", pymongo.ASCENDING), ("language", pymongo.ASCENDING), ("history_id", pymongo.ASCENDING)])
     db.history.ensure_index("date")
     db.history.ensure_index("ref")
     db.history.ensure_index("user")
@@ -56,10 +71,12 @@ def ensure_indices():
     db.links.ensure_index("refs")
     db.links.ensure_index("refs.0")
     db.links.ensure_index("refs.1")
+    db.links.ensure_index([("ref_keys.book", pymongo.ASCENDING), ("ref_keys.start", pymongo.ASCENDING)])
     db.metrics.ensure_index("timestamp", unique=True)
     db.notes.ensure_index([("owner", pymongo.ASCENDING), ("ref", pymongo.ASCENDING), ("public", pymongo.ASCENDING)])
     db.notifications.ensure_index([("uid", pymongo.ASCENDING), ("read", pymongo.ASCENDING)])
     db.notifications.ensure_index("uid")
+    db.notifications.ensure_index([("read", pymongo.ASCENDING), ("is_global", pymongo.ASCENDING)])
     db.parshiot.ensure_index("date")
     db.place.ensure_index([("point", pymongo.GEOSPHERE)])
     db.place.ensure_index([("area", pymongo.GEOSPHERE)])
@@ -67,7 +84,11 @@ def ensure_indices():
     db.sheets.ensure_index("id")
     db.sheets.ensure_index("dateModified")
     db.sheets.ensure_index("sources.ref")
+    db.sheet_refs.ensure_index("expandedRefs")
+    db.sheet_refs.ensure_index("sheet_id")
+    db.sheet_refs.ensure_index("owner")
     db.texts.ensure_index("title")
     db.texts.ensure_index([("priority", pymongo.DESCENDING), ("_id", pymongo.ASCENDING)])
     db.texts.ensure_index([("versionTitle", pymongo.ASCENDING), ("langauge", pymongo.ASCENDING)])
-    db.word_form.ensure_index("form")
\ No newline at end of file
+    db.word_form.ensure_index("form")
+    db.word_form.ensure_index("c_form")
\ No newline at end of file
@@ -0,0 +1,209 @@
+"""
+instrumentation.py -- per-request counters and timings for hot paths.
+
+Hot paths report through :func:`count`, :func:`timer` and :func:`timed`.
+:class:`sefaria.system.middleware.InstrumentationMiddleware` opens a record for each request,
+and when the request is done, adds the record to in-process statistics per view (see :data:`request_stats`).
+Outside of a request, reporting is a no-op.
+
+Metric names in use:
+    mongo.<collection>  - Mongo queries and writes, by collection
+    ref_cache.hit, ref_cache.miss - Ref instanciations served from / added to the Ref cache
+    text_chunk          - TextChunk loads
+    cache.hit, cache.miss - Django cache lookups
+    cache.<family>.<event> - Lookups of memoized functions, see sefaria.system.cache.memoize
+    template            - Template rendering (outermost templates only)
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import wraps
+
+try:
+    from sefaria.settings import INSTRUMENTATION_SAMPLES
+except ImportError:
+    INSTRUMENTATION_SAMPLES = 1000
+
+_local = threading.local()
+
+
+class RequestRecord(object):
+    """
+    Counts and times of the metrics reported during one request.
+    """
+    def __init__(self, name=None):
+        self.name = name
+        self.start = time.time()
+        self.end = None
+        self.counts = defaultdict(int)
+        self.times = defaultdict(float)
+
+    def add(self, metric, n=1, seconds=None):
+        self.counts[metric] += n
+        if seconds is not None:
+            self.times[metric] += seconds
+
+    def summary(self):
+        """
+        :return dict: Flat dict of the request's total time and of each metric's count and time, with times in milliseconds.
+        Mongo metrics are also totalled under "mongo".
+        """
+        end = self.end or time.time()
+        d = {"total_ms": (end - self.start) * 1000}
+        for metric, n in self.counts.iteritems():
+            d[metric] = n
+            if metric in self.times:
+                d[metric + "_ms"] = self.times[metric] * 1000
+            if metric.startswith("mongo."):
+                d["mongo"] = d.get("mongo", 0) + n
+                d["mongo_ms"] = d.get("mongo_ms", 0.0) + self.times.get(metric, 0.0) * 1000
+        return d
+
+    def header(self):
+        """
+        :return string: The summary, formatted for an HTTP header
+        """
+        summary = self.summary()
+        keys = ["total_ms", "mongo", "mongo_ms"] + sorted(k for k in summary if k not in ("total_ms", "mongo", "mongo_ms"))
+        return "; ".join("{}={}".format(k, round(summary[k], 1) if isinstance(summary[k], float) else summary[k]) for k in keys if k in summary)
+
+
+class RequestStats(object):
+    """
+    Keeps the summaries of the last `samples` requests per view, and reports percentiles over them.
+    """
+    percentiles = (50, 90, 99)
+
+    def __init__(self, samples=INSTRUMENTATION_SAMPLES):
+        self._samples = samples
+        self._lock = threading.Lock()
+        self._summaries = {}
+        self._requests = defaultdict(int)
+
+    def add(self, record):
+        name = record.name or "unresolved"
+        with self._lock:
+            if name not in self._summaries:
+                self._summaries[name] = deque(maxlen=self._samples)
+            self._summaries[name].append(record.summary())
+            self._requests[name] += 1
+
+    def clear(self):
+        with self._lock:
+            self._summaries = {}
+            self._requests = defaultdict(int)
+
+    @classmethod
+    def _percentiles(cls, values):
+        values = sorted(values)
+        return {"p{}".format(p): values[min(len(values) - 1, len(values) * p / 100)] for p in cls.percentiles}
+
+    def stats(self):
+        """
+        :return dict: For each view, the number of requests seen, and percentiles of each metric over the kept samples.
+        Requests in which a metric was not reported count as zero for that metric.
+        """
+        with self._lock:
+            summaries = {name: list(s) for name, s in self._summaries.iteritems()}
+            requests = dict(self._requests)
+        result = {}
+        for name, samples in summaries.iteritems():
+            keys = set(k for s in samples for k in s)
+            view = {"requests": requests[name], "samples": len(samples)}
+            for k in keys:
+                view[k] = self._percentiles([s.get(k, 0) for s in samples])
+            result[name] = view
+        return result
+
+
+request_stats = RequestStats()
+
+
+def start_request(name=None):
+    _local.record = RequestRecord(name)
+    _local.template_depth = 0
+    return _local.record
+
+
+def set_request_name(name):
+    record = current()
+    if record is not None:
+        record.name = name
+
+
+def end_request():
+    """
+    Closes the current request record and adds it to :data:`request_stats`
+    :return: The record, or None if no request was started in this thread
+    """
+    record = current()
+    _local.record = None
+    if record is not None:
+        record.end = time.time()
+        request_stats.add(record)
+    return record
+
+
+def current():
+    return getattr(_local, "record", None)
+
+
+def count(metric, n=1):
+    record = current()
+    if record is not None:
+        record.add(metric, n)
+
+
+@contextmanager
+def timer(metric):
+    record = current()
+    if record is None:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        record.add(metric, 1, time.time() - start)
+
+
+def timed(metric):
+    """
+    Decorator that reports each call of the decorated function under `metric`
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(metric):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_templates():
+    """
+    Wraps Django's Template.render, so that template rendering is reported as "template".
+    Nested templates (e.g. {% include %}) are timed as part of the outermost template.
+    """
+    from django.template.base import Template
+    if getattr(Template.render, "_instrumented", False):
+        return
+    render = Template.render
+
+    def instrumented_render(self, context):
+        record = current()
+        if record is None:
+            return render(self, context)
+        depth = getattr(_local, "template_depth", 0)
+        _local.template_depth = depth + 1
+        start = time.time()
+        try:
+            return render(self, context)
+        finally:
+            _local.template_depth = depth
+            if depth == 0:
+                record.add("template", 1, time.time() - start)
+
+    instrumented_render._instrumented = True
+    Template.render = instrumented_render
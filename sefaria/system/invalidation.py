@@ -0,0 +1,239 @@
+"""
+invalidation.py -- a coalescing, asynchronous queue for cache invalidations.
+
+Callers add PURGEs of URLs and BANs of URL patterns to an :class:`InvalidationQueue`, and return immediately.
+A background thread waits `window` seconds after the first pending invalidation, so that the invalidations
+of one save (a section, its neighbors, and its linked refs) are gathered together, and then:
+    - sends each distinct PURGE once, over keep-alive connections kept per host in a :class:`PurgeConnectionPool`
+    - combines the distinct BAN patterns into as few BAN expressions as possible
+
+The Varnish specific parts are in :mod:`sefaria.system.sf_varnish`, which keeps the queue of the process.
+"""
+import atexit
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from httplib import HTTPConnection, HTTPException
+from urlparse import urlparse
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class PurgeConnectionPool(object):
+    """
+    Sends HTTP PURGE requests over keep-alive connections, at most one open connection per host in each thread.
+    Connections are kept per thread, so that the pool can also be used from request threads at once,
+    as when invalidations are not queued.
+    """
+    def __init__(self, port, timeout=10):
+        self.port = port
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+
+    @property
+    def _connections(self):
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+        return connections
+
+    def _connection(self, host):
+        connection = self._connections.get(host)
+        if connection is None:
+            connection = HTTPConnection(host, self.port, timeout=self.timeout)
+            self._connections[host] = connection
+            with self._lock:
+                self.connections_opened += 1
+        return connection
+
+    def _discard(self, host):
+        connection = self._connections.pop(host, None)
+        if connection is not None:
+            connection.close()
+
+    def purge(self, url):
+        """
+        Do an HTTP PURGE of the given asset.
+        The URL is run through urlparse and must point to the varnish instance not the varnishadm.
+        A connection closed by the server since its last use is reopened once.
+        :return int: The response status
+        """
+        url = urlparse(url)
+        path = url.path or '/'
+        path = '%s?%s' % (path, url.query) if url.query else path
+        for attempt in (1, 2):
+            connection = self._connection(url.hostname)
+            try:
+                connection.request('PURGE', path, '', {'Host': url.hostname})
+                response = connection.getresponse()
+                response.read()
+            except (HTTPException, socket.error):
+                self._discard(url.hostname)
+                if attempt == 2:
+                    raise
+                continue
+            if response.will_close:
+                self._discard(url.hostname)
+            if response.status != 200:
+                logger.error(u'Purge of {} on host {} failed with status: {}'.format(path, url.hostname, response.status))
+            return response.status
+
+    def close(self):
+        """
+        Closes the connections of the calling thread.
+        """
+        for host in self._connections.keys():
+            self._discard(host)
+
+
+class InvalidationQueue(object):
+    """
+    Gathers PURGEs and BANs, drops duplicates, and runs them from a background thread.
+
+    :param purge: function of a URL, that PURGEs it
+    :param ban: function of a BAN expression, that BANs it
+    :param window: Seconds to wait after the first pending invalidation before running the gathered invalidations.
+        If None, every invalidation is run at once in the calling thread.
+    :param ban_field: The object field that patterns given to :meth:`ban` are matched against
+    :param max_ban_patterns: The most patterns combined into one BAN expression
+    """
+    def __init__(self, purge, ban, window=0.5, ban_field="obj.http.url", max_ban_patterns=50):
+        self._purge = purge
+        self._ban = ban
+        self.window = window
+        self.ban_field = ban_field
+        self.max_ban_patterns = max_ban_patterns
+
+        self._lock = threading.Lock()
+        self._pending = threading.Condition(self._lock)
+        self._idle = threading.Condition(self._lock)
+        self._purges = OrderedDict()
+        self._bans = OrderedDict()
+        self._first_pending = None
+        self._running = False
+        self._flush_requested = False
+        self._thread = None
+        self._pid = None
+
+        self.stats = {"purge_requested": 0, "purge_sent": 0, "ban_requested": 0, "ban_sent": 0, "errors": 0}
+
+    def purge(self, url):
+        self._add(self._purges, url, "purge_requested")
+
+    def ban(self, pattern):
+        """
+        :param pattern: A regular expression, in Varnish's string syntax, for the field `ban_field` of objects to ban
+        """
+        self._add(self._bans, pattern, "ban_requested")
+
+    def _add(self, pending, key, stat):
+        if self.window is None:
+            with self._lock:
+                self.stats[stat] += 1
+            self._run([key] if pending is self._purges else [], [key] if pending is self._bans else [])
+            return
+        with self._lock:
+            self.stats[stat] += 1
+            self._start_worker()
+            if key in pending:
+                return
+            pending[key] = True
+            if self._first_pending is None:
+                self._first_pending = time.time()
+            self._pending.notify()
+
+    def pending(self):
+        with self._lock:
+            return len(self._purges) + len(self._bans)
+
+    def flush(self, timeout=None):
+        """
+        Runs the pending invalidations without waiting for the rest of the window, and blocks until they are done.
+        :return bool: False if `timeout` seconds passed first
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._lock:
+            self._flush_requested = True
+            try:
+                if self._purges or self._bans:
+                    self._start_worker()
+                self._pending.notify()
+                while self._purges or self._bans or self._running:
+                    remaining = deadline - time.time() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._idle.wait(remaining)
+                return True
+            finally:
+                # Otherwise later invalidations would be run at once, without waiting for the window
+                self._flush_requested = False
+
+    def _start_worker(self):
+        # Called with the lock held.  The thread is started lazily, and again in a process forked from this one.
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._work, name="InvalidationQueue")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _work(self):
+        while True:
+            with self._lock:
+                while True:
+                    if self._purges or self._bans:
+                        if self._flush_requested:
+                            break
+                        remaining = self._first_pending + self.window - time.time()
+                        if remaining <= 0:
+                            break
+                        self._pending.wait(remaining)
+                    else:
+                        self._pending.wait()
+                purges, bans = self._purges.keys(), self._bans.keys()
+                self._purges, self._bans = OrderedDict(), OrderedDict()
+                self._first_pending = None
+                self._running = True
+            try:
+                self._run(purges, bans)
+            finally:
+                with self._lock:
+                    self._running = False
+                    self._idle.notify_all()
+
+    def ban_expressions(self, patterns):
+        """
+        :return list: BAN expressions that together match the same objects as the given patterns
+        """
+        step = self.max_ban_patterns
+        expressions = []
+        for i in range(0, len(patterns), step):
+            chunk = patterns[i:i + step]
+            regex = chunk[0] if len(chunk) == 1 else u"|".join(u"({})".format(p) for p in chunk)
+            expressions.append(u'{} ~ "{}"'.format(self.ban_field, regex))
+        return expressions
+
+    def _run(self, purges, bans):
+        for url in purges:
+            self._call(self._purge, url, "purge_sent")
+        for expression in self.ban_expressions(bans):
+            self._call(self._ban, expression, "ban_sent")
+
+    def _call(self, fn, arg, stat):
+        try:
+            fn(arg)
+            self.stats[stat] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.exception(u"Cache invalidation failed for {}: {}".format(arg, e))
+
+    def register_exit_flush(self, timeout=10):
+        """
+        Flush the queue when the process exits, so that a worker that is shut down does not lose its invalidations.
+        """
+        atexit.register(self.flush, timeout)
@@ -5,6 +5,8 @@ import hotshot.stats
 from django.conf import settings
 from cStringIO import StringIO
 
+from sefaria.system import instrumentation
+
 class ProfileMiddleware(object):
     """
     Displays hotshot profiling for any view.
@@ -43,4 +45,25 @@ class ProfileMiddleware(object):
             if response and response.content and stats_str:
                 response.content = "<pre>" + stats_str + "</pre>"
 
-        return response
\ No newline at end of file
+        return response
+
+class InstrumentationMiddleware(object):
+    """
+    Records counts and timings of hot paths for each request (see sefaria.system.instrumentation),
+    and aggregates them per view.  Aggregates are served at /admin/instrumentation.
+    In debug mode, adds the request's record to the response, in the X-Sefaria-Instrumentation header.
+    """
+    def __init__(self):
+        instrumentation.instrument_templates()
+
+    def process_request(self, request):
+        instrumentation.start_request()
+
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        instrumentation.set_request_name(u"{}.{}".format(callback.__module__, getattr(callback, "__name__", type(callback).__name__)))
+
+    def process_response(self, request, response):
+        record = instrumentation.end_request()
+        if record is not None and settings.DEBUG:
+            response["X-Sefaria-Instrumentation"] = record.header()
+        return response
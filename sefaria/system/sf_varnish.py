@@ -3,9 +3,12 @@ from varnish import VarnishManager
 from sefaria.model import *
 from sefaria.local_settings import VARNISH_ADM_ADDR, VARNISH_FRNT_PORT, VARNISH_SECRET, FRONT_END_URL
 from sefaria.system.exceptions import InputError
+from sefaria.system.invalidation import InvalidationQueue, PurgeConnectionPool
+try:
+    from sefaria.settings import VARNISH_INVALIDATION_WINDOW
+except ImportError:
+    VARNISH_INVALIDATION_WINDOW = None
 
-from urlparse import urlparse
-from httplib import HTTPConnection
 import urllib
 
 import logging
@@ -14,6 +17,31 @@ logger = logging.getLogger(__name__)
 with open (VARNISH_SECRET, "r") as sfile:
     secret=sfile.read().replace('\n', '')
 manager = VarnishManager([VARNISH_ADM_ADDR])
+purge_pool = PurgeConnectionPool(VARNISH_FRNT_PORT)
+
+
+def _run_ban(expression):
+    manager.run("ban", expression, secret=secret)
+
+
+# PURGEs and BANs are gathered for VARNISH_INVALIDATION_WINDOW seconds, and sent by a background thread.
+# See sefaria.system.invalidation
+invalidation_queue = InvalidationQueue(purge_pool.purge, _run_ban, window=VARNISH_INVALIDATION_WINDOW)
+invalidation_queue.register_exit_flush()
+
+
+def flush_invalidations(timeout=None):
+    """
+    Blocks until the queued PURGEs and BANs have been sent.
+    """
+    return invalidation_queue.flush(timeout)
+
+
+def ban_url(pattern):
+    """
+    Queue a BAN of all objects whose URL matches the regular expression `pattern`
+    """
+    invalidation_queue.ban(pattern)
 
 
 def invalidate_ref(oref, lang=None, version=None, purge=False):
@@ -55,8 +83,8 @@ def invalidate_ref(oref, lang=None, version=None, purge=False):
         purge_url("{}/api/links/{}?with_text=1".format(FRONT_END_URL, oref.url()))
 
     # Ban anything underneath this section
-    manager.run("ban", 'obj.http.url ~ "/api/texts/{}"'.format(url_regex(oref)), secret=secret)
-    manager.run("ban", 'obj.http.url ~ "/api/links/{}"'.format(url_regex(oref)), secret=secret)
+    ban_url("/api/texts/{}".format(url_regex(oref)))
+    ban_url("/api/links/{}".format(url_regex(oref)))
 
 
 def invalidate_linked(oref):
@@ -107,29 +135,16 @@ def invalidate_title(title):
     title = title.replace(" ", "_").replace(":", ".")
     invalidate_index(title)
     invalidate_counts(title)
-    manager.run("ban", 'obj.http.url ~ "/api/texts/{}"'.format(title), secret=secret)
-    manager.run("ban", 'obj.http.url ~ "/api/links/{}"'.format(title), secret=secret)
+    ban_url("/api/texts/{}".format(title))
+    ban_url("/api/links/{}".format(title))
 
 
-# PyPi version of python-varnish has broken purge function.  We use this instead.
-# Derived from https://github.com/justquick/python-varnish/blob/master/varnish.py
 def purge_url(url):
     """
-    Do an HTTP PURGE of the given asset.
-    The URL is run through urlparse and must point to the varnish instance not the varnishadm
+    Queue an HTTP PURGE of the given asset.
+    The URL must point to the varnish instance not the varnishadm.  See sefaria.system.invalidation.PurgeConnectionPool
     """
-    url = urlparse(url)
-    connection = HTTPConnection(url.hostname, VARNISH_FRNT_PORT)
-    path = url.path or '/'
-    connection.request('PURGE', '%s?%s' % (path, url.query) if url.query else path, '',
-                       {'Host': url.hostname})
-    response = connection.getresponse()
-    if response.status != 200:
-        logger.error(u'Purge of {}{} on host {} failed with status: {}'.format(path,
-                                                                                  u"?" + url.query if url.query else u'',
-                                                                                  url.hostname,
-                                                                                  response.status))
-    return response
+    invalidation_queue.purge(url)
 
 
 def url_regex(ref):
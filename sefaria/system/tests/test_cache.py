@@ -0,0 +1,105 @@
+import threading
+import time
+
+import sefaria.system.cache as scache
+
+
+class Test_Memoize(object):
+
+    def test_falsy_results_are_cached(self):
+        calls = []
+
+        @scache.memoize(60, family="test_memo_falsy")
+        def f(x):
+            calls.append(x)
+            return [] if x else None
+
+        scache.bump_namespace("test_memo_falsy")
+        assert f(1) == []
+        assert f(1) == []
+        assert f(0) is None
+        assert f(0) is None
+        assert calls == [1, 0]
+        stats = scache.memo_stats()["test_memo_falsy"]
+        assert stats["miss"] == 2
+        assert stats["hit"] == 2
+
+    def test_keyword_order_and_refs(self):
+        calls = []
+
+        @scache.memoize(60, family="test_memo_kwargs")
+        def f(a, b=1, c=2):
+            calls.append(1)
+            return a + b + c
+
+        scache.bump_namespace("test_memo_kwargs")
+        assert f(1, b=2, c=3) == 6
+        assert f(1, c=3, b=2) == 6
+        assert len(calls) == 1
+
+    def test_namespace_bump(self):
+        calls = []
+
+        @scache.memoize(60, family="test_memo_ns", namespace=lambda title, zoom=1: title)
+        def toc(title, zoom=1):
+            calls.append((title, zoom))
+            return title * zoom
+
+        scache.bump_namespace("test_memo_ns")
+        toc("Genesis"), toc("Genesis", zoom=2), toc("Exodus")
+        scache.bump_namespace("test_memo_ns", "Genesis")
+        toc("Genesis"), toc("Genesis", zoom=2), toc("Exodus")
+        assert calls == [("Genesis", 1), ("Genesis", 2), ("Exodus", 1), ("Genesis", 1), ("Genesis", 2)]
+
+        scache.bump_namespace("test_memo_ns")
+        toc("Exodus")
+        assert len(calls) == 6
+
+    def test_stale_while_revalidate(self):
+        calls = []
+
+        @scache.memoize(1, family="test_memo_stale", stale_timeout=60)
+        def f():
+            calls.append(1)
+            return len(calls)
+
+        scache.bump_namespace("test_memo_stale")
+        assert f() == 1
+        time.sleep(1.1)
+        # The first caller after the timeout takes the lock and recomputes it
+        assert f() == 2
+        assert f() == 2
+        assert len(calls) == 2
+
+    def test_waits_for_computation_in_progress(self):
+        # Callers that miss while another holds the lock wait for its result.  Whether callers that miss
+        # at the same moment can all take the lock depends on the backend's add(), see memoize
+        calls = []
+        started = threading.Event()
+
+        @scache.memoize(60, family="test_memo_flight", lock_wait=10)
+        def slow():
+            calls.append(1)
+            started.set()
+            time.sleep(0.3)
+            return "done"
+
+        scache.bump_namespace("test_memo_flight")
+        results = []
+        first = threading.Thread(target=lambda: results.append(slow()))
+        first.start()
+        started.wait(5)
+        others = [threading.Thread(target=lambda: results.append(slow())) for i in range(4)]
+        for t in others:
+            t.start()
+        for t in [first] + others:
+            t.join()
+        assert results == ["done"] * 5
+        assert len(calls) == 1
+        assert scache.memo_stats()["test_memo_flight"]["wait"] == 4
+
+    def test_version_tokens_in_version_cache(self):
+        version = scache.namespace_version("test_memo_tokens")
+        assert scache.get_version_cache().get(scache._namespace_version_key("test_memo_tokens")) == version
+        scache.bump_namespace("test_memo_tokens")
+        assert scache.namespace_version("test_memo_tokens") != version
@@ -0,0 +1,40 @@
+import pytest
+
+import sefaria.system.instrumentation as inst
+
+
+def test_no_op_outside_request():
+    assert inst.current() is None
+    inst.count("ref_cache.hit")
+    with inst.timer("mongo.texts"):
+        pass
+    assert inst.end_request() is None
+
+
+def test_request_record():
+    inst.start_request("view")
+    inst.count("ref_cache.hit", 3)
+    with inst.timer("mongo.texts"):
+        pass
+    with inst.timer("mongo.links"):
+        pass
+    record = inst.end_request()
+    summary = record.summary()
+    assert summary["ref_cache.hit"] == 3
+    assert summary["mongo"] == 2
+    assert "mongo.texts_ms" in summary
+    assert record.header().startswith("total_ms=")
+    assert inst.current() is None
+
+
+def test_percentiles():
+    stats = inst.RequestStats(samples=10)
+    for i in range(20):
+        record = inst.RequestRecord("view")
+        record.add("mongo.texts", i)
+        stats.add(record)
+    view = stats.stats()["view"]
+    assert view["requests"] == 20
+    assert view["samples"] == 10
+    assert view["mongo.texts"]["p50"] == 15
+    assert view["mongo.texts"]["p99"] == 19
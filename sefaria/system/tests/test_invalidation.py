@@ -0,0 +1,177 @@
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+import pytest
+
+from sefaria.system.invalidation import InvalidationQueue, PurgeConnectionPool
+
+
+class StubVarnishServer(ThreadingMixIn, HTTPServer):
+    """
+    Local stand-in for the Varnish front end, that answers PURGE requests over keep-alive connections
+    and records the paths purged and the connections they came on.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ("127.0.0.1", 0), StubPurgeHandler)
+        self.purged = []
+        self.connections = set()
+        self.lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+
+class StubPurgeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_PURGE(self):
+        with self.server.lock:
+            self.server.purged.append(self.path)
+            self.server.connections.add(self.client_address)
+        body = "purged"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    s = StubVarnishServer()
+    s.start()
+    yield s
+    s.shutdown()
+    s.server_close()
+
+
+def test_pool_keeps_connections_alive(server):
+    pool = PurgeConnectionPool(server.port)
+    for i in range(10):
+        assert pool.purge("http://127.0.0.1/api/texts/Genesis.{}?commentary=0".format(i)) == 200
+    pool.close()
+    assert server.purged == ["/api/texts/Genesis.{}?commentary=0".format(i) for i in range(10)]
+    assert pool.connections_opened == 1
+    assert len(server.connections) == 1
+
+
+def test_pool_reconnects(server):
+    pool = PurgeConnectionPool(server.port)
+    pool.purge("http://127.0.0.1/api/texts/Genesis.1")
+    pool._connections["127.0.0.1"].sock.close()
+    assert pool.purge("http://127.0.0.1/api/texts/Genesis.2") == 200
+    assert server.purged == ["/api/texts/Genesis.1", "/api/texts/Genesis.2"]
+
+
+def test_pool_concurrent_purges(server):
+    pool = PurgeConnectionPool(server.port)
+    statuses = []
+
+    def purge_all(n):
+        for i in range(5):
+            statuses.append(pool.purge("http://127.0.0.1/api/texts/Genesis.{}.{}".format(n, i)))
+        pool.close()
+
+    threads = [threading.Thread(target=purge_all, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert statuses == [200] * 20
+    assert len(server.purged) == 20
+    assert pool.connections_opened == 4
+
+
+def test_queue_coalesces(server):
+    pool = PurgeConnectionPool(server.port)
+    bans = []
+    queue = InvalidationQueue(pool.purge, bans.append, window=60)
+    for i in range(3):
+        queue.purge("http://127.0.0.1/api/texts/Genesis.1")
+        queue.purge("http://127.0.0.1/api/links/Genesis.1")
+        queue.ban(r"/api/texts/Genesis(\\.1$)")
+        queue.ban(r"/api/links/Genesis(\\.1$)")
+    assert queue.pending() == 4
+    assert server.purged == []  # Nothing is sent before the window closes
+
+    assert queue.flush(timeout=10)
+    assert queue.pending() == 0
+    assert server.purged == ["/api/texts/Genesis.1", "/api/links/Genesis.1"]
+    assert bans == [r'obj.http.url ~ "(/api/texts/Genesis(\\.1$))|(/api/links/Genesis(\\.1$))"']
+    assert queue.stats["purge_requested"] == 6
+    assert queue.stats["purge_sent"] == 2
+    assert queue.stats["ban_sent"] == 1
+    assert len(server.connections) == 1
+
+
+def test_queue_window():
+    purged = []
+    done = threading.Event()
+
+    def purge(url):
+        purged.append(url)
+        done.set()
+
+    queue = InvalidationQueue(purge, lambda e: None, window=0.05)
+    queue.purge("http://127.0.0.1/a")
+    queue.purge("http://127.0.0.1/a")
+    assert done.wait(10)
+    assert purged == ["http://127.0.0.1/a"]
+
+
+def test_flush_timeout():
+    purged = []
+    release = threading.Event()
+    done = threading.Event()
+
+    def purge(url):
+        release.wait(10)
+        purged.append(url)
+        done.set()
+
+    queue = InvalidationQueue(purge, lambda e: None, window=60)
+    queue.purge("http://127.0.0.1/a")
+    assert not queue.flush(timeout=0.05)
+    release.set()
+    assert done.wait(10)
+
+    # Purges after a flush that timed out wait for the window again
+    queue.purge("http://127.0.0.1/b")
+    time.sleep(0.1)
+    assert purged == ["http://127.0.0.1/a"]
+    assert queue.pending() == 1
+    assert queue.flush(timeout=10)
+    assert purged == ["http://127.0.0.1/a", "http://127.0.0.1/b"]
+
+
+def test_ban_expressions():
+    queue = InvalidationQueue(None, None, max_ban_patterns=2)
+    assert queue.ban_expressions(["/a"]) == ['obj.http.url ~ "/a"']
+    assert queue.ban_expressions(["/a", "/b", "/c"]) == ['obj.http.url ~ "(/a)|(/b)"', 'obj.http.url ~ "/c"']
+
+
+def test_synchronous_and_errors():
+    calls = []
+
+    def purge(url):
+        calls.append(url)
+        raise IOError("varnish is down")
+
+    queue = InvalidationQueue(purge, calls.append, window=None)
+    queue.purge("http://127.0.0.1/a")
+    queue.ban("/b")
+    assert calls == ["http://127.0.0.1/a", 'obj.http.url ~ "/b"']
+    assert queue.stats["errors"] == 1
+    assert queue.flush()
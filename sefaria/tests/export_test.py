@@ -0,0 +1,30 @@
+import sefaria.export as export
+from sefaria.export import ExportManifest, export_units
+
+
+def test_failed_unit_keeps_previous_export(tmpdir, monkeypatch):
+    good = ("version", "Genesis", "en", "Good Version")
+    bad = ("version", "Exodus", "en", "Bad Version")
+    gone = ("version", "Leviticus", "en", "Deleted Version")
+    paths = {}
+    for unit in (good, bad, gone):
+        path = tmpdir.join(unit[1] + ".json")
+        path.write("{}")
+        paths[unit] = str(path)
+    manifest = ExportManifest({ExportManifest.key(u): {"hash": "old", "paths": [paths[u]]} for u in (good, bad, gone)})
+
+    def fake_export_unit(args):
+        unit, previous = args
+        if unit == bad:
+            return {"unit": unit, "entry": None, "skipped": False, "error": u"export of Exodus failed: timeout"}
+        return {"unit": unit, "entry": previous, "skipped": True, "error": None}
+
+    monkeypatch.setattr(export, "export_unit", fake_export_unit)
+    monkeypatch.setattr(export, "log_error", lambda msg: None)
+    stats = export_units([good, bad], manifest=manifest)
+    assert stats.failed == 1
+
+    assert manifest.remove_unseen() == 1
+    assert tmpdir.join("Exodus.json").check()
+    assert manifest.get(bad) == {"hash": "old", "paths": [paths[bad]]}
+    assert not tmpdir.join("Leviticus.json").check()
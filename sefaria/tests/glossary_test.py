@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from sefaria.glossary import TermCounter
+
+
+def test_term_counter():
+    counter = TermCounter(sample_size=2)
+    counter.add_line(u"אָמַר רבי, אמר", "Berakhot 2a:1")
+    counter.add_line(u"(אמר)  רבי.", "Berakhot 2a:2")
+    counter.add_line(u"אמר", "Berakhot 2a:3")
+    assert set(counter.terms.keys()) == {u"אמר", u"רבי"}
+    occurrences, lines, refs = counter.terms[u"אמר"]
+    assert (occurrences, lines, len(refs)) == (4, 3, 2)
+    assert counter.terms[u"רבי"] == [2, 2, ["Berakhot 2a:1", "Berakhot 2a:2"]]
+
+
+def test_term_counter_update():
+    a, b = TermCounter(sample_size=3), TermCounter(sample_size=3)
+    for i in range(10):
+        a.add_line(u"word", "A %d" % i)
+    for i in range(2):
+        b.add_line(u"word other", "B %d" % i)
+    a.update(b.terms)
+    occurrences, lines, refs = a.terms[u"word"]
+    assert (occurrences, lines, len(set(refs))) == (12, 12, 3)
+    assert a.terms[u"other"] == [2, 2, ["B 0", "B 1"]]
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 import pytest
 
-from sefaria.client.wrapper import get_links
+from sefaria.client.wrapper import get_links, load_section_texts
 from sefaria.model import *
 
 def setup_module(module): 
@@ -15,6 +15,19 @@ class Test_get_links():
         y = len(get_links("Exodus 2:4"))
         assert len(get_links("Exodus 2:3-4")) == (x+y)
 
+    def test_bulk_texts_match_text_chunks(self):
+        orefs = [Ref("Rashi on Genesis 1"), Ref("Rashi on Genesis 3"), Ref("Ramban on Genesis 1"), Ref("Genesis 2")]
+        texts = load_section_texts(orefs)
+        for oref in orefs:
+            for lang in ["he", "en"]:
+                assert texts[oref.normal()][lang].array() == TextChunk(oref, lang).text
+
+    def test_with_text_matches_without(self):
+        with_text = get_links("Genesis 1:1")
+        without_text = get_links("Genesis 1:1", with_text=False)
+        assert [l["_id"] for l in with_text] == [l["_id"] for l in without_text]
+        assert all("text" in l and "he" in l for l in with_text)
+
 
 class Test_links_from_get_text():
 
@@ -23,3 +36,21 @@ class Test_links_from_get_text():
         t2 = TextFamily(Ref("Exodus 1")).contents()
 
         assert len(t1["commentary"]) == len(t2["commentary"])
+
+
+class Test_ref_keys():
+
+    def test_ref_key_order(self):
+        from sefaria.model.link import ref_key
+        keys = [ref_key(Ref(r)) for r in ["Genesis 1:2", "Genesis 1:10", "Genesis 2", "Genesis 10:1"]]
+        assert [k["start"] for k in keys] == sorted(k["start"] for k in keys)
+        assert ref_key(Ref("Genesis 1"))["start"] <= keys[0]["start"] <= ref_key(Ref("Genesis 1"))["end"]
+        assert ref_key(Ref("Genesis 1:3-5"))["level"] == ref_key(Ref("Genesis 1:3"))["level"] - 1
+
+    def test_ref_key_query_matches_regex(self):
+        from sefaria.model.link import ref_key_query
+        for tref in ["Genesis 1", "Genesis 1:1", "Genesis 1:30-2:3", "Berakhot 2a", "Rashi on Genesis 1:1"]:
+            oref = Ref(tref)
+            regex_ids = {l._id for l in LinkSet({"$or": [{"refs": {"$regex": r}} for r in oref.regex(as_list=True)]})}
+            key_ids = {l._id for l in LinkSet(ref_key_query(oref))}
+            assert regex_ids == key_ids
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+from sefaria.model import *
+import sefaria.search as search
+
+
+class RecordingES(object):
+    """
+    Stands in for the ElasticSearch connection, and records the documents indexed through it
+    """
+    def __init__(self):
+        self.docs = []
+
+    def index(self, index_name, doc_type, doc, doc_id):
+        self.docs.append((doc_id, doc))
+
+
+def documents_by_section(tref, version, lang, monkeypatch):
+    """
+    :return: The (doc id, doc) pairs of the section `tref`, made one segment at a time by `index_text()`
+    """
+    es = RecordingES()
+    monkeypatch.setattr(search, "es", es)
+    search.index_text("test_index", Ref(tref), version=version, lang=lang)
+    return es.docs
+
+
+def documents_by_version(tref, version, lang):
+    """
+    :return: The (doc id, doc) pairs of the section `tref`, from a walk over the whole Version
+    """
+    oref = Ref(tref)
+    return [(doc_id, doc) for doc_id, doc in search.make_version_index_documents(oref.index.title, version, lang)
+            if oref.contains(Ref(doc["ref"]))]
+
+
+def assert_same_documents(tref, lang, monkeypatch):
+    version = [v for v in Ref(tref).version_list() if v["language"] == lang][0]["versionTitle"]
+    expected = documents_by_section(tref, version, lang, monkeypatch)
+    assert expected
+    assert documents_by_version(tref, version, lang) == expected
+
+
+def test_simple_text(monkeypatch):
+    assert_same_documents("Genesis 1", "en", monkeypatch)
+    assert_same_documents("Genesis 1", "he", monkeypatch)
+
+
+def test_bavli_amud(monkeypatch):
+    assert_same_documents("Shabbat 2a", "he", monkeypatch)
+
+
+def test_complex_text(monkeypatch):
+    assert_same_documents("Pesach Haggadah, Kadesh", "he", monkeypatch)
+
+
+def test_walk_jagged_array():
+    assert list(search._walk_jagged_array([["a", ""], [], ["b"]], 2)) == [([0, 0], "a"), ([2, 0], "b")]
+    assert list(search._walk_jagged_array([["a", ""], [], ["b"]], 1)) == [([0], ["a", ""]), ([2], ["b"])]
+
+
+def test_units_with_errors_are_not_checkpointed(tmpdir, monkeypatch):
+    units = [("Genesis", "A", "en"), ("Exodus", "B", "en")]
+    monkeypatch.setattr(search, "version_units", lambda merged=False, debug=False: units)
+    monkeypatch.setattr(search, "index_version_unit", lambda args: {
+        "unit": list(args[1]), "docs": 1, "bytes": 1, "requests": 1, "errors": 1 if args[1][0] == "Exodus" else 0})
+    checkpoint = str(tmpdir.join("checkpoint"))
+
+    search.index_all_versions("test_index", processes=1, checkpoint_file=checkpoint)
+    assert search._read_checkpoint(checkpoint) == {("Genesis", "A", "en")}
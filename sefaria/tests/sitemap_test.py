@@ -0,0 +1,15 @@
+from sefaria.model import *
+from sefaria.datatype.jagged_array import JaggedIntArray
+from sefaria.sitemap import section_urls, _non_empty_sections
+
+
+def test_non_empty_sections():
+    for available in [[1, 0, 1], [[1, 0], [], [0, 0], [0, 1]], [[[0], [1]], [], [[1, 1]]], []]:
+        ja = JaggedIntArray(available)
+        assert list(_non_empty_sections(available, ja.get_depth() - 1)) == ja.non_empty_sections()
+
+
+def test_section_urls():
+    for title in ["Genesis", "Shabbat", "Pesach Haggadah", "Mishnah Berakhot"]:
+        index = library.get_index(title)
+        assert list(section_urls(VersionState(index))) == [oref.url() for oref in index.all_section_refs()]
@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
 
+import gzip
+import json
+from cStringIO import StringIO
+
 import pytest
 import sefaria.summaries as s
 import sefaria.model as model
@@ -184,3 +188,50 @@ class Test_Toc(object):
         verify_existence_across_tocs(old_title, expected_toc_location=old_toc_path)
 
 
+
+    def test_index_category_change(self):
+        new_index = model.Index({
+            "title": "New Toc Test",
+            "heTitle": u"פםפם",
+            "titleVariants": [],
+            "sectionNames": ["Chapter", "Paragraph"],
+            "categories": ["Philosophy"]
+        })
+        new_index.save()
+        verify_existence_across_tocs(new_index.title, expected_toc_location=new_index.categories)
+        new_index.categories = ["Musar"]
+        new_index.save()
+        # Moved, not copied
+        verify_existence_across_tocs(new_index.title, expected_toc_location=new_index.categories)
+        assert model.library.get_toc_json() == json.dumps(model.library.get_toc())
+        new_index.delete()
+        verify_existence_across_tocs(new_index.title, None)
+
+
+class Test_Serialized_Toc(object):
+
+    def test_serialized_toc(self):
+        toc = [{"category": "Tanakh", "heCategory": u"תנ״ך", "contents": [{"title": "Genesis", "heTitle": u"בראשית"}]},
+               {"category": "Other", "heCategory": u"שונות", "contents": []}]
+        ser = s.SerializedToc(toc)
+        assert ser.json == json.dumps(toc)
+        assert gzip.GzipFile(fileobj=StringIO(ser.gzip)).read() == ser.json
+        assert ser.encoded("gzip, deflate") == (ser.gzip, "gzip")
+        assert ser.encoded("gzip;q=0") == (ser.json, None)
+        assert ser.encoded(None) == (ser.json, None)
+
+        toc[1]["contents"].append({"title": "Kuzari", "heTitle": u"כוזרי"})
+        toc[0]["contents"].append({"title": "Not Reserialized", "heTitle": u""})
+        updated = s.SerializedToc(toc, ser, changed={"Other"})
+        assert updated.fragments["Tanakh"] is ser.fragments["Tanakh"]
+        assert "Kuzari" in updated.json and "Not Reserialized" not in updated.json
+        assert updated.etag != ser.etag
+
+    def test_update_path(self):
+        toc = [{"category": "Philosophy", "heCategory": "", "contents": [{"title": "A"}, {"title": "B"}]}]
+        assert s.find_title_path(toc, "B") == ["Philosophy"]
+        assert s.find_title_path(toc, "C") is None
+        s.remove_title_from_toc(toc, "A", ["Philosophy"])
+        assert toc[0]["contents"] == [{"title": "B"}]
+        s.remove_title_from_toc(toc, "B", ["Philosophy"])
+        assert toc == []
@@ -16,7 +16,7 @@ if USE_VARNISH:
     from sefaria.system.sf_varnish import invalidate_ref, invalidate_linked
 
 
-def modify_text(user, oref, vtitle, lang, text, vsource=None, **kwargs):
+def modify_text(user, oref, vtitle, lang, text, vsource=None, count_after=False, **kwargs):
     """
     Updates a chunk of text, identified by oref, versionTitle, and lang, and records history.
     :param user:
@@ -25,6 +25,7 @@ def modify_text(user, oref, vtitle, lang, text, vsource=None, **kwargs):
     :param lang:
     :param text:
     :param vsource:
+    :param count_after: If True, updates the VersionState counts for the change
     :return:
     """
     chunk = model.TextChunk(oref, lang, vtitle)
@@ -55,6 +56,9 @@ def modify_text(user, oref, vtitle, lang, text, vsource=None, **kwargs):
             if USE_VARNISH:
                 invalidate_linked(oref)
 
+        if count_after:
+            model.VersionState(oref.index.title).apply_text_change(oref, lang, old_text, chunk.text)
+
     return chunk
 
 
@@ -360,6 +360,7 @@ urlpatterns += patterns('',
     (r'^admin/delete/citation-links/(?P<title>.+)$', 'sefaria.views.delete_citation_links'),
     (r'^admin/cache/stats', 'sefaria.views.cache_stats'),
     (r'^admin/cache/dump', 'sefaria.views.cache_dump'),
+    (r'^admin/instrumentation', 'sefaria.views.instrumentation_stats'),
     (r'^admin/run/tests', 'sefaria.views.run_tests'),
     (r'^admin/export/all', 'sefaria.views.export_all'),
     (r'^admin/error', 'sefaria.views.cause_error'),
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+aho_corasick.py - Multiple string matching in one pass over the input.
+
+Used by the Library to find titles in a string without running a regex that alternates over every title.
+"""
+
+
+class AhoCorasick(object):
+    """
+    Automaton over a fixed set of strings.
+
+    ::
+
+        >>> ac = AhoCorasick([u"Gen", u"Genesis", u"Exodus"])
+        >>> list(ac.iter_matches(u"Genesis 1"))
+        [(0, 3), (0, 7)]
+
+    Matching cost is linear in the length of the input plus the number of matches, independent of the number of strings.
+    """
+
+    def __init__(self, words=None):
+        self._goto = [{}]       # state -> {char: state}
+        self._fail = [0]        # state -> longest proper suffix state
+        self._length = [0]      # state -> length of word ending at state, or 0
+        self._dict_link = [0]   # state -> nearest state on the fail chain that ends a word
+        self._finalized = False
+        for word in words or []:
+            self.add(word)
+        self.finalize()
+
+    def __len__(self):
+        return sum(1 for l in self._length if l)
+
+    def add(self, word):
+        assert not self._finalized, "Can not add words to a finalized AhoCorasick automaton"
+        if not word:
+            return
+        state = 0
+        for char in word:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._length.append(0)
+                self._dict_link.append(0)
+            state = nxt
+        self._length[state] = len(word)
+
+    def finalize(self):
+        """
+        Computes failure and dictionary links, breadth first.
+        """
+        queue = list(self._goto[0].values())
+        i = 0
+        while i < len(queue):
+            state = queue[i]
+            i += 1
+            for char, nxt in self._goto[state].iteritems():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and char not in self._goto[f]:
+                    f = self._fail[f]
+                fail = self._goto[f].get(char, 0)
+                self._fail[nxt] = fail if fail != nxt else 0
+                self._dict_link[nxt] = fail if self._length[fail] else self._dict_link[fail]
+        self._finalized = True
+
+    def iter_matches(self, s):
+        """
+        Yields (start, end) for every occurrence of every word in `s`, ordered by end position,
+        and for a common end position, from longest to shortest.
+        """
+        goto, fail, length, dict_link = self._goto, self._fail, self._length, self._dict_link
+        state = 0
+        for pos, char in enumerate(s):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            out = state if length[state] else dict_link[state]
+            while out:
+                yield (pos + 1 - length[out], pos + 1)
+                out = dict_link[out]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+from sefaria.utils.aho_corasick import AhoCorasick
+
+
+def brute_force(words, s):
+    return sorted((i, i + len(w)) for w in set(words) if w for i in range(len(s)) if s.startswith(w, i))
+
+
+class Test_AhoCorasick(object):
+
+    def test_overlapping_matches(self):
+        ac = AhoCorasick([u"Gen", u"Genesis", u"Exodus", u"sis"])
+        assert list(ac.iter_matches(u"Genesis 1")) == [(0, 3), (0, 7), (4, 7)]
+
+    def test_no_matches(self):
+        ac = AhoCorasick([u"Genesis"])
+        assert list(ac.iter_matches(u"Gene")) == []
+        assert list(ac.iter_matches(u"")) == []
+        assert list(AhoCorasick([]).iter_matches(u"Genesis")) == []
+
+    def test_hebrew(self):
+        ac = AhoCorasick([u"שמות", u"שמות רבה"])
+        s = u"אמר קרא (שמות רבה א, ד)"
+        assert [s[a:b] for a, b in ac.iter_matches(s)] == [u"שמות", u"שמות רבה"]
+
+    def test_matches_brute_force(self):
+        words = [u"a", u"ab", u"bab", u"bc", u"bca", u"c", u"caa", u"abcab", u"aaaa"]
+        ac = AhoCorasick(words)
+        for s in [u"abccab", u"aaaaaaa", u"bcabcabcaab", u"xyz", u"cbabcaabcab"]:
+            assert sorted(ac.iter_matches(s)) == brute_force(words, s)
+
+    def test_len(self):
+        assert len(AhoCorasick([u"a", u"ab", u"", u"b"])) == 3
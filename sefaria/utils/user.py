@@ -59,6 +59,7 @@ def merge_user_accounts(from_uid, into_uid):
     
     # Move Sheets
     db.sheets.update_many({"owner": from_uid}, {"$set": {"owner": into_uid}})
+    db.sheet_refs.update_many({"owner": from_uid}, {"$set": {"owner": into_uid}})
     # Move Notes
     db.notes.update_many({"owner": from_uid}, {"$set": {"owner": into_uid}})
     # Move Notifcations
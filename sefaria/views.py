@@ -31,7 +31,7 @@ import sefaria.system.cache as scache
 from sefaria.client.util import jsonResponse, subscribe_to_list
 from sefaria.forms import NewUserForm
 from sefaria.settings import MAINTENANCE_MESSAGE, USE_VARNISH
-from sefaria.model.user_profile import UserProfile, user_links
+from sefaria.model.user_profile import UserProfile
 from sefaria.model.group import GroupSet
 from sefaria.model.translation_request import count_completed_translation_requests
 from sefaria.export import export_all as start_export_all
@@ -312,8 +312,6 @@ def file_upload(request, resize_image=True):
 @staff_member_required
 def reset_cache(request):
     model.library.rebuild()
-    global user_links
-    user_links = {}
     return HttpResponseRedirect("/?m=Cache-Reset")
 
 
@@ -321,7 +319,7 @@ def reset_cache(request):
 def reset_index_cache_for_text(request, title):
     index = model.library.get_index(title)
     model.library.refresh_index_record_in_cache(index)
-    scache.delete_cache_elem(scache.generate_text_toc_cache_key(title))
+    scache.invalidate_text_toc(title)
     if USE_VARNISH:
         invalidate_title(title)
     return HttpResponseRedirect("/%s?m=Cache-Reset" % model.Ref(title).url())
@@ -398,7 +396,7 @@ def reset_ref(request, tref):
         vs = model.VersionState(index=oref.index)
         vs.refresh()
         model.library.update_index_in_toc(oref.index)
-        scache.delete_cache_elem(scache.generate_text_toc_cache_key(oref.index.title))
+        scache.invalidate_text_toc(oref.index.title)
         if USE_VARNISH:
             invalidate_index(oref.index)
             invalidate_counts(oref.index)
@@ -437,11 +435,24 @@ def cache_stats(request):
     import resource
     resp = {
         'ref_cache_size': model.Ref.cache_size(),
+        'ref_cache_stats': model.Ref.cache_stats(),
+        'record_cache_stats': model.abstract.record_cache_stats(),
         'memory usage': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
     }
     return jsonResponse(resp)
 
 
+@staff_member_required
+def instrumentation_stats(request):
+    """
+    Percentiles of per-request timings and counts, by view, for the requests served by this process.
+    """
+    from sefaria.system.instrumentation import request_stats
+    if request.GET.get("reset"):
+        request_stats.clear()
+    return jsonResponse(request_stats.stats())
+
+
 @staff_member_required
 def cache_dump(request):
     resp = {
@@ -38,18 +38,33 @@ import sefaria.model.dependencies
 from sefaria.gauth.decorators import gauth_required
 
 
-def annotate_user_links(sources):
+def annotate_user_links(sources, _user_data=None):
 	"""
 	Search a sheet for any addedBy fields (containg a UID) and add corresponding user links.
 	"""
+	if _user_data is None:
+		_user_data = public_user_data_many(added_by_uids(sources))
 	for source in sources:
 		if "addedBy" in source:
-			source["userLink"] = user_link(source["addedBy"])
+			source["userLink"] = user_link(source["addedBy"], _user_data[source["addedBy"]])
 		if "subsources" in source:
-			source["subsources"] = annotate_user_links(source["subsources"])
+			source["subsources"] = annotate_user_links(source["subsources"], _user_data)
 
 	return sources
 
+
+def added_by_uids(sources):
+	"""
+	Returns a list of the UIDs in the addedBy fields of `sources` and their subsources.
+	"""
+	uids = []
+	for source in sources:
+		if "addedBy" in source:
+			uids.append(source["addedBy"])
+		if "subsources" in source:
+			uids += added_by_uids(source["subsources"])
+	return uids
+
 @login_required
 @ensure_csrf_cookie
 def new_sheet(request):
@@ -190,7 +205,7 @@ def view_sheet(request, sheet_id):
 	sheet["sources"] = annotate_user_links(sheet["sources"])
 
 	# Count this as a view
-	db.sheets.update({"id": int(sheet_id)}, {"$inc": {"views": 1}})
+	increment_sheet_views(int(sheet_id))
 
 	try:
 		owner = User.objects.get(id=sheet["owner"])
@@ -253,7 +268,7 @@ def view_visual_sheet(request, sheet_id):
 	sheet["sources"] = annotate_user_links(sheet["sources"])
 
 	# Count this as a view
-	db.sheets.update({"id": int(sheet_id)}, {"$inc": {"views": 1}})
+	increment_sheet_views(int(sheet_id))
 
 	try:
 		owner = User.objects.get(id=sheet["owner"])
@@ -351,6 +366,7 @@ def delete_sheet_api(request, sheet_id):
 		return jsonResponse({"error": "Only the sheet owner may delete a sheet."})
 
 	db.sheets.remove({"id": id})
+	remove_sheet_from_ref_index(id)
 	index_name = search.get_new_and_current_index_names()['current']
 	search.delete_sheet(index_name, id)
 
@@ -1024,7 +1040,7 @@ def all_sheets_api(request, limiter, offset=0):
 	else:
 		public = db.sheets.find(query).sort([["dateModified", -1]]).skip(offset).limit(limiter)
 
-	sheets   = [sheet_to_dict(s) for s in public]
+	sheets   = sheet_list_to_dicts(public)
 	response = {"sheets": sheets}
 	response = jsonResponse(response, callback=request.GET.get("callback", None))
 	response["Cache-Control"] = "max-age=3600"
@@ -1036,7 +1052,7 @@ def sheets_by_tag_api(request, tag):
 	API to get a list of sheets by `tag`.
 	"""
 	sheets   = get_sheets_by_tag(tag, public=True)
-	sheets   = [sheet_to_dict(s) for s in sheets]
+	sheets   = sheet_list_to_dicts(sheets)
 	response = {"tag": tag, "sheets": sheets}
 	response = jsonResponse(response, callback=request.GET.get("callback", None))
 	response["Cache-Control"] = "max-age=3600"